@@ -1,20 +1,24 @@
+import json
+import os
+import time
+
 import streamlit as st
-import pyodbc
 import pandas as pd
-import requests
-import time
-from datetime import datetime
-
-# Configuration for speed optimization
-SPEED_CONFIG = {
-    "model": "llama3",  # You can change to "llama3:8b" for faster responses
-    "temperature": 0.1,  # Lower = faster, more deterministic
-    "top_p": 0.9,       # Lower = faster generation
-    "top_k": 40,        # Lower = faster token selection
-    "max_tokens": 200,   # Limit response length
-    "summary_max_tokens": 100,  # Shorter summaries
-    "enable_streaming": False,  # Set to True for real-time streaming
-    "cache_responses": True,    # Cache similar queries
+
+from config import FETCH_CONFIG, HISTORY_CONFIG, METRICS_CONFIG, SERVICE_CONFIG, SUMMARY_CONFIG, TABLE_BROWSER_CONFIG
+from engine import Engine
+from metrics import prometheus_text
+from pipeline import CANCELLED
+from results import frame_nbytes
+from service_client import ServiceClient
+from table_browser import TABLE_SORTS, format_rows
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css")
+# Progress shown when a question reaches these pipeline steps
+STAGE_STATUS = {
+    "cached": (25, "🤖 Generating SQL query..."),
+    "validate": (40, "🩺 Checking SQL query..."),
+    "execute": (50, "🔍 Executing SQL query..."),
 }
 
 # Page configuration
@@ -25,229 +29,177 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+@st.cache_resource
+def get_engine():
+    # Lives across reruns and sessions, so pools, caches and the model client are shared
+    engine = Engine()
+    engine.serve_metrics()
+    return engine
+
+
+@st.cache_resource
+def get_service_client():
+    return ServiceClient(SERVICE_CONFIG["url"], read_timeout=SERVICE_CONFIG["timeout"])
+
+
+def get_backend():
+    # Either the shared query service (many users, one set of pools/caches) or this process's engine
+    return get_service_client() if SERVICE_CONFIG["url"] else get_engine()
+
+
+def ask_via_service(question, cache_mode):
+    context = st.session_state.current_context
+    client = get_service_client()
+    with st.spinner("🤖 Asking the query service..."):
+        try:
+            qa_entry = client.ask(
+                st.session_state.server_info, context["database"], context["table_info"], question,
+                cache_mode, summarize=False,
+            )
+        except Exception as e:
+            st.error(f"❌ Query service error: {str(e)}")
+            return
+    st.session_state.qa_history.append(qa_entry)
+    if qa_entry.get("summary_pending"):
+        complete = not (qa_entry["has_more"] or qa_entry["truncated"])
+        client.background.submit(
+            summarize_and_save, st.session_state.qa_history, client.summarize_into, qa_entry, complete,
+        )
+    st.rerun()
+
+
+@st.cache_resource
+def load_css():
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def table_label(table_key):
+    schema, name = table_key
+    return name if schema == "dbo" else f"{schema}.{name}"
+
+
+def render_summary(qa):
+    summary = qa['summary'] or ""
+    if qa.get("summary_pending"):
+        summary = f"{summary} ⏳" if summary else "⏳ Generating summary..."
+    st.markdown(f"""
+    <div class="result-box">
+        <h5>💡 Summary:</h5>
+        <p>{summary}</p>
+        <small>🕒 {qa.get('timestamp', 'N/A').strftime('%Y-%m-%d %H:%M:%S') if hasattr(qa.get('timestamp', ''), 'strftime') else 'N/A'}</small>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=SUMMARY_CONFIG["poll_interval"])
+def render_pending_summary(qa):
+    if not qa.get("summary_pending"):
+        # Finished: one full rerun renders it statically and stops the polling
+        st.rerun()
+    render_summary(qa)
+
+
+def run_question(steps, reply=None, error=None, sql_preview=None):
+    """Run a question's pipeline steps from where they stopped, with progress in between.
+
+    The query runs on a worker thread with a Cancel button (see
+    ``finish_running_query``); the summary streams into the history entry on
+    a background thread. Returns False when the question failed (the error is
+    shown on the page).
+    """
+    engine = get_engine()
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    summary = None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(reply)
+        except StopIteration as done:
+            entry = done.value
+            break
+        reply = error = None
+        if step.stage in STAGE_STATUS:
+            percent, text = STAGE_STATUS[step.stage]
+            progress_bar.progress(percent)
+            status_text.text(text)
+        if step.stage == "execute":
+            # Debug: Show generated SQL
+            st.subheader("🔍 Generated SQL (Debug)")
+            st.code(step.args[2], language="sql")
+            # Run the query on a worker thread so it can be cancelled from the page
+            st.session_state.running_query = {
+                "job": engine.executor.start(engine.query_workers, *step.args),
+                "steps": steps,
+            }
+            progress_bar.empty()
+            status_text.empty()
+            return finish_running_query()
+        if step.stage == "summarize":
+            # Started once the entry is in the history, so the summary is saved with it
+            summary = step
+            continue
+        try:
+            reply = step.run()
+        except Exception as e:
+            error = e
+        if step.stage == "cached" and reply:
+            status_text.text("⚡ Reusing cached SQL query...")
+        elif step.stage == "generate" and sql_preview is not None:
+            sql_preview.empty()
+    progress_bar.empty()
+    status_text.empty()
+
+    history = st.session_state.qa_history
+    history.append(entry)
+    if summary is not None:
+        engine.background.submit(summarize_and_save, history, summary.call, *summary.args)
+    if entry["error"] not in (None, CANCELLED):
+        st.error(f"❌ {entry['error']}")
+        return False
+    return True
+
+
+def finish_running_query():
+    """Wait for the query started by the last question, with a Cancel button
+    that stops the statement on the server, then finish the question's steps.
+
+    Returns False when the question failed (the error is shown on the page).
+    """
+    running = st.session_state.running_query
+    job = running["job"]
+    status_text = st.empty()
+    if st.button("⛔ Cancel query", key="cancel_query"):
+        job.cancel()
+    # Clicking Cancel interrupts this loop and reruns the page, which resumes waiting here
+    while not job.done():
+        status_text.text(f"🔍 Executing SQL query... {job.elapsed:.0f}s")
+        time.sleep(0.25)
+    status_text.empty()
+    st.session_state.running_query = None
+    try:
+        execution = job.result()
+    except Exception as e:
+        return run_question(running["steps"], error=e)
+    return run_question(running["steps"], reply=execution)
+
+
+def summarize_and_save(history, summarize, qa, *args):
+    # Runs on a background thread: the summary streams into the entry, then goes to disk with it
+    try:
+        summarize(qa, *args)
+    finally:
+        history.save(qa)
+
+
+def clear_history():
+    if st.session_state.get("qa_history") is not None:
+        st.session_state.qa_history.clear()
+    st.session_state.history_page = None
+
+
 # Custom CSS for better styling with improved contrast
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(90deg, #2c3e50 0%, #34495e 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-    }
-    
-    .success-box {
-        background-color: #d1e7dd;
-        border: 2px solid #0f5132;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        color: #0f5132;
-        font-weight: 500;
-    }
-    
-    .info-box {
-        background-color: #cff4fc;
-        border: 2px solid #055160;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        color: #055160;
-        font-weight: 500;
-    }
-    
-    .warning-box {
-        background-color: #fff3cd;
-        border: 2px solid #664d03;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        color: #664d03;
-        font-weight: 500;
-    }
-    
-    .error-box {
-        background-color: #f8d7da;
-        border: 2px solid #721c24;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        color: #721c24;
-        font-weight: 500;
-    }
-    
-    .table-grid {
-        display: grid;
-        grid-template-columns: repeat(5, 1fr);
-        gap: 10px;
-        margin: 1rem 0;
-    }
-    
-    .table-button {
-        background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 12px;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        text-align: center;
-        font-weight: 500;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .table-button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-    }
-    
-    .table-button.selected {
-        background: linear-gradient(135deg, #198754 0%, #20c997 100%);
-        box-shadow: 0 4px 8px rgba(25, 135, 84, 0.3);
-        border: 2px solid #198754;
-    }
-    
-    .qa-container {
-        background: #2c3e50;
-        border-radius: 10px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        border-left: 4px solid #3498db;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.3);
-        color: white;
-    }
-    
-    .question-box {
-        background: #34495e;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-        border: 1px solid #4a5568;
-        color: white;
-    }
-    
-    .result-box {
-        background: #34495e;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        border-left: 4px solid #27ae60;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-        color: white;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-        color: white !important;
-        border: none;
-        border-radius: 8px;
-        padding: 12px 24px;
-        font-weight: 500;
-        transition: all 0.3s ease;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        background: linear-gradient(135deg, #34495e 0%, #2c3e50 100%);
-    }
-    
-    .stTextInput > div > div > input {
-        border-radius: 8px;
-        border: 2px solid #dee2e6;
-        padding: 12px;
-        font-size: 16px;
-        color: #212529;
-        background-color: white;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #2c3e50;
-        box-shadow: 0 0 0 0.2rem rgba(44, 62, 80, 0.25);
-        outline: none;
-    }
-    
-    .stTextArea > div > div > textarea {
-        border-radius: 8px;
-        border: 2px solid #dee2e6;
-        padding: 12px;
-        font-size: 16px;
-        color: #212529;
-        background-color: white;
-    }
-    
-    .stTextArea > div > div > textarea:focus {
-        border-color: #2c3e50;
-        box-shadow: 0 0 0 0.2rem rgba(44, 62, 80, 0.25);
-        outline: none;
-    }
-    
-    .stSelectbox > div > div > select {
-        border-radius: 8px;
-        border: 2px solid #dee2e6;
-        padding: 8px 12px;
-        font-size: 16px;
-        color: #212529;
-        background-color: white;
-    }
-    
-    .stSelectbox > div > div > select:focus {
-        border-color: #2c3e50;
-        box-shadow: 0 0 0 0.2rem rgba(44, 62, 80, 0.25);
-        outline: none;
-    }
-    
-    /* Ensure text is visible in all containers */
-    .qa-container, .question-box, .result-box {
-        color: white;
-    }
-    
-    .qa-container h4, .qa-container h5, .question-box h4, .result-box h4, .result-box h5 {
-        color: #3498db;
-        font-weight: 600;
-    }
-    
-    .qa-container p, .question-box p, .result-box p {
-        color: #ecf0f1;
-        line-height: 1.6;
-    }
-    
-    .qa-container code, .result-box code {
-        background-color: #2c3e50;
-        color: #e74c3c;
-        padding: 2px 6px;
-        border-radius: 4px;
-        font-family: 'Courier New', monospace;
-        border: 1px solid #4a5568;
-    }
-    
-    .qa-container pre, .result-box pre {
-        background-color: #2c3e50;
-        border: 1px solid #4a5568;
-        border-radius: 4px;
-        padding: 12px;
-        color: #ecf0f1;
-        font-family: 'Courier New', monospace;
-        overflow-x: auto;
-    }
-    
-    /* Progress bar styling */
-    .stProgress > div > div > div > div {
-        background-color: #2c3e50;
-    }
-    
-    /* Status text styling */
-    .status-text {
-        color: #2c3e50;
-        font-weight: 500;
-        margin: 8px 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>\n{load_css()}</style>", unsafe_allow_html=True)
 
 # Main header
 st.markdown("""
@@ -264,7 +216,6 @@ if "current_context" not in st.session_state:
         "table": None,
         "schema": None,
         "schema_name": "dbo",
-        "connection": None
     }
 
 # Step 1: Ask for server connection (not DB yet)
@@ -283,25 +234,22 @@ with st.form("server_credentials"):
 
 if submitted:
     with st.spinner("🔄 Connecting to server..."):
-        driver = "ODBC Driver 17 for SQL Server"
-        port_str = f",{port}" if port else ""
+        server_info = {
+            "server": server,
+            "port": port,
+            "username": username,
+            "password": password
+        }
         try:
-            conn_str = f"DRIVER={{{driver}}};SERVER={server}{port_str};UID={username};PWD={password};DATABASE=master"
-            test_conn = pyodbc.connect(conn_str)
-            test_cursor = test_conn.cursor()
-
             # Step 2: Fetch all databases
-            test_cursor.execute("SELECT name FROM sys.databases WHERE database_id > 4")
-            db_list = [row[0] for row in test_cursor.fetchall()]
+            db_list = get_backend().list_databases(server_info)
 
             if db_list:
+                # Load the model while the user picks a database and table
+                if not SERVICE_CONFIG["url"]:
+                    get_engine().background.submit(get_engine().warm_up)
                 st.markdown('<div class="success-box">✅ Connected successfully!</div>', unsafe_allow_html=True)
-                st.session_state.server_info = {
-                    "server": server,
-                    "port": port,
-                    "username": username,
-                    "password": password
-                }
+                st.session_state.server_info = server_info
                 st.session_state.db_list = db_list
                 # Reset context when connecting to new server
                 st.session_state.current_context = {
@@ -309,7 +257,6 @@ if submitted:
                     "table": None,
                     "schema": None,
                     "schema_name": "dbo",
-                    "connection": None
                 }
             else:
                 st.markdown('<div class="warning-box">⚠️ No user databases found.</div>', unsafe_allow_html=True)
@@ -330,36 +277,23 @@ if "db_list" in st.session_state:
             
             # Automatically load tables when database changes
             with st.spinner("🔄 Loading tables..."):
-                server = st.session_state.server_info["server"]
-                port = st.session_state.server_info["port"]
-                username = st.session_state.server_info["username"]
-                password = st.session_state.server_info["password"]
                 database = selected_db
 
-                port_str = f",{port}" if port else ""
-                conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server}{port_str};DATABASE={database};UID={username};PWD={password}"
-
                 try:
-                    conn = pyodbc.connect(conn_str)
-                    cursor = conn.cursor()
-
-                    cursor.execute("""
-                        SELECT TABLE_NAME 
-                        FROM INFORMATION_SCHEMA.TABLES 
-                        WHERE TABLE_TYPE='BASE TABLE'
-                    """)
-                    tables = [row[0] for row in cursor.fetchall()]
+                    # One set-based catalog query per database, reused until the schema changes
+                    catalog = get_backend().load_catalog(st.session_state.server_info, database)
+                    tables = catalog.table_keys()
 
                     if tables:
                         st.markdown('<div class="success-box">✅ Tables loaded automatically!</div>', unsafe_allow_html=True)
-                        st.session_state.conn = conn
+                        st.session_state.catalog = catalog
                         st.session_state.tables = tables
                         # Update context with new database
                         st.session_state.current_context["database"] = database
-                        st.session_state.current_context["connection"] = conn
                         st.session_state.current_context["table"] = None
                         st.session_state.current_context["schema"] = None
                         st.session_state.current_context["schema_name"] = "dbo"
+                        st.session_state.current_context["table_info"] = None
                         # Clear previous table selection when database changes
                         if "selected_table" in st.session_state:
                             del st.session_state.selected_table
@@ -377,95 +311,87 @@ if "db_list" in st.session_state:
 if "tables" in st.session_state:
     st.subheader("📋 Select a Table to Explore")
     
-    # Display tables in a grid format
-    tables = st.session_state.tables
-    
-    # Create columns for the grid (5 columns)
-    col1, col2, col3, col4, col5 = st.columns(5)
-    
-    # Distribute tables across columns
-    for i, table in enumerate(tables):
-        if i % 5 == 0:
-            col = col1
-        elif i % 5 == 1:
-            col = col2
-        elif i % 5 == 2:
-            col = col3
-        elif i % 5 == 3:
-            col = col4
-        else:
-            col = col5
-            
-        # Create a button for each table with proper selection highlighting
-        selected_table = st.session_state.get("selected_table", None)
-        is_selected = table == selected_table
-        
-        # Use different button types for selected vs unselected
-        if is_selected:
-            if col.button(f"✅ {table}", key=f"table_{table}", use_container_width=True, type="primary"):
-                st.session_state.selected_table = table
-                st.rerun()
-        else:
-            if col.button(f"📄 {table}", key=f"table_{table}", use_container_width=True, type="secondary"):
-                st.session_state.selected_table = table
-                st.rerun()
+    if st.button("🔄 Reload Schema", type="secondary"):
+        # Re-read the catalog, including the row counts, which don't move the change token
+        st.session_state.catalog = get_backend().load_catalog(
+            st.session_state.server_info, st.session_state.current_context["database"], force=True
+        )
+        st.session_state.tables = st.session_state.catalog.table_keys()
+        st.session_state.pop("last_loaded_table", None)
+        st.rerun()
+    
+    # Search, sort and page through the catalog's table index; only this page's tiles are rendered
+    search_col, sort_col = st.columns([3, 1])
+    search = search_col.text_input("🔍 Search tables", key="table_search", placeholder="Name, prefix or schema.name")
+    sort = sort_col.selectbox("Sort by", TABLE_SORTS, key="table_sort")
+    if (search, sort) != st.session_state.get("table_browse"):
+        st.session_state.table_browse = (search, sort)
+        st.session_state.table_page = 1
+    page_size = TABLE_BROWSER_CONFIG["page_size"]
+    browse = st.session_state.catalog.index.page(
+        search, sort, st.session_state.get("recent_tables", []), st.session_state.get("table_page", 1), page_size
+    )
+    st.session_state.table_page = browse.page
+
+    if browse.matches:
+        first = (browse.page - 1) * page_size + 1
+        st.caption(
+            f"Showing {first:,}–{first + len(browse.tables) - 1:,} of {browse.matches:,} matching tables "
+            f"({len(st.session_state.catalog.tables):,} in the database)"
+        )
+    else:
+        st.caption("No tables match the search.")
+
+    # Create a button for each table with proper selection highlighting
+    columns = st.columns(TABLE_BROWSER_CONFIG["columns"])
+    selected_table = st.session_state.get("selected_table", None)
+    for i, info in enumerate(browse.tables):
+        col = columns[i % len(columns)]
+        is_selected = info.key == selected_table
+        size = f" · {format_rows(info.rows)}" if info.rows is not None else ""
+        label = f"{'✅' if is_selected else '📄'} {table_label(info.key)}{size}"
+        if col.button(label, key=f"table_{info.schema}.{info.name}", use_container_width=True,
+                      type="primary" if is_selected else "secondary"):
+            st.session_state.selected_table = info.key
+            recent = [key for key in st.session_state.get("recent_tables", []) if key != info.key]
+            st.session_state.recent_tables = [info.key] + recent[:TABLE_BROWSER_CONFIG["recent"] - 1]
+            st.rerun()
+
+    if browse.pages > 1:
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("◀ Previous", key="table_prev", disabled=browse.page <= 1, use_container_width=True):
+            st.session_state.table_page = browse.page - 1
+            st.rerun()
+        page_col.markdown(f"<div style='text-align: center'>Page {browse.page:,} of {browse.pages:,}</div>", unsafe_allow_html=True)
+        if next_col.button("Next ▶", key="table_next", disabled=browse.page >= browse.pages, use_container_width=True):
+            st.session_state.table_page = browse.page + 1
+            st.rerun()
     
     # Show currently selected table
     if "selected_table" in st.session_state:
-        st.markdown(f'<div class="info-box">🎯 <strong>Selected Table:</strong> {st.session_state.selected_table}</div>', unsafe_allow_html=True)
+        schema_name, table_name = st.session_state.selected_table
+        st.markdown(f'<div class="info-box">🎯 <strong>Selected Table:</strong> {schema_name}.{table_name}</div>', unsafe_allow_html=True)
         
-        # Load schema for selected table
+        # Load schema for selected table from the in-memory catalog (no metadata round trip)
         if st.session_state.selected_table != st.session_state.get("last_loaded_table", None):
             st.session_state.last_loaded_table = st.session_state.selected_table
             
-            with st.spinner(f"🔄 Loading schema for {st.session_state.selected_table}..."):
-                cursor = st.session_state.conn.cursor()
-                try:
-                    # First, get the schema name for this table
-                    cursor.execute(f"""
-                        SELECT TABLE_SCHEMA 
-                        FROM INFORMATION_SCHEMA.TABLES 
-                        WHERE TABLE_NAME = ?
-                    """, st.session_state.selected_table)
-                    
-                    schema_result = cursor.fetchone()
-                    if schema_result:
-                        schema_name = schema_result[0]
-                        st.session_state.current_context["schema_name"] = schema_name
-                    else:
-                        schema_name = "dbo"  # Default fallback
-                        st.session_state.current_context["schema_name"] = schema_name
-                    
-                    # Execute the query to get column information
-                    cursor.execute(f"""
-                        SELECT COLUMN_NAME, DATA_TYPE 
-                        FROM INFORMATION_SCHEMA.COLUMNS 
-                        WHERE TABLE_NAME = ? AND TABLE_SCHEMA = ?
-                    """, st.session_state.selected_table, schema_name)
-                    
-                    # Fetch all rows as proper tuples
-                    rows = []
-                    for row in cursor.fetchall():
-                        # Convert each row to a proper tuple of values
-                        rows.append((row.COLUMN_NAME, row.DATA_TYPE))  # Access by column name
-                    
-                    # Create DataFrame
-                    if rows:
-                        schema_df = pd.DataFrame(rows, columns=['COLUMN_NAME', 'DATA_TYPE'])
-                        st.session_state.schema = schema_df
-                        # Update context with new table and schema
-                        st.session_state.current_context["table"] = st.session_state.selected_table
-                        st.session_state.current_context["schema"] = schema_df
-                        st.markdown(f'<div class="success-box">✅ Schema loaded for table <strong>{st.session_state.selected_table}</strong> (Schema: <strong>{schema_name}</strong>)</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<div class="warning-box">No columns found for table {st.session_state.selected_table}</div>', unsafe_allow_html=True)
-                        
-                except Exception as e:
-                    st.markdown(f'<div class="error-box">Error fetching schema: {str(e)}</div>', unsafe_allow_html=True)
+            table_info = st.session_state.catalog.table(schema_name, table_name)
+            if table_info is not None and table_info.columns:
+                schema_df = table_info.to_frame()
+                st.session_state.schema = schema_df
+                # Update context with new table and schema
+                st.session_state.current_context["table"] = table_name
+                st.session_state.current_context["schema_name"] = schema_name
+                st.session_state.current_context["schema"] = schema_df
+                st.session_state.current_context["table_info"] = table_info
+                st.markdown(f'<div class="success-box">✅ Schema loaded for table <strong>{table_name}</strong> (Schema: <strong>{schema_name}</strong>)</div>', unsafe_allow_html=True)
+            else:
+                st.markdown(f'<div class="warning-box">No columns found for table {schema_name}.{table_name}</div>', unsafe_allow_html=True)
 
 # Step 5: Show schema
 if "schema" in st.session_state:
-    st.subheader(f"📑 Schema for table `{st.session_state.selected_table}`")
+    st.subheader(f"📑 Schema for table `{st.session_state.current_context['table']}`")
     
     # Display schema in a nice format
     schema_df = st.session_state.schema
@@ -474,14 +400,21 @@ if "schema" in st.session_state:
 # Step 6: Continuous Q&A with context awareness
 if "schema" in st.session_state and "selected_table" in st.session_state:
     st.subheader("💬 Ask Questions About Your Data")
-    if "qa_history" not in st.session_state:
-        st.session_state.qa_history = []
+    # History is kept on disk per server and login; the session holds only its recent part
+    if st.session_state.get("history_server") != st.session_state.server_info:
+        st.session_state.qa_history = get_backend().session_history(st.session_state.server_info)
+        st.session_state.history_server = st.session_state.server_info
+        st.session_state.history_page = None
 
     # Display current context
     current_db = st.session_state.current_context["database"]
     current_table = st.session_state.current_context["table"]
     st.markdown(f'<div class="info-box">🔍 <strong>Current Context:</strong> Database: <code>{current_db}</code> | Table: <code>{current_table}</code></div>', unsafe_allow_html=True)
 
+    # Release result handles that nobody has paged through for a while (the service keeps none open here)
+    if not SERVICE_CONFIG["url"]:
+        get_engine().open_streams.sweep()
+
     # Display Q&A history first
     if st.session_state.qa_history:
         st.subheader("📚 Q&A History")
@@ -490,35 +423,25 @@ if "schema" in st.session_state and "selected_table" in st.session_state:
         col1, col2 = st.columns([1, 4])
         with col1:
             if st.button("🗑️ Clear History", type="secondary"):
-                st.session_state.qa_history = []
+                clear_history()
                 st.rerun()
         
-        # Display history in chronological order (oldest first, latest at bottom)
-        for i, qa in enumerate(st.session_state.qa_history):
+        # One page at a time, oldest first; None is the newest page, which new questions land on
+        history = st.session_state.qa_history
+        page = history.page(st.session_state.get("history_page"), HISTORY_CONFIG["page_size"])
+        with col2:
+            st.caption(
+                f"Showing questions {page.first}–{page.first + len(page.entries) - 1} of {page.total} · "
+                f"results in memory: {history.memory_bytes() / (1024 * 1024):.1f} MB "
+                f"of {HISTORY_CONFIG['memory_budget'] / (1024 * 1024):.0f} MB"
+            )
+
+        for number, qa in enumerate(page.entries, start=page.first):
             with st.container():
-                # Parse the result string to create a proper table
-                result_lines = qa['result'].strip().split('\n')
-                if len(result_lines) > 1:
-                    # First line contains headers
-                    headers = result_lines[0].split('\t')
-                    # Remaining lines contain data
-                    data_rows = []
-                    for line in result_lines[1:]:
-                        if line.strip():  # Skip empty lines
-                            data_rows.append(line.split('\t'))
-                    
-                    # Create DataFrame for display
-                    if data_rows:
-                        result_df = pd.DataFrame(data_rows, columns=headers)
-                    else:
-                        result_df = pd.DataFrame(columns=headers)
-                else:
-                    result_df = pd.DataFrame()
-                
                 st.markdown(f"""
                 <div class="qa-container">
                     <div class="question-box">
-                        <h4>❓ Question {i + 1}</h4>
+                        <h4>❓ Question {number}</h4>
                         <p><strong>Context:</strong> Database: <code>{qa.get('database', 'N/A')}</code> | Table: <code>{qa.get('table', 'N/A')}</code></p>
                         <p><strong>Q:</strong> {qa['question']}</p>
                     </div>
@@ -528,22 +451,63 @@ if "schema" in st.session_state and "selected_table" in st.session_state:
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
+                if qa.get("guardrail"):
+                    st.warning(f"🛡️ {qa['guardrail']}")
+                if qa.get("repairs"):
+                    with st.expander(f"🔧 {len(qa['repairs'])} failed check(s) before this SQL"):
+                        for attempt in qa["repairs"]:
+                            st.code(attempt["sql"], language="sql")
+                            st.caption(f"{attempt['check']} check, {attempt['validate_ms']:.0f} ms: {attempt['error']}")
                 
-                # Display results in a table format
-                if not result_df.empty:
-                    st.dataframe(result_df, use_container_width=True)
-                else:
+                # Only the latest result is rendered by default; others load from disk when opened
+                rows = len(qa["result"]) if qa.get("result") is not None else qa.get("result_rows")
+                if not rows:
                     st.info("No results to display")
+                elif number == page.total or st.toggle(f"📊 Show result ({rows:,} rows)", key=f"show_result_{qa['id']}"):
+                    # Results are stored as typed DataFrames, so nothing is re-parsed here
+                    result_df = history.result(qa)
+                    if result_df is not None and not result_df.empty:
+                        st.dataframe(result_df, use_container_width=True)
+                    else:
+                        st.info("No results to display")
+                    
+                    stream = qa.get("stream")
+                    if qa.get("truncated"):
+                        st.caption(f"✂️ Truncated at {rows:,} rows (row/size cap reached)")
+                    elif stream is not None and stream.has_more:
+                        st.caption(f"Showing the first {rows:,} rows; more are available.")
+                        if st.button(f"⬇️ Load next {FETCH_CONFIG['page_rows']:,} rows", key=f"load_more_{qa['id']}"):
+                            page_df = stream.fetch_page()
+                            qa["result"] = pd.concat([result_df, page_df], ignore_index=True)
+                            qa["result_bytes"] = frame_nbytes(qa["result"])
+                            qa["truncated"] = stream.truncated
+                            history.save(qa, result=True)
+                            st.rerun()
+                    elif (stream is not None and not stream.exhausted) or qa.get("more_rows"):
+                        st.caption(f"Showing the first {rows:,} rows; re-run the question to see more.")
+                    elif qa.get("has_more"):
+                        st.caption(f"Showing the first {rows:,} rows (the query service returns one page).")
                 
-                st.markdown(f"""
-                <div class="result-box">
-                    <h5>💡 Summary:</h5>
-                    <p>{qa['summary']}</p>
-                    <small>🕒 {qa.get('timestamp', 'N/A').strftime('%Y-%m-%d %H:%M:%S') if hasattr(qa.get('timestamp', ''), 'strftime') else 'N/A'}</small>
-                </div>
-                """, unsafe_allow_html=True)
+                if qa.get("summary_pending"):
+                    render_pending_summary(qa)
+                else:
+                    render_summary(qa)
                 st.markdown("---")
 
+        if page.pages > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("⬅️ Older", disabled=page.page == 1, key="history_prev"):
+                    st.session_state.history_page = page.page - 1
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {page.page} of {page.pages}")
+            with col3:
+                if st.button("Newer ➡️", disabled=page.page == page.pages, key="history_next"):
+                    # Back on the newest page, follow new questions again
+                    st.session_state.history_page = None if page.page + 1 == page.pages else page.page + 1
+                    st.rerun()
+
     # Question input at the bottom
     st.subheader("🤖 Ask a New Question")
     
@@ -556,197 +520,80 @@ if "schema" in st.session_state and "selected_table" in st.session_state:
             placeholder="Ask anything about your data..."
         )
         
+        cache_mode = st.radio(
+            "Result cache",
+            ["Use cache", "Refresh", "Bypass"],
+            horizontal=True,
+            help="Refresh re-runs the query and updates the cached result; Bypass re-runs it without touching the cache."
+        )
+        
         col1, col2, col3 = st.columns([1, 1, 2])
         with col1:
             ask_button = st.form_submit_button("🚀 Ask", use_container_width=True)
         with col2:
             if st.form_submit_button("🔄 Clear", type="secondary", use_container_width=True):
-                st.session_state.qa_history = []
+                clear_history()
                 st.rerun()
 
-    if ask_button and user_question:
-        # Get current context
-        table_name = st.session_state.current_context["table"]
-        schema_df = st.session_state.current_context["schema"]
-        database_name = st.session_state.current_context["database"]
-        schema_name = st.session_state.current_context.get("schema_name", "dbo")
-        
-        schema_lines = [
-            f"{row['COLUMN_NAME']} ({row['DATA_TYPE']})"
-            for _, row in schema_df.iterrows()
-        ]
-        schema_str = "\n".join(schema_lines)
-        prompt = (
-            f"Table: [{schema_name}].[{table_name}]\n"
-            f"Columns: {schema_str}\n"
-            f"Task: {user_question}\n\n"
-            f"IMPORTANT: Return ONLY the SQL query. No explanations, no comments, no text before or after.\n"
-            f"Rules: Use aggregates when possible, TOP N for limits, WHERE for filters, GROUP BY with aggregates.\n\n"
-            f"SQL:"
+    # This process's numbers, or the query service's when the page is its client
+    try:
+        diagnostics = get_backend().diagnostics()
+    except Exception as e:
+        diagnostics = {"histograms": {}, "counters": {}, "profiles": [], "result_cache": None}
+        st.caption(f"Diagnostics unavailable: {str(e)}")
+    cache_stats = diagnostics["result_cache"] or {"hits": 0, "misses": 0}
+    if cache_stats["hits"] or cache_stats["misses"]:
+        st.caption(
+            f"⚡ Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_ratio']:.0%} of queries served without hitting the database) · "
+            f"{cache_stats['entries']} entries, {cache_stats['bytes'] / (1024 * 1024):.1f} MB"
         )
 
-        # Create progress indicators
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Step 1: Generate SQL
-        status_text.text("🤖 Generating SQL query...")
-        progress_bar.progress(25)
-        
-        # Call Ollama API with optimized settings for speed
-        ollama_url = "http://localhost:11434/api/generate"
-        payload = {
-            "model": SPEED_CONFIG["model"],
-            "prompt": prompt,
-            "stream": SPEED_CONFIG["enable_streaming"],
-            "options": {
-                "temperature": SPEED_CONFIG["temperature"],
-                "top_p": SPEED_CONFIG["top_p"],
-                "top_k": SPEED_CONFIG["top_k"],
-                "num_predict": SPEED_CONFIG["max_tokens"],
-                "stop": ["```", "---", "\n\n\n"]  # Stop at common SQL endings
-            }
-        }
-        
-        try:
-            response = requests.post(ollama_url, json=payload)
-            sql_query = response.json().get("response", "").strip()
-            
-            # Clean up SQL Server syntax - remove backticks and fix common issues
-            import re
-            
-            # Remove any explanatory text before/after SQL
-            sql_query = sql_query.strip()
-            
-            # Remove common explanatory prefixes
-            sql_query = re.sub(r'^(Here\'s|Here is|This|The SQL query is|SQL query:|Query:)\s*', '', sql_query, flags=re.IGNORECASE)
-            
-            # Remove markdown code blocks
-            sql_query = re.sub(r'^```sql\s*', '', sql_query, flags=re.IGNORECASE)
-            sql_query = re.sub(r'^```\s*', '', sql_query)
-            sql_query = re.sub(r'\s*```$', '', sql_query)
-            
-            # Remove backticks around the entire query
-            if sql_query.startswith('`') and sql_query.endswith('`'):
-                sql_query = sql_query[1:-1]
-            
-            # Remove square brackets around the entire query
-            if sql_query.startswith('[') and sql_query.endswith(']'):
-                sql_query = sql_query[1:-1]
-            
-            # Replace backticks around identifiers with square brackets
-            sql_query = re.sub(r'`([^`]+)`', r'[\1]', sql_query)
-            
-            # Extract only the first SQL statement if multiple lines
-            lines = sql_query.split('\n')
-            sql_lines = []
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith('--') and not line.lower().startswith('note:') and not line.lower().startswith('explanation:'):
-                    sql_lines.append(line)
-                elif sql_lines:  # Stop at first explanatory text after SQL started
-                    break
-            
-            sql_query = ' '.join(sql_lines).strip()
-            
-            # Debug: Show generated SQL
-            st.subheader("🔍 Generated SQL (Debug)")
-            st.code(sql_query, language="sql")
-            
-            progress_bar.progress(50)
-            status_text.text("🔍 Executing SQL query...")
-            
-            # Execute the generated SQL query
-            try:
-                # Create a fresh connection to ensure proper database context
-                server = st.session_state.server_info["server"]
-                port = st.session_state.server_info["port"]
-                username = st.session_state.server_info["username"]
-                password = st.session_state.server_info["password"]
-                
-                port_str = f",{port}" if port else ""
-                conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server}{port_str};DATABASE={database_name};UID={username};PWD={password}"
-                
-                query_conn = pyodbc.connect(conn_str)
-                cursor = query_conn.cursor()
-                
-                cursor.execute(sql_query)
-                result_rows = cursor.fetchall()
-                result_columns = [desc[0] for desc in cursor.description]
-
-                # Format result as a string
-                result_str = "\t".join(result_columns) + "\n"
-                for row in result_rows:
-                    result_str += "\t".join(str(item) for item in row) + "\n"
-                
-                # Close the query connection
-                query_conn.close()
-                
-                progress_bar.progress(75)
-                status_text.text("💡 Generating summary...")
-                
-                # Generate human-readable summary using Ollama with optimized settings
-                summary_prompt = (
-                    f"Question: {user_question}\n"
-                    f"Database: {database_name}\n"
-                    f"Table: {table_name}\n"
-                    f"SQL Result:\n{result_str}\n"
-                    "Summarize the result above in one sentence for a non-technical user."
-                )
-                summary_payload = {
-                    "model": SPEED_CONFIG["model"],
-                    "prompt": summary_prompt,
-                    "stream": SPEED_CONFIG["enable_streaming"],
-                    "options": {
-                        "temperature": SPEED_CONFIG["temperature"],
-                        "top_p": SPEED_CONFIG["top_p"],
-                        "top_k": SPEED_CONFIG["top_k"],
-                        "num_predict": SPEED_CONFIG["summary_max_tokens"],
-                        "stop": ["\n", ".", "---"]
-                    }
-                }
-                summary_response = requests.post(ollama_url, json=summary_payload)
-                summary_text = summary_response.json().get("response", "").strip()
-                
-                progress_bar.progress(100)
-                status_text.text("✅ Complete!")
-                
-                # Save to history with context
-                st.session_state.qa_history.append({
-                    "question": user_question,
-                    "sql": sql_query,
-                    "result": result_str,
-                    "summary": summary_text,
-                    "database": database_name,
-                    "table": table_name,
-                    "timestamp": datetime.now()
-                })
-                
-                # Clear the progress indicators
-                time.sleep(1)
-                progress_bar.empty()
-                status_text.empty()
-                
-                # Show success message
-                st.success("🎉 Question processed successfully!")
-                st.rerun()
-                
-            except Exception as e:
-                st.session_state.qa_history.append({
-                    "question": user_question,
-                    "sql": sql_query,
-                    "result": "",
-                    "summary": f"Error executing SQL: {str(e)}",
-                    "database": database_name,
-                    "table": table_name,
-                    "timestamp": datetime.now()
-                })
-                progress_bar.empty()
-                status_text.empty()
-                st.error(f"❌ Error executing SQL: {str(e)}")
-                
-        except Exception as e:
-            progress_bar.empty()
-            status_text.empty()
-            st.error(f"❌ Error generating SQL: {str(e)}")
+    with st.expander("📈 Diagnostics"):
+        if diagnostics["histograms"]:
+            st.markdown("**Stage latency (ms)**")
+            st.dataframe(pd.DataFrame(diagnostics["histograms"]).T.round(1), use_container_width=True)
+            profiles = diagnostics["profiles"]
+            if profiles:
+                # Latency and share of SQL that passed validation per task and model
+                st.markdown("**Model profiles**")
+                st.dataframe(pd.DataFrame(profiles).round(3), use_container_width=True, hide_index=True)
+            st.markdown("**Counters**")
+            st.json(diagnostics["counters"])
+            timed = [qa for qa in st.session_state.qa_history if qa.get("timings")]
+            if timed:
+                st.markdown("**Last question**")
+                st.json({"timings_ms": timed[-1]["timings"], "ollama": timed[-1].get("ollama", {})})
+        else:
+            st.info("Ask a question to collect timings.")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("⬇️ Prometheus text", prometheus_text(diagnostics), file_name="metrics.prom", use_container_width=True)
+        with col2:
+            st.download_button("⬇️ JSON", json.dumps(diagnostics, indent=2), file_name="metrics.json", use_container_width=True)
+        if SERVICE_CONFIG["url"]:
+            st.caption(f"Query service: {SERVICE_CONFIG['url']}/metrics (JSON at /diagnostics)")
+        elif METRICS_CONFIG["export_port"]:
+            st.caption(f"Scrape endpoint: http://{METRICS_CONFIG['export_host']}:{METRICS_CONFIG['export_port']}/metrics (JSON at /metrics.json)")
 
+    running = st.session_state.get("running_query")
+    if running is not None:
+        if ask_button and user_question:
+            # A new question supersedes the query still running
+            running["job"].cancel()
+        if finish_running_query() and not (ask_button and user_question):
+            st.rerun()
+
+    if ask_button and user_question and SERVICE_CONFIG["url"]:
+        ask_via_service(user_question, cache_mode)
+    elif ask_button and user_question:
+        context = st.session_state.current_context
+        # Show tokens as they arrive; generation stops once a full statement is in
+        sql_preview = st.empty()
+        steps = get_engine().pipeline.steps(
+            st.session_state.server_info, context["database"], context["table_info"], user_question, cache_mode,
+            st.session_state.catalog, on_token=lambda text: sql_preview.code(text, language="sql"),
+        )
+        if run_question(steps, sql_preview=sql_preview):
+            # Results are ready; the summary keeps streaming into the history entry
+            st.rerun()
@@ -0,0 +1,339 @@
+"""Run a file of questions against one or more databases from the command line.
+
+    python batch.py questions.txt --server localhost --username sa \\
+        --database SalesDB --database SalesArchive --table dbo.Orders \\
+        --output kpi.jsonl --csv kpi.csv --llm-concurrency 2 --db-concurrency 4
+
+The question file is plain text (one question per line, ``#`` for comments),
+JSONL or CSV; the latter two may set ``id``, ``table`` and ``database`` per
+question. Every question runs generation, execution and summarization through
+the engine with separate limits on concurrent LLM calls and DB queries. Each
+finished item is appended to the JSONL output (and CSV) straight away; running
+the same command again skips items already in the output, so an interrupted
+batch resumes where it stopped.
+"""
+import argparse
+import csv
+import getpass
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+
+from engine import Engine
+
+CSV_FIELDS = [
+    "id", "database", "table", "question", "status", "error", "sql", "guardrail",
+    "rows", "truncated", "summary", "end_to_end_ms", "finished_at",
+]
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    id: str
+    database: str
+    schema: str
+    table: str
+    question: str
+
+
+def parse_table(name):
+    """``schema.table`` or ``table`` (dbo) -> (schema, table)."""
+    schema, _, table = name.strip().strip("[]").rpartition(".")
+    return (schema.strip("[]") or "dbo", table.strip("[]"))
+
+
+def item_id(database, schema, table, question):
+    from generation_cache import normalize_question
+    material = "|".join([database, schema, table, normalize_question(question)])
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path):
+    """Yield dicts with at least ``question`` from a .txt, .jsonl or .csv file."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if extension == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif extension == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield {"question": line}
+
+
+def build_items(rows, databases, default_table):
+    items = {}
+    for row in rows:
+        question = (row.get("question") or "").strip()
+        if not question:
+            continue
+        table = row.get("table") or default_table
+        if not table:
+            raise SystemExit(f"No table for question {question!r}: pass --table or set it in the question file")
+        schema, name = parse_table(table)
+        for database in [row["database"]] if row.get("database") else databases:
+            key = row.get("id") or item_id(database, schema, name, question)
+            if row.get("id") and len(databases) > 1 and not row.get("database"):
+                key = f"{key}@{database}"
+            items.setdefault(key, BatchItem(key, database, schema, name, question))
+    return list(items.values())
+
+
+def completed_ids(path, retry_errors=False):
+    """Ids already recorded in the JSONL output; drops a torn last line."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Interrupted mid-write: cut the partial record so appends stay valid
+            f.truncate(end)
+    for line in data[:end].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record.get("status") == "ok" or not retry_errors:
+            done.add(record["id"])
+    return done
+
+
+class ResultWriter:
+    """Appends records to JSONL (and optionally CSV) as soon as they finish."""
+
+    def __init__(self, jsonl_path, csv_path=None):
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8")
+        self._csv_file = self._csv = None
+        if csv_path:
+            new_file = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+            self._csv_file = open(csv_path, "a", encoding="utf-8", newline="")
+            self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            if new_file:
+                self._csv.writeheader()
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._jsonl.write(line + "\n")
+            self._jsonl.flush()
+            if self._csv is not None:
+                self._csv.writerow({**record, "end_to_end_ms": record["timings"].get("end_to_end_ms")})
+                self._csv_file.flush()
+
+    def close(self):
+        self._jsonl.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+
+class BatchRunner:
+    def __init__(self, engine, server_info, llm_concurrency=2, db_concurrency=4, summarize=True,
+                 cache_mode="Use cache", results_dir=None):
+        self.engine = engine
+        self.server_info = server_info
+        # Ollama and SQL Server saturate differently, so each gets its own limit
+        self.llm_slots = threading.BoundedSemaphore(llm_concurrency)
+        self.db_slots = threading.BoundedSemaphore(db_concurrency)
+        self.workers = llm_concurrency + db_concurrency
+        self.summarize = summarize
+        self.cache_mode = cache_mode
+        self.results_dir = results_dir
+        self._catalogs = {}
+        self._catalog_locks = {}    # One per database, so cold loads of different databases overlap
+        self._catalog_lock = threading.Lock()
+
+    def catalog(self, database):
+        with self._catalog_lock:
+            lock = self._catalog_locks.setdefault(database, threading.Lock())
+        with lock:
+            catalog = self._catalogs.get(database)
+            if catalog is None:
+                with self.db_slots:
+                    catalog = self._catalogs[database] = self.engine.load_catalog(self.server_info, database)
+        return catalog
+
+    def run_item(self, item):
+        record = {
+            "id": item.id,
+            "database": item.database,
+            "table": f"{item.schema}.{item.table}",
+            "question": item.question,
+            "status": "error",
+            "error": None,
+            "sql": None,
+            "guardrail": None,
+            "repairs": [],
+            "rows": None,
+            "truncated": None,
+            "columns": None,
+            "summary": None,
+            "timings": {},
+            "ollama": {},
+        }
+        try:
+            catalog = self.catalog(item.database)
+            table_info = catalog.table(item.schema, item.table)
+            if table_info is None:
+                raise LookupError(f"table {item.schema}.{item.table} not found in {item.database}")
+        except Exception as e:
+            record["error"] = f"catalog: {e}"
+            record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+            return record
+
+        from pipeline import drive
+        steps = self.engine.pipeline.steps(
+            self.server_info, item.database, table_info, item.question, self.cache_mode, catalog, self.summarize,
+        )
+        entry = drive(steps, self._run_step)
+        result_df = entry["result"]
+        record.update(
+            error=entry["error"], sql=entry["sql"], guardrail=entry.get("guardrail"), repairs=entry["repairs"],
+            timings=entry["timings"], ollama=entry["ollama"],
+        )
+        if result_df is not None:
+            if not self.summarize:
+                # Nothing follows the results
+                entry["timings"]["end_to_end_ms"] = entry["timings"]["time_to_results_ms"]
+            record.update(
+                status="ok", rows=len(result_df), truncated=entry["truncated"],
+                columns=[str(c) for c in result_df.columns], summary=entry["summary"] if self.summarize else None,
+            )
+            if self.results_dir:
+                result_df.to_csv(os.path.join(self.results_dir, f"{item.id}.csv"), index=False)
+        record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        return record
+
+    def _run_step(self, step):
+        # Ollama and SQL Server calls each take a slot of their own limit
+        if step.stage == "execute":
+            return self._execute(*step.args)
+        if step.resource == "llm":
+            with self.llm_slots:
+                return step.run()
+        if step.resource == "db":
+            with self.db_slots:
+                return step.run()
+        return step.run()
+
+    def _execute(self, server_info, database, sql, timer, cache_mode):
+        """Run the query and read the whole result (up to the fetch caps) into its ``Execution``.
+
+        The stream comes back closed; it still tells whether the caps cut the result off.
+        """
+        import pandas as pd
+        with self.db_slots:
+            execution = self.engine.executor.execute(server_info, database, sql, timer, cache_mode)
+            stream = execution.stream
+            if stream is None:
+                return execution
+            pages = [execution.frame]
+            try:
+                with timer.stage("fetch_rest_ms"):
+                    while stream.has_more:
+                        pages.append(stream.fetch_page())
+            finally:
+                stream.close()
+        if len(pages) > 1:
+            execution.frame = pd.concat(pages, ignore_index=True)
+        return execution
+
+    def run(self, items, writer, progress=None):
+        """Run ``items`` and write each record as it finishes; returns (ok, failed)."""
+        ok = failed = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(self.run_item, item): item for item in items}
+            for future in as_completed(futures):
+                record = future.result()
+                writer.write(record)
+                if record["status"] == "ok":
+                    ok += 1
+                else:
+                    failed += 1
+                if progress is not None:
+                    progress(ok + failed, len(items), record)
+        finally:
+            # On Ctrl-C, drop queued items; finished ones are already on disk
+            executor.shutdown(wait=True, cancel_futures=True)
+        return ok, failed
+
+
+def print_progress(done, total, record):
+    detail = f"{record['rows']:,} rows" if record["status"] == "ok" else record["error"]
+    elapsed = record["timings"].get("end_to_end_ms", 0) / 1000
+    print(f"[{done}/{total}] {record['status']:<5} {record['database']}: {record['question']} ({detail}, {elapsed:.1f}s)",
+          file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("questions", help="question file (.txt, .jsonl or .csv)")
+    parser.add_argument("--server", required=True)
+    parser.add_argument("--port", default="")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", help="defaults to $DB_PASSWORD, else prompts")
+    parser.add_argument("--database", action="append", required=True, help="repeat to run against several databases")
+    parser.add_argument("--table", help="schema.table (or table in dbo) for questions that don't name one")
+    parser.add_argument("--output", required=True, help="JSONL results; also the resume log")
+    parser.add_argument("--csv", help="also append results to this CSV file")
+    parser.add_argument("--results-dir", help="write each full result as <id>.csv here")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="max concurrent Ollama calls")
+    parser.add_argument("--db-concurrency", type=int, default=4, help="max concurrent database queries")
+    parser.add_argument("--no-summary", action="store_true", help="skip the summaries")
+    parser.add_argument("--cache-mode", choices=["Use cache", "Refresh", "Bypass"], default="Use cache")
+    parser.add_argument("--retry-errors", action="store_true", help="on resume, re-run items that failed")
+    args = parser.parse_args(argv)
+
+    password = args.password or os.environ.get("DB_PASSWORD")
+    if password is None:
+        password = getpass.getpass(f"Password for {args.username}@{args.server}: ")
+    server_info = {"server": args.server, "port": args.port, "username": args.username, "password": password}
+
+    items = build_items(read_questions(args.questions), args.database, args.table)
+    done = completed_ids(args.output, args.retry_errors)
+    pending = [item for item in items if item.id not in done]
+    print(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+    if not pending:
+        return 0
+    if args.results_dir:
+        os.makedirs(args.results_dir, exist_ok=True)
+
+    engine = Engine()
+    runner = BatchRunner(
+        engine,
+        server_info,
+        llm_concurrency=args.llm_concurrency,
+        db_concurrency=args.db_concurrency,
+        summarize=not args.no_summary,
+        cache_mode=args.cache_mode,
+        results_dir=args.results_dir,
+    )
+    writer = ResultWriter(args.output, args.csv)
+    started = time.perf_counter()
+    try:
+        ok, failed = runner.run(pending, writer, progress=print_progress)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        engine.close()
+    elapsed = time.perf_counter() - started
+    print(f"{ok} ok, {failed} failed in {elapsed:.1f}s ({(ok + failed) / elapsed:.2f} questions/s)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""Offline benchmarks for the question pipeline.
+
+Runs ``pipeline.QuestionPipeline`` headlessly against a stub Ollama server and
+a SQLite-backed pyodbc stand-in, so performance changes can be measured and
+compared between commits without SQL Server or a GPU. See ``benchmarks.run``.
+"""
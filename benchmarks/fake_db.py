@@ -0,0 +1,253 @@
+"""SQLite-backed stand-in for the slice of pyodbc/SQL Server the app uses.
+
+``create_database`` builds synthetic ``dbo.Customers`` and ``dbo.Orders``
+tables with a configurable row count. ``connector`` returns a ``connect``
+callable for ``connection_pool.PoolRegistry``; its connections answer the
+catalog/metadata queries the app issues (with row counts, a foreign key and a
+couple of comments) and run simple generated T-SQL
+(bracketed identifiers, ``TOP n``) by rewriting it for SQLite. Cursors report
+Python types in ``description`` like pyodbc, so results go through the same
+typed-frame path as with a real server. ``SET SHOWPLAN_XML ON`` makes later
+statements return a synthetic estimated plan (exact row count, cost growing
+with the rows of the tables read) so the guardrails have something to check,
+and ``sp_describe_first_result_set`` reports SQLite's compile errors the way
+pyodbc reports SQL Server's.
+"""
+import datetime
+import decimal
+import random
+import re
+import sqlite3
+import time
+from xml.sax.saxutils import quoteattr
+
+DATABASE_NAME = "BenchDB"
+
+TABLES = {
+    "Customers": [
+        ("CustomerID", "int"),
+        ("Name", "nvarchar"),
+        ("Country", "nvarchar"),
+        ("CreatedAt", "datetime"),
+    ],
+    "Orders": [
+        ("OrderID", "int"),
+        ("CustomerID", "int"),
+        ("Region", "nvarchar"),
+        ("OrderDate", "datetime"),
+        ("Amount", "decimal"),
+        ("Shipped", "bit"),
+    ],
+}
+
+# (table, column, referenced table, referenced column), reported through sys.foreign_key_columns
+FOREIGN_KEYS = [("Orders", "CustomerID", "Customers", "CustomerID")]
+DESCRIPTIONS = {("Orders", None): "One row per customer order", ("Orders", "Amount"): "Order value in USD"}
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+COUNTRIES = ["US", "UK", "DE", "FR", "IN", "BD", "JP", "BR"]
+
+# SQLite hands declared-type columns to these, mirroring pyodbc's Python types
+sqlite3.register_converter("datetime", lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("decimal", lambda value: decimal.Decimal(value.decode()))
+sqlite3.register_converter("bit", lambda value: value != b"0")
+# Parameters bound by the executor arrive as Decimal, which sqlite3 can't bind itself
+sqlite3.register_adapter(decimal.Decimal, float)
+
+_TOP = re.compile(r"^\s*SELECT\s+(DISTINCT\s+)?TOP\s*\(?\s*(\d+)\s*\)?", re.IGNORECASE)
+_SCHEMA_PREFIX = re.compile(r"\[dbo\]\.|\bdbo\.", re.IGNORECASE)
+_BRACKETED = re.compile(r"\[([^\]]+)\]")
+_SHOWPLAN = re.compile(r"^SET SHOWPLAN_XML (ON|OFF)$", re.IGNORECASE)
+_DESCRIBE = re.compile(r"^EXEC sp_describe_first_result_set\b", re.IGNORECASE)
+
+SHOWPLAN_TEMPLATE = (
+    '<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan" Version="1.5">'
+    "<BatchSequence><Batch><Statements>"
+    '<StmtSimple StatementText={text} StatementSubTreeCost="{cost}" StatementEstRows="{rows}" />'
+    "</Statements></Batch></BatchSequence></ShowPlanXML>"
+)
+
+
+def create_database(path, rows=10_000, seed=42):
+    """Write the synthetic tables to ``path``: ``rows`` orders, ``rows // 10`` customers."""
+    rng = random.Random(seed)
+    customers = max(1, rows // 10)
+    start = datetime.datetime(2023, 1, 1)
+    db = sqlite3.connect(path)
+    with db:
+        for table, columns in TABLES.items():
+            db.execute(f'DROP TABLE IF EXISTS "{table}"')
+            db.execute(f'CREATE TABLE "{table}" ({", ".join(f"{c} {t}" for c, t in columns)})')
+        db.executemany(
+            'INSERT INTO "Customers" VALUES (?, ?, ?, ?)',
+            (
+                (i, f"Customer {i}", rng.choice(COUNTRIES), (start + datetime.timedelta(days=rng.randrange(730))).isoformat(" "))
+                for i in range(1, customers + 1)
+            ),
+        )
+        db.executemany(
+            'INSERT INTO "Orders" VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (
+                    i,
+                    rng.randrange(1, customers + 1),
+                    rng.choice(REGIONS),
+                    (start + datetime.timedelta(minutes=rng.randrange(730 * 24 * 60))).isoformat(" "),
+                    f"{rng.uniform(5, 5000):.2f}",
+                    rng.random() < 0.8,
+                )
+                for i in range(1, rows + 1)
+            ),
+        )
+    db.close()
+
+
+def to_sqlite(sql):
+    """Rewrite the simple T-SQL the benchmark questions produce into SQLite."""
+    sql = sql.strip().rstrip(";")
+    limit = None
+    top = _TOP.match(sql)
+    if top:
+        limit = int(top.group(2))
+        sql = "SELECT " + (top.group(1) or "") + sql[top.end():]
+    sql = _BRACKETED.sub(r'"\1"', _SCHEMA_PREFIX.sub("", sql))
+    return f"{sql} LIMIT {limit}" if limit is not None else sql
+
+
+class ProgrammingError(Exception):
+    """Shaped like pyodbc's: ``(sqlstate, message)``."""
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self._cursor = None
+        self._pending = []
+
+    def _metadata(self, sql):
+        normalized = " ".join(sql.split())
+        if normalized == "SELECT 1":
+            return [("",)], [(1,)]
+        if "FROM sys.databases" in normalized:
+            return [("name",)], [(DATABASE_NAME,)]
+        if "FROM sys.objects" in normalized:
+            return [("",), ("",)], [(len(TABLES), datetime.datetime(2024, 1, 1))]
+        if "sys.foreign_key_columns" in normalized:
+            rows = [("dbo", table, column, "dbo", ref_table, ref_column) for table, column, ref_table, ref_column in FOREIGN_KEYS]
+            return [("schema_name",), ("table_name",), ("column_name",), ("ref_schema",), ("ref_table",), ("ref_column",)], rows
+        if "sys.extended_properties" in normalized:
+            rows = [("dbo", table, column, text) for (table, column), text in DESCRIPTIONS.items()]
+            return [("schema_name",), ("table_name",), ("column_name",), ("description",)], rows
+        if "sys.partitions" in normalized:
+            db = self.connection.db
+            rows = [("dbo", table, db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]) for table in TABLES]
+            return [("schema_name",), ("table_name",), ("row_count",)], rows
+        if "FROM sys.tables t" in normalized:
+            rows = [("dbo", table, column, data_type) for table, columns in TABLES.items() for column, data_type in columns]
+            return [("schema_name",), ("table_name",), ("column_name",), ("data_type",)], rows
+        return None
+
+    def _plan(self, sql):
+        db = self.connection.db
+        rows = db.execute(f"SELECT COUNT(*) FROM ({to_sqlite(sql)})").fetchone()[0]
+        read = sum(
+            db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for table in TABLES if re.search(rf"\b{table}\b", sql, re.IGNORECASE)
+        )
+        cost = 0.0033 + read * 0.0011 + rows * 0.0001
+        return [("Microsoft SQL Server 2005 XML Showplan",)], [(SHOWPLAN_TEMPLATE.format(text=quoteattr(sql), cost=cost, rows=rows),)]
+
+    def _describe(self, sql):
+        try:
+            described = self.connection.db.execute(f"SELECT * FROM ({to_sqlite(sql)}) LIMIT 0").description
+        except sqlite3.Error as e:
+            raise ProgrammingError("42000", f"[42000] [SQLite][SQL Server]{e} (207) (SQLExecDirectW)") from e
+        return [("column_ordinal",), ("name",)], [(i + 1, column[0]) for i, column in enumerate(described)]
+
+    def execute(self, sql, *params):
+        self.connection.executed += 1
+        if self.connection.latency_ms:
+            time.sleep(self.connection.latency_ms / 1000)
+        showplan = _SHOWPLAN.match(" ".join(sql.split()))
+        if showplan:
+            self.connection.showplan = showplan.group(1).upper() == "ON"
+            self._cursor, self._pending, self.description = None, [], None
+            return self
+        if _DESCRIBE.match(sql.strip()):
+            metadata = self._describe(params[0])
+        elif self.connection.showplan:
+            metadata = self._plan(sql)
+        else:
+            metadata = self._metadata(sql)
+        if metadata is not None:
+            names, rows = metadata
+            self._cursor = None
+            self._pending = list(rows)
+        else:
+            self._cursor = self.connection.db.execute(to_sqlite(sql), params)
+            names = self._cursor.description or []
+            # Peek at the first row to report column types as pyodbc would
+            first = self._cursor.fetchone()
+            rows = [first] if first is not None else []
+            self._pending = rows
+        types = [
+            next((type(row[i]) for row in rows if row[i] is not None), str)
+            for i in range(len(names))
+        ]
+        self.description = [(name[0], type_code, None, None, None, None, True) for name, type_code in zip(names, types)]
+        return self
+
+    def fetchmany(self, size):
+        rows, self._pending = self._pending[:size], self._pending[size:]
+        if len(rows) < size and self._cursor is not None:
+            rows += self._cursor.fetchmany(size - len(rows))
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        rows, self._pending = self._pending, []
+        if self._cursor is not None:
+            rows += self._cursor.fetchall()
+        return rows
+
+    def cancel(self):
+        self.connection.db.interrupt()
+
+    def close(self):
+        self._pending = []
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class FakeConnection:
+    def __init__(self, path, latency_ms=0.0):
+        # Pooled connections move between threads, as pyodbc's do
+        self.db = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.latency_ms = latency_ms
+        self.timeout = 0
+        self.showplan = False
+        self.executed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+def connector(path, latency_ms=0.0):
+    """A ``connect(conn_str)`` for ``PoolRegistry`` that opens ``path`` instead."""
+    def connect(conn_str, **kwargs):
+        return FakeConnection(path, latency_ms)
+    return connect
@@ -0,0 +1,193 @@
+"""Stub Ollama server for benchmarks.
+
+Implements enough of ``POST /api/generate`` and ``/api/chat`` for
+``llm.OllamaClient``: NDJSON streaming and plain JSON responses,
+``num_predict`` and ``stop`` options, prompt-less model loads, and Ollama's
+timing fields on the final chunk. The simulated cost of a request is a fixed
+latency, prompt evaluation at ``prompt_rate`` tokens/s and generation at
+``token_rate`` tokens/s, both scaled by a per-model speed factor. Like
+Ollama's runner it keeps the last prompt of each of ``slots`` parallel slots
+and only evaluates what follows the longest prefix a new prompt shares with
+one of them; ``prompt_stats`` totals the evaluated and reused prompt tokens.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from result_digest import estimate_tokens
+
+_TOKEN = re.compile(r"\s*\S+")
+
+
+def prompt_text(payload):
+    """The text the model evaluates: the prompt, or the chat messages in template order."""
+    if "messages" in payload:
+        return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in payload["messages"]) + "<|assistant|>\n"
+    return payload.get("prompt") or ""
+
+
+class FakeOllama:
+    def __init__(self, respond, host="127.0.0.1", port=0, latency_ms=20.0, prompt_rate=2000.0, token_rate=40.0,
+                 slots=4, model_speeds=None):
+        """``respond(payload)`` returns the full text the "model" generates; ``model_speeds``
+        maps model names to how many times faster than the default rates they run."""
+        self.respond = respond
+        self.model_speeds = model_speeds or {}
+        self.latency_ms = latency_ms
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.requests = 0
+        self._slots = [""] * slots  # Last prompt evaluated by each slot, most recently used first
+        self._stats = {"prompts": 0, "prompt_tokens": 0, "cached_tokens": 0, "prompt_eval_ms": 0.0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def prompt_stats(self, reset=False):
+        with self._lock:
+            stats = dict(self._stats)
+            if reset:
+                self._stats = dict.fromkeys(self._stats, 0)
+        return stats
+
+    def _evaluate(self, prompt, speed=1.0):
+        """``(evaluated, reused)`` prompt tokens, keeping ``prompt`` in the best-matching slot."""
+        with self._lock:
+            def shared(cached):
+                n = 0
+                for a, b in zip(cached, prompt):
+                    if a != b:
+                        break
+                    n += 1
+                return n
+            # Ties go to the least recently used slot
+            best = max(reversed(range(len(self._slots))), key=lambda i: shared(self._slots[i]), default=None)
+            reused = estimate_tokens(prompt[:shared(self._slots[best])]) if best is not None else 0
+            if best is not None:
+                self._slots.pop(best)
+                self._slots.insert(0, prompt)
+            total = estimate_tokens(prompt)
+            evaluated = max(1, total - reused)
+            self._stats["prompts"] += 1
+            self._stats["prompt_tokens"] += evaluated
+            self._stats["cached_tokens"] += total - evaluated
+            self._stats["prompt_eval_ms"] += evaluated / (self.prompt_rate * speed) * 1000
+            return evaluated, total - evaluated
+
+    def _tokens(self, payload):
+        options = payload.get("options", {})
+        text = self.respond(payload)
+        for stop in options.get("stop", []):
+            position = text.find(stop)
+            if position != -1:
+                text = text[:position]
+        tokens = _TOKEN.findall(text)
+        return tokens[:options.get("num_predict", len(tokens))]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                started = time.perf_counter()
+                self.chat = self.path == "/api/chat"
+                if not prompt_text(payload) or (self.chat and not payload.get("messages")):
+                    # Model load / keep-alive refresh only
+                    self._send_json(self._reply({"model": payload.get("model"), "done": True}, ""))
+                    return
+
+                speed = server.model_speeds.get(payload.get("model"), 1.0)
+                prompt_tokens, _ = server._evaluate(prompt_text(payload), speed)
+                time.sleep(server.latency_ms / 1000 + prompt_tokens / (server.prompt_rate * speed))
+                prompt_done = time.perf_counter()
+                tokens = server._tokens(payload)
+
+                if not payload.get("stream", True):
+                    time.sleep(len(tokens) / (server.token_rate * speed))
+                    self._send_json(self._reply(
+                        self._stats(payload, started, prompt_done, prompt_tokens, len(tokens)), "".join(tokens),
+                    ))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(1 / (server.token_rate * speed))
+                        self._send_chunk(self._reply({"model": payload.get("model"), "done": False}, token))
+                    self._send_chunk(self._reply(self._stats(payload, started, prompt_done, prompt_tokens, len(tokens)), ""))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped reading early (statement complete)
+                self.close_connection = True
+
+            def _reply(self, body, text):
+                # /api/chat wraps the text in an assistant message
+                if self.chat:
+                    return dict(body, message={"role": "assistant", "content": text})
+                return dict(body, response=text)
+
+            @staticmethod
+            def _stats(payload, started, prompt_done, prompt_tokens, eval_count):
+                now = time.perf_counter()
+                return {
+                    "model": payload.get("model"),
+                    "done": True,
+                    "total_duration": int((now - started) * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                    "eval_count": eval_count,
+                    "eval_duration": int((now - prompt_done) * 1e9),
+                }
+
+            def _send_json(self, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, body):
+                data = json.dumps(body).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
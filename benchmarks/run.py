@@ -0,0 +1,287 @@
+"""Benchmark the question pipeline offline and save the numbers as JSON.
+
+    python -m benchmarks.run --questions 20 --concurrency 4 --rows 100000
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+
+Each run asks N questions sequentially and then N more with ``--concurrency``
+workers, through ``engine.Engine`` with the app's own config,
+against ``fake_ollama`` and ``fake_db``. It reports per-stage and end-to-end
+latency percentiles, throughput, peak memory and how many prompt tokens the
+stub model evaluated or reused from its prompt cache, and writes everything to a
+JSON file named after the current commit so runs can be compared later.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.fake_db import DATABASE_NAME, connector, create_database
+from benchmarks.fake_ollama import FakeOllama, prompt_text
+from config import (
+    EXAMPLE_CONFIG,
+    GUARDRAIL_CONFIG,
+    METRICS_CONFIG,
+    OLLAMA_CONFIG,
+    POOL_CONFIG,
+    RESULT_CACHE_CONFIG,
+    SCHEMA_CONTEXT_CONFIG,
+    SPEED_CONFIG,
+)
+from engine import Engine
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# (table, question, SQL the stub model answers with)
+QUESTIONS = [
+    ("Orders", "total sales by region",
+     "SELECT Region, SUM(Amount) AS TotalSales\nFROM [dbo].[Orders]\nGROUP BY Region\nORDER BY TotalSales DESC;"),
+    ("Orders", "how many orders have shipped",
+     "SELECT COUNT(*) AS ShippedOrders FROM [dbo].[Orders] WHERE Shipped = 1;"),
+    ("Orders", "top 10 customers by order value",
+     "SELECT TOP 10 CustomerID, SUM(Amount) AS Total\nFROM [dbo].[Orders]\nGROUP BY CustomerID\nORDER BY Total DESC;"),
+    ("Orders", "orders in the north region",
+     "SELECT OrderID, OrderDate, Amount FROM [dbo].[Orders] WHERE Region = 'North';"),
+    ("Orders", "list all orders",
+     "SELECT * FROM [dbo].[Orders];"),
+    ("Customers", "customers per country",
+     "SELECT Country, COUNT(*) AS Customers\nFROM [dbo].[Customers]\nGROUP BY Country\nORDER BY Customers DESC;"),
+]
+
+SERVER_INFO = {"server": "bench", "port": "", "username": "bench", "password": ""}
+
+_TASK = re.compile(r"^Task: (.*)$", re.MULTILINE)
+_ROWS = re.compile(r"^Rows: (.*)$", re.MULTILINE)
+
+
+def respond(payload):
+    """What the stub model "generates": canned SQL, or a one-line summary."""
+    prompt = prompt_text(payload)
+    # Few-shot examples come first; the question to answer is the last task
+    tasks = _TASK.findall(prompt)
+    if tasks:
+        sql = next((sql for _, question, sql in QUESTIONS if question == tasks[-1]), "SELECT 1;")
+        return f"{sql}\n\nThis query answers the question using the selected table."
+    rows = _ROWS.search(prompt)
+    return f"The result has {rows.group(1) if rows else 'some'} rows. It covers the requested data in detail."
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_engine(args, base_url, db_path, workdir):
+    return Engine(
+        speed_config=dict(SPEED_CONFIG, cache_responses=args.caches, cache_path=os.path.join(workdir, "generations.sqlite3")),
+        pool_config=dict(POOL_CONFIG, max_size=args.pool_size),
+        result_cache_config=RESULT_CACHE_CONFIG if args.caches else None,
+        ollama_config=dict(OLLAMA_CONFIG, base_url=base_url),
+        metrics_config=dict(METRICS_CONFIG, window=max(METRICS_CONFIG["window"], args.questions)),
+        guardrail_config=dict(GUARDRAIL_CONFIG, enabled=not args.no_guardrails),
+        schema_config=dict(SCHEMA_CONTEXT_CONFIG, enabled=not args.full_schema),
+        example_config=dict(EXAMPLE_CONFIG, enabled=args.examples, path=os.path.join(workdir, "examples.sqlite3")),
+        connect=connector(db_path, args.db_latency_ms),
+    )
+
+
+def load_tables(engine):
+    catalog = engine.load_catalog(SERVER_INFO, DATABASE_NAME)
+    return catalog, {name: catalog.table("dbo", name) for name, _, _ in QUESTIONS}
+
+
+def run_phase(engine, fake, catalog, tables, count, concurrency, trace_memory):
+    """Ask ``count`` questions with ``concurrency`` workers and summarize the run."""
+    work = [QUESTIONS[i % len(QUESTIONS)] for i in range(count)]
+
+    def ask(item):
+        table, question, _ = item
+        return engine.pipeline.ask(SERVER_INFO, DATABASE_NAME, tables[table], question, catalog=catalog)
+
+    fake.prompt_stats(reset=True)
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        entries = list(executor.map(ask, work))
+    wall_ms = (time.perf_counter() - started) * 1000
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    snapshot = engine.metrics.snapshot()
+    prompts = fake.prompt_stats()
+    errors = [entry["summary"] for entry in entries if entry["result"] is None]
+    return {
+        "questions": count,
+        "concurrency": concurrency,
+        "wall_ms": wall_ms,
+        "throughput_qps": count / (wall_ms / 1000) if wall_ms else 0.0,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "stages": snapshot["histograms"],
+        "counters": snapshot["counters"],
+        "memory": {"peak_rss_mb": peak_rss_mb(), "tracemalloc_peak_mb": traced_peak},
+        # Totals over every model request (SQL, repairs and summaries)
+        "prompts": dict(prompts, prompt_eval_ms_per_question=prompts["prompt_eval_ms"] / count if count else 0.0),
+        "profiles": engine.pipeline.profile_stats(),
+    }
+
+
+def run(args):
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "runs": {},
+    }
+    model_speeds = {model: float(factor) for model, _, factor in (item.rpartition("=") for item in args.model_speed)}
+    fake = FakeOllama(
+        respond, latency_ms=args.llm_latency_ms, prompt_rate=args.prompt_rate, token_rate=args.token_rate,
+        model_speeds=model_speeds,
+    )
+    with tempfile.TemporaryDirectory(prefix="nl2sql-bench-") as workdir, fake:
+        db_path = os.path.join(workdir, "bench.sqlite3")
+        create_database(db_path, rows=args.rows)
+        for name, concurrency in [("sequential", 1), ("concurrent", args.concurrency)]:
+            engine = build_engine(args, fake.base_url, db_path, workdir)
+            catalog, tables = load_tables(engine)
+            # Open connections and take the first-request costs outside the measurement
+            for table, question, _ in QUESTIONS[:args.warmup]:
+                engine.pipeline.ask(SERVER_INFO, DATABASE_NAME, tables[table], question, catalog=catalog)
+            engine.metrics.reset()
+            results["runs"][name] = run_phase(
+                engine, fake, catalog, tables, args.questions, concurrency, args.trace_memory
+            )
+            engine.close()
+    return results
+
+
+def print_report(results, baseline=None):
+    print(f"commit {results['commit']}  ({results['created_at']})")
+    if baseline:
+        print(f"baseline {baseline['commit']}  ({baseline['created_at']})")
+        ignored = {"output", "compare"}
+        changed = sorted(
+            k for k in set(results["settings"]) | set(baseline.get("settings", {}))
+            if k not in ignored and results["settings"].get(k) != baseline.get("settings", {}).get(k)
+        )
+        if changed:
+            print(f"note: settings differ from the baseline ({', '.join(changed)})")
+    for name, run_result in results["runs"].items():
+        print(
+            f"\n{name}: {run_result['questions']} questions, concurrency {run_result['concurrency']}, "
+            f"{run_result['wall_ms'] / 1000:.2f}s, {run_result['throughput_qps']:.2f} q/s, {run_result['errors']} errors"
+        )
+        if run_result["first_error"]:
+            print(f"  first error: {run_result['first_error']}")
+        memory = run_result["memory"]
+        print("  memory: " + ", ".join(f"{k} {v:.1f}" for k, v in memory.items() if v is not None))
+        prompts = run_result.get("prompts")
+        if prompts:
+            line = (
+                f"  prompt tokens: {prompts['prompt_tokens']} evaluated, {prompts['cached_tokens']} reused, "
+                f"{prompts['prompt_eval_ms_per_question']:.1f} ms prompt eval per question"
+            )
+            base = (baseline or {}).get("runs", {}).get(name, {}).get("prompts")
+            if base:
+                line += (
+                    f" (baseline {base['prompt_tokens']} evaluated, "
+                    f"{base['prompt_eval_ms_per_question']:.1f} ms per question)"
+                )
+            print(line)
+        for profile in run_result.get("profiles", []):
+            valid = "" if profile["valid_sql"] is None else f", {profile['valid_sql']:.0%} valid SQL"
+            print(
+                f"  {profile['profile']} profile ({profile['model']}): {profile['calls']} calls, "
+                f"p50 {profile['p50_ms'] or 0:.1f} ms, {profile['errors']} errors{valid}"
+            )
+        base_stages = (baseline or {}).get("runs", {}).get(name, {}).get("stages", {})
+        print(f"  {'stage (ms)':<32}{'p50':>10}{'p90':>10}{'p99':>10}" + (f"{'base p50':>12}{'change':>9}" if baseline else ""))
+        for stage, summary in run_result["stages"].items():
+            if not stage.endswith("_ms"):
+                continue
+            line = f"  {stage:<32}{summary['p50']:>10.1f}{summary['p90']:>10.1f}{summary['p99']:>10.1f}"
+            base = base_stages.get(stage)
+            if base:
+                change = (summary["p50"] - base["p50"]) / base["p50"] * 100 if base["p50"] else 0.0
+                line += f"{base['p50']:>12.1f}{change:>+8.0f}%"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--questions", type=int, default=30, help="questions per phase")
+    parser.add_argument("--concurrency", type=int, default=4, help="workers in the concurrent phase")
+    parser.add_argument("--rows", type=int, default=20_000, help="rows in the synthetic Orders table")
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0, help="fixed stub model latency per request")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="stub prompt evaluation, tokens/s")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="stub generation, tokens/s")
+    parser.add_argument("--model-speed", action="append", default=[], metavar="MODEL=FACTOR",
+                        help="stub rates for MODEL times FACTOR, e.g. llama3.2:1b=4 (repeatable)")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="added per executed statement")
+    parser.add_argument("--pool-size", type=int, default=POOL_CONFIG["max_size"])
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured questions before each phase")
+    parser.add_argument("--caches", action="store_true", help="enable the generation and result caches")
+    parser.add_argument("--examples", action="store_true",
+                        help="keep questions that ran as few-shot examples and reuse near-exact repeats")
+    parser.add_argument("--no-guardrails", action="store_true", help="skip the estimated-plan check")
+    parser.add_argument("--full-schema", action="store_true", help="prompt with every column of the selected table only")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record the tracemalloc peak (slows Python code down noticeably)")
+    parser.add_argument("--output", help="JSON output path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare p50s against")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Tunables shared by the Streamlit app and the headless tools (batch, service, benchmarks)."""
+import os
+
+# Configuration for speed optimization
+SPEED_CONFIG = {
+    "enable_streaming": True,   # Stream tokens live and stop as soon as the SQL is complete
+    "cache_responses": True,    # Cache similar queries
+    "cache_path": ".cache/nl2sql_cache.sqlite3",  # On-disk store shared across sessions
+    "cache_max_entries": 1000,  # LRU bound for cached generations
+}
+
+# Model and generation options per task. "fallback" lists models to use, in
+# order, when one isn't available (not pulled); SQL repairs also move one step
+# down the SQL chain per attempt, so a fast "model" can escalate to larger ones.
+MODEL_PROFILES = {
+    "sql": {
+        "model": "llama3",      # You can change to "llama3:8b" for faster responses
+        "fallback": [],         # e.g. ["llama3:70b"]: used for repairs after the SQL fails validation
+        "num_predict": 200,     # Limit response length
+        "temperature": 0.1,     # Lower = faster, more deterministic
+        "top_p": 0.9,           # Lower = faster generation
+        "top_k": 40,            # Lower = faster token selection
+        "num_ctx": 4096,        # Context window; schema, examples and question must fit
+        "stop": ["```", "---", "\n\n\n"],  # Stop at common SQL endings
+    },
+    "repair": {
+        "model": None,          # None: the next model of the SQL chain (the SQL model if it has no fallback)
+        "fallback": [],
+        "num_predict": 200,
+        "temperature": 0.1,
+        "top_p": 0.9,
+        "top_k": 40,
+        "num_ctx": 4096,
+        "stop": ["```", "---", "\n\n\n"],
+    },
+    "summary": {
+        "model": "llama3.2:1b",  # One sentence about a result digest doesn't need the SQL model
+        "fallback": ["llama3"],  # Used until the small model is pulled
+        "num_predict": 100,     # Shorter summaries
+        "temperature": 0.1,
+        "top_p": 0.9,
+        "top_k": 40,
+        "num_ctx": 2048,
+        "stop": ["\n", ".", "---"],
+    },
+}
+
+# Shared SQL Server connection pools (one per server/port/user/database)
+POOL_CONFIG = {
+    "max_size": 5,                # Max open connections per database
+    "idle_timeout": 300,          # Close connections idle longer than this (seconds)
+    "health_check_interval": 30,  # Ping reused connections idle longer than this (seconds)
+    "acquire_timeout": 15,        # Wait this long for a free connection before failing
+    "query_timeout": 120,         # Per-statement timeout on the server (seconds, 0 for none)
+}
+
+# Pre-execution check of generated SQL against its estimated plan (SET SHOWPLAN_XML)
+GUARDRAIL_CONFIG = {
+    "enabled": True,
+    "max_cost": 50.0,          # Estimated subtree cost (optimizer units) above which a query is capped or rejected
+    "max_rows": 1_000_000,     # Estimated result rows above which a query is capped or rejected
+    "on_exceed": "cap",        # "cap": add TOP (cap_rows) if that brings the plan under the limits; "reject": refuse
+    "cap_rows": 10_000,        # Row limit injected as TOP (n)
+    "fail_open": True,         # Run the query anyway when no plan can be estimated (e.g. no SHOWPLAN permission)
+}
+
+# Checks on generated SQL before execution, with the model asked to fix what fails
+VALIDATION_CONFIG = {
+    "enabled": True,
+    "local_check": True,    # Check names against the loaded catalog first (no round trip)
+    "server_check": True,   # Compile with sp_describe_first_result_set (nothing is executed)
+    "max_repairs": 2,       # Times the model may fix SQL that failed a check before giving up
+}
+
+# Question-specific schema in the SQL prompt: relevant tables/columns instead of every column
+SCHEMA_CONTEXT_CONFIG = {
+    "enabled": True,
+    "token_budget": 800,       # Estimated prompt tokens for the schema block
+    "max_tables": 4,           # Selected table plus related ones (best matches and foreign-key neighbours)
+    "min_score_ratio": 0.5,    # Other tables need this share of the best table's relevance score
+    "prefix_share": 0.6,       # Budget share of a wide selected table's stable, cacheable block
+}
+
+# Questions that ran successfully, reused as few-shot examples in the SQL prompt
+EXAMPLE_CONFIG = {
+    "enabled": True,
+    "path": ".cache/nl2sql_cache.sqlite3",  # Own table in the generation cache's file
+    "max_entries": 5000,       # LRU bound across all databases
+    "top_k": 3,                # Most similar earlier questions shown to the model
+    "min_similarity": 0.3,     # Share of index terms an earlier question must have in common
+    "reuse_near_exact": True,  # Skip generation for a repeat that only differs in filler words
+}
+
+# Cache of executed query results, shared across sessions
+RESULT_CACHE_CONFIG = {
+    "ttl_seconds": 300,                # Cached results older than this are re-queried
+    "max_bytes": 64 * 1024 * 1024,     # Memory budget for all cached results
+}
+
+# Paged fetching of query results (protects the worker from huge result sets)
+FETCH_CONFIG = {
+    "batch_size": 500,                 # Rows per fetchmany() round trip
+    "page_rows": 1000,                 # Rows shown first and added per "load more"
+    "max_rows": 100_000,               # Hard cap on rows held per result
+    "max_bytes": 64 * 1024 * 1024,     # Hard cap on memory held per result
+    "idle_timeout": 300,               # Release unfinished results idle this long (seconds)
+    "max_open_streams": 2,             # Unfinished results kept open per database; each holds a pooled connection
+    "parameterize": True,              # Bind WHERE/ON/HAVING literals as ? parameters so similar queries share a plan
+}
+
+# Ollama HTTP client (pooled keep-alive session shared by all sessions)
+OLLAMA_CONFIG = {
+    "base_url": "http://localhost:11434",
+    "connect_timeout": 3.05,   # Seconds to establish the TCP connection
+    "read_timeout": 120,       # Max seconds between response chunks before giving up
+    "max_retries": 2,          # Retries for connection errors and 429/5xx responses
+    "retry_backoff": 0.5,      # First retry delay in seconds; doubles each attempt
+    "keep_alive": "30m",       # Keep the model loaded between questions
+}
+
+# Summaries are generated in the background while results are already visible
+SUMMARY_CONFIG = {
+    "max_workers": 4,       # Concurrent summary generations across all sessions
+    "poll_interval": 1.0,   # Seconds between refreshes of a pending summary
+    "digest_token_budget": 400,  # Max prompt tokens spent describing the result
+    "digest_head_rows": 5,       # Sample rows included in the digest
+    "digest_top_k": 3,           # Most frequent values listed per text column
+}
+
+# Table browser (Step 4): only one page of table tiles is rendered per rerun
+TABLE_BROWSER_CONFIG = {
+    "page_size": 40,     # Table tiles per page
+    "columns": 5,        # Tiles per row
+    "recent": 20,        # Recently selected tables remembered per session
+}
+
+# Q&A history: persisted to disk, with only recent entries and results in memory
+HISTORY_CONFIG = {
+    "path": ".cache/nl2sql_history.sqlite3",  # Entries plus Parquet-encoded results, kept across restarts
+    "max_entries": 10_000,            # Oldest entries are deleted beyond this
+    "recent": 20,                     # Entries per session kept in memory
+    "page_size": 10,                  # Questions rendered per history page
+    "memory_budget": 256 * 1024 * 1024,  # Result bytes per session before the oldest results are dropped from memory
+}
+
+# Latency metrics: in-app diagnostics plus a Prometheus/JSON endpoint
+METRICS_CONFIG = {
+    "window": 1000,              # Recent observations kept per stage for percentiles
+    "export_host": "127.0.0.1",
+    "export_port": 9464,         # Serves /metrics and /metrics.json; None disables it
+}
+
+# Shared query service (python service.py) that many app sessions can use
+SERVICE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "llm_workers": 4,    # Concurrent Ollama calls made by the service
+    "db_workers": 8,     # Concurrent blocking database calls made by the service
+    "catalog_ttl": 60,   # Seconds a catalog serves questions before its change token is checked again
+    "url": os.environ.get("NL2SQL_SERVICE_URL"),  # e.g. http://127.0.0.1:8765 makes the app a client of the service
+    "timeout": 300,      # Client read timeout for ask/summarize calls (seconds)
+}
@@ -0,0 +1,222 @@
+"""Shared, thread-safe pyodbc connection pools for SQL Server.
+
+Pools are keyed by (server, port, username, password digest, database) and
+handed out through a ``PoolRegistry`` so the same warm connections are reused across Streamlit
+reruns and sessions instead of paying the ODBC login/TLS handshake per question.
+"""
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ODBC_DRIVER = "ODBC Driver 17 for SQL Server"
+
+
+def build_conn_str(server, port, username, password, database, driver=ODBC_DRIVER):
+    """Build the ODBC connection string used throughout the app."""
+    port_str = f",{port}" if port else ""
+    return f"DRIVER={{{driver}}};SERVER={server}{port_str};DATABASE={database};UID={username};PWD={password}"
+
+
+def server_label(server_info):
+    """``server,port`` as SQL Server spells it."""
+    port = server_info["port"]
+    return f"{server_info['server']},{port}" if port else server_info["server"]
+
+
+def password_digest(password):
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def login_label(server_info):
+    """``server,port/username/password digest``, the identity pools are keyed by.
+
+    Caches of what a query or catalog returned are keyed by it, so one
+    login never sees rows or tables through another login's permissions.
+    """
+    return f"{server_label(server_info)}/{server_info['username']}/{password_digest(server_info['password'])}"
+
+
+def _default_connect(conn_str):
+    import pyodbc
+    return pyodbc.connect(conn_str)
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection becomes available within ``acquire_timeout``."""
+
+
+class ConnectionPool:
+    """A bounded pool of connections to a single database.
+
+    Idle connections are health-checked before reuse (at most every
+    ``health_check_interval`` seconds), evicted after ``idle_timeout`` seconds,
+    and rolled back when returned so no open transaction leaks to the next
+    borrower. ``query_timeout`` (seconds, 0 for none) is set on every new
+    connection so a runaway statement fails with a timeout instead of holding
+    the connection forever.
+    """
+
+    def __init__(self, conn_str, max_size=5, idle_timeout=300, health_check_interval=30,
+                 acquire_timeout=15, query_timeout=0, connect=None):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.query_timeout = query_timeout
+        self._connect = connect or _default_connect
+        # Each idle entry is (connection, returned_at, last_checked_at)
+        self._idle = deque()
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        with self._cond:
+            return self._in_use + len(self._idle)
+
+    def acquire(self):
+        """Borrow a connection, opening a new one if the pool is not full."""
+        deadline = time.monotonic() + self.acquire_timeout
+        stale = []
+        entry = None
+        with self._cond:
+            if self._closed:
+                raise PoolExhausted("Connection pool is closed")
+            stale.extend(self._evict_idle_locked())
+            while True:
+                if self._idle:
+                    # LIFO keeps the most recently used (warmest) connections busy
+                    entry = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(
+                        f"No database connection available after {self.acquire_timeout}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._cond.wait(remaining)
+        self._close_quietly(stale)
+
+        try:
+            if entry is not None:
+                conn, _, last_checked = entry
+                if time.monotonic() - last_checked < self.health_check_interval or self._ping(conn):
+                    return conn
+                self._close_quietly([conn])
+            conn = self._connect(self.conn_str)
+            if self.query_timeout:
+                conn.timeout = self.query_timeout
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection, resetting its transaction state."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if not discard and not self._closed:
+                now = time.monotonic()
+                self._idle.append((conn, now, now))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._close_quietly([conn])
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def prune(self):
+        """Close connections that have been idle longer than ``idle_timeout``."""
+        with self._cond:
+            stale = self._evict_idle_locked()
+        self._close_quietly(stale)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            stale = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_quietly(stale)
+
+    def _evict_idle_locked(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = []
+        # Oldest entries sit at the left of the deque
+        while self._idle and self._idle[0][1] < cutoff:
+            stale.append(self._idle.popleft()[0])
+        return stale
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            conn.cursor().execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class PoolRegistry:
+    """Process-wide map of (server, port, username, password digest, database) -> ConnectionPool.
+
+    A login with a different password gets a pool of its own rather than
+    replacing the existing one, so a wrong password can't close the
+    connections other sessions are using; its connections fail to open instead.
+    """
+
+    def __init__(self, connect=None, **pool_options):
+        self._connect = connect
+        self._pool_options = pool_options
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, server, port, username, password, database):
+        # Never hand out connections opened with a different password
+        key = (server, str(port or ""), username, password_digest(password), database)
+        with self._lock:
+            current = self._pools.get(key)
+            if current is None:
+                conn_str = build_conn_str(server, port, username, password, database)
+                current = self._pools[key] = ConnectionPool(conn_str, connect=self._connect, **self._pool_options)
+            pools = list(self._pools.values())
+        # Pools of an old password hold no connections once these are idle for idle_timeout
+        for pool in pools:
+            pool.prune()
+        return current
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
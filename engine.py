@@ -0,0 +1,266 @@
+"""UI-free NL->SQL engine shared by every front end.
+
+``Engine`` owns the long-lived pieces: connection pools, schema catalogs, the
+Ollama client, the query executor, caches, the Q&A history store and metrics.
+Each is built on first use, and the modules behind them (pandas, requests,
+pyodbc) are only imported then, so ``import engine`` is cheap and tools that
+never touch a piece never pay for it. The Streamlit page keeps one ``Engine``
+per process; batch jobs and the benchmarks create their own.
+"""
+import threading
+
+from config import (
+    EXAMPLE_CONFIG,
+    FETCH_CONFIG,
+    GUARDRAIL_CONFIG,
+    HISTORY_CONFIG,
+    METRICS_CONFIG,
+    MODEL_PROFILES,
+    OLLAMA_CONFIG,
+    POOL_CONFIG,
+    RESULT_CACHE_CONFIG,
+    SCHEMA_CONTEXT_CONFIG,
+    SPEED_CONFIG,
+    SUMMARY_CONFIG,
+    VALIDATION_CONFIG,
+)
+
+DATABASES_QUERY = "SELECT name FROM sys.databases WHERE database_id > 4"
+
+
+class Engine:
+    def __init__(self, speed_config=SPEED_CONFIG, pool_config=POOL_CONFIG, result_cache_config=RESULT_CACHE_CONFIG,
+                 fetch_config=FETCH_CONFIG, ollama_config=OLLAMA_CONFIG, summary_config=SUMMARY_CONFIG,
+                 metrics_config=METRICS_CONFIG, guardrail_config=GUARDRAIL_CONFIG,
+                 validation_config=VALIDATION_CONFIG, schema_config=SCHEMA_CONTEXT_CONFIG,
+                 example_config=EXAMPLE_CONFIG, model_profiles=MODEL_PROFILES, history_config=HISTORY_CONFIG,
+                 connect=None):
+        """``result_cache_config=None`` disables the result cache,
+        ``speed_config["cache_responses"]`` the generation cache, and the
+        ``enabled`` flags of ``guardrail_config``, ``validation_config``,
+        ``schema_config`` and ``example_config`` the plan check, SQL
+        validation, schema retrieval and few-shot examples.
+        ``connect`` replaces ``pyodbc.connect`` (used by the benchmarks)."""
+        self.speed_config = speed_config
+        self.pool_config = pool_config
+        self.result_cache_config = result_cache_config
+        self.fetch_config = fetch_config
+        self.ollama_config = ollama_config
+        self.summary_config = summary_config
+        self.metrics_config = metrics_config
+        self.guardrail_config = guardrail_config
+        self.validation_config = validation_config
+        self.schema_config = schema_config
+        self.example_config = example_config
+        self.model_profiles = model_profiles
+        self.history_config = history_config
+        self._connect = connect
+        self._resources = {}
+        # Re-entrant: building one resource may build the ones it depends on
+        self._lock = threading.RLock()
+
+    def _resource(self, name, factory):
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    # Connections and schema
+
+    @property
+    def pools(self):
+        def build():
+            from connection_pool import PoolRegistry
+            return PoolRegistry(connect=self._connect, **self.pool_config)
+        return self._resource("pools", build)
+
+    @property
+    def catalogs(self):
+        def build():
+            from schema_catalog import CatalogCache
+            return CatalogCache()
+        return self._resource("catalogs", build)
+
+    def pool(self, server_info, database):
+        return self.executor.pool(server_info, database)
+
+    def list_databases(self, server_info):
+        """Names of the user databases on the server (also proves the login works)."""
+        with self.pool(server_info, "master").connection() as conn:
+            return [row[0] for row in conn.cursor().execute(DATABASES_QUERY).fetchall()]
+
+    def load_catalog(self, server_info, database, force=False):
+        from connection_pool import login_label
+        with self.pool(server_info, database).connection() as conn:
+            return self.catalogs.get(conn, login_label(server_info), database, force=force)
+
+    # Query execution
+
+    @property
+    def result_cache(self):
+        def build():
+            if self.result_cache_config is None:
+                return None
+            from result_cache import ResultCache
+            return ResultCache(**self.result_cache_config)
+        return self._resource("result_cache", build)
+
+    @property
+    def open_streams(self):
+        def build():
+            from results import OpenStreams
+            return OpenStreams(self.fetch_config["idle_timeout"], self.fetch_config["max_open_streams"])
+        return self._resource("open_streams", build)
+
+    @property
+    def guardrails(self):
+        def build():
+            options = dict(self.guardrail_config)
+            if not options.pop("enabled"):
+                return None
+            from guardrails import Guardrails
+            return Guardrails(**options)
+        return self._resource("guardrails", build)
+
+    @property
+    def executor(self):
+        def build():
+            from query_executor import QueryExecutor
+            return QueryExecutor(
+                self.pools,
+                self.fetch_config,
+                result_cache=self.result_cache,
+                metrics=self.metrics,
+                open_streams=self.open_streams,
+                guardrails=self.guardrails,
+            )
+        return self._resource("executor", build)
+
+    @property
+    def query_workers(self):
+        """Threads that run queries the UI may cancel (``QueryExecutor.start``)."""
+        def build():
+            from concurrent.futures import ThreadPoolExecutor
+            return ThreadPoolExecutor(max_workers=self.pool_config["max_size"], thread_name_prefix="query")
+        return self._resource("query_workers", build)
+
+    # Generation
+
+    @property
+    def llm(self):
+        def build():
+            from llm import OllamaClient
+            return OllamaClient(**self.ollama_config)
+        return self._resource("llm", build)
+
+    @property
+    def generation_cache(self):
+        def build():
+            if not self.speed_config["cache_responses"]:
+                return None
+            from generation_cache import GenerationCache
+            return GenerationCache(self.speed_config["cache_path"], self.speed_config["cache_max_entries"])
+        return self._resource("generation_cache", build)
+
+    @property
+    def example_store(self):
+        def build():
+            if not self.example_config["enabled"]:
+                return None
+            from example_store import ExampleStore
+            return ExampleStore(self.example_config["path"], self.example_config["max_entries"])
+        return self._resource("example_store", build)
+
+    @property
+    def pipeline(self):
+        def build():
+            from pipeline import QuestionPipeline
+            return QuestionPipeline(
+                self.executor,
+                self.llm,
+                self.speed_config,
+                self.summary_config,
+                self.model_profiles,
+                generation_cache=self.generation_cache,
+                metrics=self.metrics,
+                validation_config=self.validation_config if self.validation_config["enabled"] else None,
+                schema_config=self.schema_config if self.schema_config["enabled"] else None,
+                example_store=self.example_store,
+                example_config=self.example_config,
+            )
+        return self._resource("pipeline", build)
+
+    @property
+    def background(self):
+        """Worker threads for summaries and model warm-up."""
+        def build():
+            from concurrent.futures import ThreadPoolExecutor
+            return ThreadPoolExecutor(max_workers=self.summary_config["max_workers"], thread_name_prefix="background")
+        return self._resource("background", build)
+
+    def warm_up(self):
+        try:
+            self.pipeline.warm_up()
+        except Exception:
+            pass  # Best effort: the first question will load the models instead
+
+    # History
+
+    @property
+    def history_store(self):
+        def build():
+            from history_store import HistoryStore
+            return HistoryStore(self.history_config["path"], self.history_config["max_entries"])
+        return self._resource("history_store", build)
+
+    def session_history(self, server_info):
+        """A page session's ``SessionHistory``, shared on disk by everyone using the same login
+        (keyed like the pools and result cache). Clearing it deletes only what this session added."""
+        from connection_pool import login_label
+        from history_store import SessionHistory
+        return SessionHistory(
+            self.history_store,
+            login_label(server_info),
+            self.history_config["recent"],
+            self.history_config["memory_budget"],
+        )
+
+    # Metrics
+
+    def diagnostics(self):
+        """Stage latencies, counters, per-profile model stats and result cache stats."""
+        snapshot = self.metrics.snapshot()
+        result_cache = self.result_cache
+        return dict(
+            snapshot,
+            # Before the first question there is nothing to report, and no need to build the pipeline
+            profiles=self.pipeline.profile_stats() if snapshot["histograms"] else [],
+            result_cache=result_cache.stats() if result_cache is not None else None,
+        )
+
+    @property
+    def metrics(self):
+        def build():
+            from metrics import MetricsRegistry
+            return MetricsRegistry(window=self.metrics_config["window"])
+        return self._resource("metrics", build)
+
+    def serve_metrics(self):
+        """Start the /metrics exporter if one is configured; returns the server or None."""
+        if not self.metrics_config["export_port"]:
+            return None
+        from metrics import serve_metrics
+        try:
+            return serve_metrics(self.metrics, self.metrics_config["export_host"], self.metrics_config["export_port"])
+        except OSError:
+            return None  # Port taken (e.g. another app process); in-app diagnostics still work
+
+    def close(self):
+        with self._lock:
+            resources = dict(self._resources)
+            self._resources.clear()
+        for name in ("background", "query_workers"):
+            if name in resources:
+                resources[name].shutdown(wait=False)
+        if "pools" in resources:
+            resources["pools"].close_all()
@@ -0,0 +1,177 @@
+"""Questions that were answered successfully, kept as few-shot examples for new ones.
+
+Every question whose SQL ran is stored with its table, the table's schema
+fingerprint and the SQL. For a new question the most similar stored ones on
+the tables in its prompt become examples (lexical similarity of their index
+terms, see ``schema_retrieval.terms``), and a question that only differs in
+filler words ("show me the total sales by region?" vs "total sales by
+region") reuses the stored SQL without asking the model at all. Examples
+written against an older schema of a table are never shown or reused.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from generation_cache import DEFAULT_CACHE_PATH, normalize_question
+from schema_retrieval import terms
+
+# Words that don't change what a question asks for (unlike "most"/"least" or numbers)
+_FILLER = {"a", "an", "the", "please", "show", "me", "list", "give", "get", "find", "display", "what", "is", "are", "all"}
+# Longer statements cost more prompt than they save
+_MAX_SQL_CHARS = 1000
+
+
+def signature(question):
+    """Near-exact match key: the normalized question without filler words, plurals folded."""
+    words = []
+    for word in normalize_question(question).replace(",", " ").split():
+        if word in _FILLER:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+@dataclass(frozen=True)
+class Example:
+    question: str
+    sql: str
+    table: str          # "schema.name" of the table the question was asked on
+    similarity: float   # Jaccard similarity of index terms with the new question
+
+
+class ExampleStore:
+    """SQLite store of successful (question, SQL, table) triples with an in-memory similarity index.
+
+    The index of a database is loaded on first use and rebuilt after this
+    process adds to it; examples other processes add show up after a restart.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._indexes = {}  # scope -> [(table, schema_hash, question, terms, sql)]
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS examples (
+                    scope TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    schema_hash TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    uses INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (scope, table_name, signature)
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_examples_last_used ON examples (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads and processes;
+        # the block commits (or rolls back) and the connection is closed after it
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def put(self, scope, table, schema_hash, question, sql):
+        """Record SQL that ran successfully for ``question`` on ``table`` ("schema.name")."""
+        if len(sql) > _MAX_SQL_CHARS or not signature(question):
+            return
+        now = time.time()
+        with self._connect() as db:
+            # Examples for an older schema of this table would mislead the model
+            db.execute(
+                "DELETE FROM examples WHERE scope = ? AND table_name = ? AND schema_hash != ?",
+                (scope, table, schema_hash),
+            )
+            db.execute(
+                """
+                INSERT INTO examples (scope, table_name, signature, schema_hash, question, sql, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(scope, table_name, signature) DO UPDATE SET
+                    sql = excluded.sql, question = excluded.question, last_used = excluded.last_used, uses = uses + 1
+                """,
+                (scope, table, signature(question), schema_hash, question.strip(), sql, now, now),
+            )
+            overflow = db.execute("SELECT COUNT(*) FROM examples").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM examples WHERE rowid IN (SELECT rowid FROM examples ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+        with self._lock:
+            if overflow > 0:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(scope, None)
+
+    def match(self, scope, table, schema_hash, question):
+        """Stored SQL for a near-exact repeat of ``question`` on the same schema, or None."""
+        key = (scope, table, signature(question))
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT sql FROM examples WHERE scope = ? AND table_name = ? AND signature = ? AND schema_hash = ?",
+                key + (schema_hash,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE examples SET last_used = ?, uses = uses + 1 "
+                "WHERE scope = ? AND table_name = ? AND signature = ?",
+                (time.time(),) + key,
+            )
+        return row[0]
+
+    def similar(self, scope, tables, question, k=3, min_similarity=0.3):
+        """Up to ``k`` stored examples most like ``question``, best first.
+
+        ``tables`` maps "schema.name" to the current schema fingerprint of
+        each table in the prompt; only examples on those schemas qualify.
+        """
+        wanted = set(terms(question))
+        if not wanted or k <= 0:
+            return []
+        found = []
+        for table, schema_hash, stored_question, stored_terms, sql in self._index(scope):
+            if tables.get(table) != schema_hash:
+                continue
+            similarity = len(wanted & stored_terms) / len(wanted | stored_terms)
+            if similarity >= min_similarity:
+                found.append(Example(stored_question, sql, table, similarity))
+        found.sort(key=lambda example: example.similarity, reverse=True)
+        return found[:k]
+
+    def _index(self, scope):
+        with self._lock:
+            index = self._indexes.get(scope)
+        if index is None:
+            with self._connect() as db:
+                rows = db.execute(
+                    "SELECT table_name, schema_hash, question, sql FROM examples WHERE scope = ?", (scope,)
+                ).fetchall()
+            index = [(table, schema_hash, question, frozenset(terms(question)), sql)
+                     for table, schema_hash, question, sql in rows]
+            with self._lock:
+                self._indexes[scope] = index
+        return index
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM examples")
+        with self._lock:
+            self._indexes.clear()
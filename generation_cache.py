@@ -0,0 +1,115 @@
+"""Persistent NL->SQL generation cache backed by SQLite.
+
+Entries are keyed on the normalized question, the model/options used for
+generation and a fingerprint of the table schema given to the model. Each entry
+also records its scope (server/database/schema/table) so that when the schema
+of a table changes, every entry generated against the old schema is dropped.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "nl2sql_cache.sqlite3")
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!;]+$")
+
+
+def normalize_question(question):
+    """Case-fold and collapse whitespace so trivially different phrasings share a key."""
+    question = _WHITESPACE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", question)
+
+
+class GenerationCache:
+    """Bounded LRU cache of generated SQL, shared across sessions and restarts."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    schema_hash TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_generations_scope ON generations (scope, schema_hash)")
+            db.execute("CREATE INDEX IF NOT EXISTS ix_generations_last_used ON generations (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads and processes;
+        # the block commits (or rolls back) and the connection is closed after it
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def make_key(question, model_options, schema_hash):
+        material = json.dumps(
+            {
+                "question": normalize_question(question),
+                "model": model_options,
+                "schema": schema_hash,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, scope, schema_hash, question, model_options):
+        """Return cached SQL for the question, or None on a miss."""
+        key = self.make_key(question, model_options, schema_hash)
+        with self._connect() as db:
+            # Entries built against an older schema of this table are no longer valid
+            db.execute("DELETE FROM generations WHERE scope = ? AND schema_hash != ?", (scope, schema_hash))
+            row = db.execute("SELECT sql FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE generations SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key),
+            )
+        return row[0]
+
+    def put(self, scope, schema_hash, question, model_options, sql):
+        key = self.make_key(question, model_options, schema_hash)
+        now = time.time()
+        with self._connect() as db:
+            db.execute("DELETE FROM generations WHERE scope = ? AND schema_hash != ?", (scope, schema_hash))
+            db.execute(
+                """
+                INSERT INTO generations (key, scope, schema_hash, question, sql, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET sql = excluded.sql, last_used = excluded.last_used
+                """,
+                (key, scope, schema_hash, normalize_question(question), sql, now, now),
+            )
+            overflow = db.execute("SELECT COUNT(*) FROM generations").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM generations WHERE key IN "
+                    "(SELECT key FROM generations ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM generations")
@@ -0,0 +1,172 @@
+"""Cost guardrails: check SQL Server's estimated plan before running generated SQL.
+
+With ``SET SHOWPLAN_XML ON`` the server compiles the statement and returns its
+estimated plan without executing it. Queries whose estimated cost or row count
+is above the configured limits are either rewritten with ``TOP (n)`` (when
+that brings the re-estimated plan under the limits) or rejected, so one bad
+guess such as a cross join or an unfiltered scan of a huge fact table never
+reaches execution.
+"""
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+
+from sql_extractor import tokenize
+
+SHOWPLAN_NS = "http://schemas.microsoft.com/sqlserver/2004/07/showplan"
+
+_SET_OPERATORS = {"UNION", "EXCEPT", "INTERSECT"}
+
+
+class QueryRejected(Exception):
+    """The estimated plan is over the configured limits."""
+
+
+class _ShowplanStuck(Exception):
+    """SHOWPLAN could not be switched off; the connection must not be reused."""
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    cost: float
+    rows: float
+    warnings: tuple
+
+    def describe(self):
+        text = f"estimated cost {self.cost:,.1f}, {self.rows:,.0f} rows"
+        return f"{text}, warnings: {', '.join(self.warnings)}" if self.warnings else text
+
+
+def parse_showplan(xml_text):
+    root = ET.fromstring(xml_text)
+    statements = root.findall(f".//{{{SHOWPLAN_NS}}}StmtSimple")
+    warnings = []
+    for element in root.iter(f"{{{SHOWPLAN_NS}}}Warnings"):
+        warnings += [name for name, value in element.attrib.items() if value.lower() in ("1", "true")]
+        warnings += [child.tag.rsplit("}", 1)[-1] for child in element]
+    return PlanEstimate(
+        cost=sum(float(s.get("StatementSubTreeCost", 0)) for s in statements),
+        rows=max((float(s.get("StatementEstRows", 0)) for s in statements), default=0.0),
+        warnings=tuple(dict.fromkeys(warnings)),
+    )
+
+
+def estimate_plan(conn, sql):
+    """Compile ``sql`` without running it and return its ``PlanEstimate``."""
+    cursor = conn.cursor()
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        row = cursor.execute(sql).fetchone()
+    finally:
+        try:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+        except Exception as e:
+            raise _ShowplanStuck(str(e)) from e
+    return parse_showplan(row[0])
+
+
+def cap_rows(sql, limit):
+    """Return ``sql`` with its outer SELECT limited to ``TOP (limit)``.
+
+    An existing smaller ``TOP`` is kept, a larger one lowered. Returns None
+    when the statement can't be capped safely (set operators, ``SELECT INTO``,
+    ``OFFSET ... FETCH``, which SQL Server doesn't allow next to ``TOP``,
+    ``TOP`` with a variable or ``PERCENT``, anything that isn't a query).
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    tokens = []
+    depth = 0
+    for match, word in tokenize(sql):
+        if word == ")":
+            depth -= 1
+        tokens.append((match, word, depth))
+        if word == "(":
+            depth += 1
+
+    outer = [word for _, word, d in tokens if d == 0]
+    if not outer or outer[0] not in ("SELECT", "WITH") or _SET_OPERATORS & set(outer) or {"INTO", "OFFSET"} & set(outer):
+        return None
+    # The first top-level SELECT is the outer query (CTE bodies sit in parentheses)
+    i = next(n for n, (_, word, d) in enumerate(tokens) if d == 0 and word == "SELECT") + 1
+    if i < len(tokens) and tokens[i][1] in ("DISTINCT", "ALL"):
+        i += 1
+    if i >= len(tokens):
+        return None
+    if tokens[i][1] != "TOP":
+        position = tokens[i][0].start()
+        return f"{sql[:position]}TOP ({limit}) {sql[position:]}"
+
+    # TOP n or TOP (n), optionally followed by PERCENT / WITH TIES
+    j = i + 1
+    parenthesized = j < len(tokens) and tokens[j][1] == "("
+    if parenthesized:
+        j += 1
+    if j >= len(tokens) or not tokens[j][1].isdigit():
+        return None
+    value = tokens[j][0]
+    after = j + 2 if parenthesized else j + 1
+    if after < len(tokens) and tokens[after][1] == "PERCENT":
+        return None
+    if int(value.group()) <= limit:
+        return sql
+    return f"{sql[:value.start()]}{limit}{sql[value.end():]}"
+
+
+class Guardrails:
+    def __init__(self, max_cost=50.0, max_rows=1_000_000, on_exceed="cap", cap_rows=10_000, fail_open=True):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.on_exceed = on_exceed
+        self.cap_rows = cap_rows
+        self.fail_open = fail_open
+
+    def problems(self, estimate):
+        found = []
+        if self.max_cost and estimate.cost > self.max_cost:
+            found.append(f"estimated cost {estimate.cost:,.1f} is over {self.max_cost:,.1f}")
+        if self.max_rows and estimate.rows > self.max_rows:
+            found.append(f"estimated {estimate.rows:,.0f} rows is over {self.max_rows:,}")
+        if found and estimate.warnings:
+            found.append(f"plan warnings: {', '.join(estimate.warnings)}")
+        return found
+
+    def review(self, pool, sql):
+        """Return ``(sql_to_run, note)``; ``note`` says how the query was changed, if at all.
+
+        Raises ``QueryRejected`` for queries over the limits that can't be
+        capped under them.
+        """
+        conn = pool.acquire()
+        stuck = []
+        try:
+            return self._review(conn, sql, stuck)
+        finally:
+            # With SHOWPLAN possibly still on, the connection must not be reused
+            pool.release(conn, discard=bool(stuck))
+
+    def _estimate(self, conn, sql, stuck):
+        """The ``PlanEstimate`` of ``sql``, or None when there is none and ``fail_open`` lets it run anyway."""
+        try:
+            return estimate_plan(conn, sql)
+        except Exception as e:
+            if isinstance(e, _ShowplanStuck):
+                stuck.append(e)
+            if self.fail_open:
+                # e.g. no SHOWPLAN permission, or invalid SQL that execution will report properly
+                return None
+            raise QueryRejected(f"Could not estimate the query plan: {e}") from e
+
+    def _review(self, conn, sql, stuck):
+        estimate = self._estimate(conn, sql, stuck)
+        if estimate is None:
+            return sql, None
+        problems = self.problems(estimate)
+        if not problems:
+            return sql, None
+        if self.on_exceed == "cap":
+            capped = cap_rows(sql, self.cap_rows)
+            if capped is not None and capped != sql.strip().rstrip(";").rstrip():
+                capped_estimate = self._estimate(conn, capped, stuck)
+                # Without an estimate (fail_open), the capped query is still safer than the original
+                if capped_estimate is None or not self.problems(capped_estimate):
+                    return capped, f"Limited to TOP ({self.cap_rows:,}): {'; '.join(problems)}"
+        raise QueryRejected(f"Query rejected before execution: {'; '.join(problems)}")
@@ -0,0 +1,282 @@
+"""Q&A history kept on disk, with only the recent entries and results in memory.
+
+``HistoryStore`` writes every history entry to SQLite, its result frame as a
+Parquet blob, so history survives restarts and a long session doesn't hold
+every result it ever produced. ``SessionHistory`` is what a page session
+works with: it keeps the last ``recent`` entries in memory, loads older pages
+from the store without their results, loads a stored result only when it is
+shown, and evicts results (oldest first) once the session holds more than
+``memory_budget`` bytes of them. It behaves like the list it replaces:
+``append``, iteration, indexing and ``len`` cover the in-memory entries.
+Clearing a session deletes only the entries it added; what other sessions on
+the same login saved stays on disk, just hidden from the cleared session.
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from results import frame_from_payload, frame_nbytes, frame_to_payload
+
+DEFAULT_HISTORY_PATH = os.path.join(".cache", "nl2sql_history.sqlite3")
+
+# Entry keys that only make sense in the process that created them
+_LIVE_KEYS = ("result", "stream", "summary_pending")
+
+
+def _encode_frame(frame):
+    """``(format, blob)``: Parquet, or compressed JSON for frames Parquet can't hold
+    (e.g. duplicate column names) or when pyarrow isn't installed."""
+    try:
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, index=False)
+        return "parquet", buffer.getvalue()
+    except Exception:
+        return "json", zlib.compress(json.dumps(frame_to_payload(frame)).encode("utf-8"))
+
+
+def _decode_frame(result_format, blob):
+    if result_format == "parquet":
+        import pandas as pd
+        return pd.read_parquet(io.BytesIO(blob))
+    return frame_from_payload(json.loads(zlib.decompress(blob)))
+
+
+def _entry_json(entry):
+    fields = {key: value for key, value in entry.items() if key not in _LIVE_KEYS and key != "id"}
+    stream = entry.get("stream")
+    if stream is not None:
+        # The stream stays in this process; later loads can only say more rows existed
+        fields["more_rows"] = not stream.exhausted
+    if isinstance(fields.get("timestamp"), datetime):
+        fields["timestamp"] = fields["timestamp"].isoformat()
+    return json.dumps(fields, default=str)
+
+
+def _entry_from_row(row):
+    entry_id, fields, rows = row
+    entry = json.loads(fields)
+    if entry.get("timestamp"):
+        entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+    entry.update(id=entry_id, result=None, result_rows=rows, summary_pending=False)
+    return entry
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    entries: list   # Oldest first; entries still in memory are the live dicts
+    first: int      # 1-based number of the first entry
+    page: int       # 1-based, clamped to the available pages
+    pages: int
+    total: int
+
+
+class HistoryStore:
+    """SQLite table of history entries per scope (a ``login_label``), oldest first."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_entries=10_000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    entry TEXT NOT NULL,
+                    result_rows INTEGER,
+                    result_format TEXT,
+                    result BLOB
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_history_scope ON history (scope, id)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads and processes;
+        # the block commits (or rolls back) and the connection is closed after it
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add(self, scope, entry):
+        """Store ``entry`` (and its result frame) and return its id."""
+        result = entry.get("result")
+        result_format, blob = _encode_frame(result) if result is not None else (None, None)
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO history (scope, created_at, entry, result_rows, result_format, result) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, time.time(), _entry_json(entry), None if result is None else len(result), result_format, blob),
+            )
+            overflow = db.execute("SELECT COUNT(*) FROM history").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute("DELETE FROM history WHERE id IN (SELECT id FROM history ORDER BY id LIMIT ?)", (overflow,))
+            return cursor.lastrowid
+
+    def update(self, entry, result=False):
+        """Write back a changed entry (e.g. its summary arrived); ``result`` rewrites the result too."""
+        with self._connect() as db:
+            if result and entry.get("result") is not None:
+                result_format, blob = _encode_frame(entry["result"])
+                db.execute(
+                    "UPDATE history SET entry = ?, result_rows = ?, result_format = ?, result = ? WHERE id = ?",
+                    (_entry_json(entry), len(entry["result"]), result_format, blob, entry["id"]),
+                )
+            else:
+                db.execute("UPDATE history SET entry = ? WHERE id = ?", (_entry_json(entry), entry["id"]))
+
+    def count(self, scope, after=0):
+        """Entries of ``scope`` with an id above ``after``."""
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM history WHERE scope = ? AND id > ?", (scope, after)).fetchone()[0]
+
+    def last_id(self, scope):
+        with self._connect() as db:
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM history WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def entries(self, scope, offset, limit, after=0):
+        """Entries ``offset`` to ``offset + limit`` (oldest first) of those with an id above ``after``, without their results."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, entry, result_rows FROM history WHERE scope = ? AND id > ? ORDER BY id LIMIT ? OFFSET ?",
+                (scope, after, limit, offset),
+            ).fetchall()
+        return [_entry_from_row(row) for row in rows]
+
+    def result(self, entry_id):
+        """The stored result frame of an entry, or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT result_format, result FROM history WHERE id = ?", (entry_id,)).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return _decode_frame(*row)
+
+    def delete(self, entry_ids):
+        with self._connect() as db:
+            db.executemany("DELETE FROM history WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+
+
+class SessionHistory:
+    def __init__(self, store, scope, recent=20, memory_budget=256 * 1024 * 1024):
+        self.store = store
+        self.scope = scope
+        self.recent = recent
+        self.memory_budget = memory_budget
+        self._loaded = OrderedDict()    # id -> result frame loaded from the store, least recently shown first
+        self._lock = threading.Lock()
+        self._added = []    # Ids of the entries this session stored
+        self._after = 0     # Entries up to this id were cleared from this session's view
+        # The last ``recent`` entries, oldest first; a new session picks up where
+        # earlier ones on this server left off (their results stay on disk until shown)
+        total = store.count(scope)
+        self._entries = store.entries(scope, max(0, total - recent), recent)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def total(self):
+        """Entries on disk for this scope, including those no longer in memory."""
+        return self.store.count(self.scope, self._after)
+
+    def append(self, entry):
+        entry["id"] = self.store.add(self.scope, entry)
+        self._added.append(entry["id"])
+        self._entries.append(entry)
+        self._enforce()
+
+    def save(self, entry, result=False):
+        """Persist changes to an entry; safe to call from a worker thread."""
+        if "id" in entry:
+            self.store.update(entry, result)
+        if result:
+            self._enforce()
+
+    def page(self, page=None, page_size=10):
+        """A ``HistoryPage``; ``page=None`` is the newest one."""
+        total = self.total()
+        pages = max(1, -(-total // page_size))
+        page = pages if page is None else min(max(1, page), pages)
+        offset = (page - 1) * page_size
+        in_memory = {entry["id"]: entry for entry in self._entries}
+        entries = [in_memory.get(entry["id"], entry) for entry in self.store.entries(self.scope, offset, page_size, self._after)]
+        return HistoryPage(entries, offset + 1, page, pages, total)
+
+    def result(self, entry):
+        """The entry's result frame, loading it from the store (within the memory budget) if needed."""
+        if entry.get("result") is not None:
+            return entry["result"]
+        with self._lock:
+            frame = self._loaded.get(entry["id"])
+            if frame is not None:
+                self._loaded.move_to_end(entry["id"])
+                return frame
+        frame = self.store.result(entry["id"])
+        if frame is not None:
+            with self._lock:
+                self._loaded[entry["id"]] = frame
+            self._enforce()
+        return frame
+
+    def memory_bytes(self):
+        with self._lock:
+            loaded = sum(frame_nbytes(frame) for frame in self._loaded.values())
+        return loaded + sum(entry.get("result_bytes", 0) for entry in self._entries if entry.get("result") is not None)
+
+    def _enforce(self):
+        # Entries past ``recent`` leave memory; their results stay in the store
+        while len(self._entries) > self.recent:
+            self._release(self._entries.pop(0))
+        # Then the budget: results loaded for browsing go first, then the oldest in-memory ones
+        # (the newest result always stays)
+        while self.memory_bytes() > self.memory_budget:
+            with self._lock:
+                if self._loaded:
+                    self._loaded.popitem(last=False)
+                    continue
+            holding = [entry for entry in self._entries[:-1] if entry.get("result") is not None]
+            if not holding:
+                break
+            self._release(holding[0])
+
+    @staticmethod
+    def _release(entry):
+        if entry.get("stream") is not None:
+            entry["more_rows"] = not entry["stream"].exhausted
+            entry["stream"].close()
+            entry["stream"] = None
+        if entry.get("result") is not None:
+            entry["result_rows"] = len(entry["result"])
+            entry["result"] = None
+
+    def clear(self):
+        """Delete this session's entries; other sessions' saved entries are only hidden here."""
+        for entry in self._entries:
+            if entry.get("stream") is not None:
+                entry["stream"].close()
+        self._entries = []
+        with self._lock:
+            self._loaded.clear()
+        self.store.delete(self._added)
+        self._added = []
+        self._after = self.store.last_id(self.scope)
@@ -0,0 +1,142 @@
+"""HTTP client for the Ollama /api/generate and /api/chat endpoints.
+
+``OllamaClient`` keeps a pooled keep-alive ``requests.Session``, applies
+connect/read timeouts, retries transient failures with exponential backoff and
+asks Ollama to keep the model loaded between questions. It supports both plain
+JSON responses and NDJSON token streaming; when streaming, a ``should_stop``
+callback can end generation as soon as the caller has what it needs, and
+closing the response makes Ollama abandon the rest of the generation.
+Payloads with ``messages`` go to /api/chat; the reply text is returned as
+``response`` either way.
+"""
+import json
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+
+# Worth retrying: the model server is restarting, overloaded or still loading
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _text(chunk):
+    # /api/generate sends "response"; /api/chat sends {"message": {"content": ...}}
+    if "message" in chunk:
+        return chunk["message"].get("content", "")
+    return chunk.get("response", "")
+
+
+class OllamaClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=3.05, read_timeout=120,
+                 max_retries=2, retry_backoff=0.5, keep_alive="30m", pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def generate_url(self):
+        return f"{self.base_url}/api/generate"
+
+    @property
+    def chat_url(self):
+        return f"{self.base_url}/api/chat"
+
+    def _post(self, payload, stream):
+        """POST with bounded retries; only the request/headers phase is retried."""
+        url = self.chat_url if "messages" in payload else self.generate_url
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, json=payload, stream=stream, timeout=self.timeout)
+                if response.status_code not in _RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            time.sleep(self.retry_backoff * (2 ** attempt))
+            attempt += 1
+
+    def generate(self, payload, on_token=None, should_stop=None):
+        """Run a generation and return Ollama's final response dict.
+
+        ``response`` holds the full generated text, and ``client_ttft_ms`` /
+        ``client_total_ms`` the time to first token and total wall time as seen
+        by the client. With ``payload["stream"]`` set, ``on_token(text_so_far)``
+        is called for every chunk and generation stops early once
+        ``should_stop(text_so_far)`` returns True (``stopped_early`` is then
+        set on the result). Ollama's statistics only come with its final
+        chunk, so a stopped generation reports the client's own count instead:
+        ``eval_count`` is the chunks received (one token each) and
+        ``eval_duration`` the time from first to last; the prompt statistics
+        are missing.
+        """
+        payload = dict(payload)
+        payload.setdefault("keep_alive", self.keep_alive)
+        started = time.perf_counter()
+
+        if not payload.get("stream"):
+            response = self._post(payload, stream=False)
+            result = response.json()
+            result["response"] = _text(result)
+            result["client_ttft_ms"] = result["client_total_ms"] = (time.perf_counter() - started) * 1000
+            return result
+
+        first_token_at = last_token_at = None
+        parts = []
+        result = {}
+        stopped_early = False
+        response = self._post(payload, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                token = _text(chunk)
+                if token:
+                    last_token_at = time.perf_counter()
+                    if first_token_at is None:
+                        first_token_at = last_token_at
+                    parts.append(token)
+                    text = "".join(parts)
+                    if on_token is not None:
+                        on_token(text)
+                    if should_stop is not None and should_stop(text):
+                        stopped_early = True
+                        break
+                if chunk.get("done"):
+                    # The final chunk carries the timing/eval statistics
+                    result = chunk
+                    break
+        finally:
+            response.close()
+
+        finished = time.perf_counter()
+        result["response"] = "".join(parts)
+        result["stopped_early"] = stopped_early
+        if stopped_early:
+            result["eval_count"] = len(parts)
+            result["eval_duration"] = int((last_token_at - first_token_at) * 1e9)
+        result["client_ttft_ms"] = ((first_token_at or finished) - started) * 1000
+        result["client_total_ms"] = (finished - started) * 1000
+        return result
+
+    def warm_up(self, model):
+        """Load ``model`` into memory ahead of the first question.
+
+        A generate request without a prompt only loads the model and applies
+        ``keep_alive``, so it is cheap when the model is already resident.
+        """
+        response = self._post({"model": model, "keep_alive": self.keep_alive}, stream=False)
+        response.close()
@@ -0,0 +1,163 @@
+"""Per-stage latency instrumentation and a scrapeable metrics surface.
+
+Each question records its stage timings (monotonic clock, milliseconds) on its
+history entry. The same numbers feed process-wide percentile histograms that
+can be rendered in-app, dumped as JSON, or scraped in Prometheus text format
+from a small HTTP endpoint.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Ollama reports durations in nanoseconds on the final response chunk
+OLLAMA_DURATION_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+OLLAMA_COUNT_FIELDS = ("prompt_eval_count", "eval_count")
+
+
+def ollama_stats(response):
+    """Pick Ollama's own timing/token fields from a response, durations in ms."""
+    stats = {}
+    for field in OLLAMA_DURATION_FIELDS:
+        if field in response:
+            stats[field.replace("_duration", "_ms")] = response[field] / 1e6
+    for field in OLLAMA_COUNT_FIELDS:
+        if field in response:
+            stats[field] = response[field]
+    if stats.get("eval_count") and stats.get("eval_ms"):
+        stats["tokens_per_second"] = stats["eval_count"] / (stats["eval_ms"] / 1000)
+    return stats
+
+
+class StageTimer:
+    """Collects named stage durations (ms) for a single question."""
+
+    def __init__(self):
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def record(self, name, milliseconds):
+        self.timings[name] = milliseconds
+
+    def elapsed(self):
+        return (time.perf_counter() - self._started) * 1000
+
+
+class Histogram:
+    """Count/sum plus a bounded window of recent observations for percentiles."""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def summary(self):
+        ordered = sorted(self._recent)
+        result = {"count": self.count, "sum": self.total, "max": self.max}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self, window=1000):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.observe(value)
+
+    def observe_all(self, values, prefix=""):
+        for name, value in values.items():
+            if isinstance(value, (int, float)):
+                self.observe(prefix + name, value)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": {name: h.summary() for name, h in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, namespace="nl2sql"):
+        return prometheus_text(self.snapshot(), namespace)
+
+
+def prometheus_text(snapshot, namespace="nl2sql"):
+    """A ``MetricsRegistry.snapshot()`` in the Prometheus text format."""
+    lines = []
+    for name, value in snapshot["counters"].items():
+        metric = f"{namespace}_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, summary in snapshot["histograms"].items():
+        metric = f"{namespace}_{name}"
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            lines.append(f'{metric}{{quantile="{q}"}} {summary[f"p{int(q * 100)}"]:.3f}')
+        lines += [f"{metric}_sum {summary['sum']:.3f}", f"{metric}_count {summary['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(registry, host="127.0.0.1", port=9464):
+    """Expose ``/metrics`` (Prometheus text) and ``/metrics.json`` in a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = registry.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
@@ -0,0 +1,531 @@
+"""The question pipeline without any UI: question -> SQL -> result -> summary.
+
+``QuestionPipeline`` turns a question into SQL with the Ollama client (and the
+generation cache and earlier questions as examples), runs it through the
+``QueryExecutor`` and summarizes it.
+Each model call uses a profile of ``MODEL_PROFILES`` (sql, repair or summary)
+and is timed and scored per profile and model.
+``steps()`` is a question's whole flow as a generator of ``Step``s, each
+marked with what it occupies (the model, a database connection, or just this
+process). Front ends run the steps their own way: the Streamlit page with
+progress between them and a cancellable query, the service on its executors,
+batch mode under its concurrency limits. Headless callers such as the
+benchmark suite run a whole question with ``ask()``. Build it through
+``engine.Engine`` rather than by hand.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from metrics import MetricsRegistry, StageTimer, ollama_stats
+from query_executor import QueryCancelled
+from result_digest import build_digest
+from results import frame_nbytes
+from sql_extractor import SqlExtractor
+from sql_validator import InvalidSql, check_identifiers, describe_error
+
+# Comes first in every SQL prompt, so together with the table block it forms a
+# prefix the model server has already evaluated for earlier questions
+SQL_INSTRUCTIONS = (
+    "You write one SQL Server (T-SQL) query for the task, using the schema below.\n"
+    "IMPORTANT: Return ONLY the SQL query. No explanations, no comments, no text before or after.\n"
+    "Rules: Use aggregates when possible, TOP N for limits, WHERE for filters, GROUP BY with aggregates."
+)
+PROFILE_OPTIONS = ("num_predict", "temperature", "top_p", "top_k", "num_ctx", "stop")
+CANCELLED = "Query cancelled."
+
+
+@dataclass
+class Step:
+    """One piece of a question's work, handed to whoever drives ``QuestionPipeline.steps``.
+
+    ``resource`` is what it occupies while it runs: "llm" (a model call),
+    "db" (a SQL Server connection) or "local" (caches and prompt building).
+    """
+    stage: str
+    resource: str
+    call: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+
+    def run(self):
+        return self.call(*self.args, **self.kwargs)
+
+
+def drive(steps, run=Step.run):
+    """Run a ``QuestionPipeline.steps`` generator with ``run(step)`` and return its history entry.
+
+    Each step's result is sent back into the generator and its exception
+    thrown in, so the pipeline decides what a failure means.
+    """
+    reply = error = None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(reply)
+        except StopIteration as done:
+            return done.value
+        reply = error = None
+        try:
+            reply = run(step)
+        except Exception as e:
+            error = e
+
+
+def _model_missing(error):
+    # Ollama answers 404 for a model that hasn't been pulled
+    return getattr(getattr(error, "response", None), "status_code", None) == 404
+
+
+def _slug(model):
+    return re.sub(r"[^0-9a-z]+", "_", model.lower()).strip("_")
+
+
+class QuestionPipeline:
+    def __init__(self, executor, llm, speed_config, summary_config, model_profiles, generation_cache=None,
+                 metrics=None, validation_config=None, schema_config=None, example_store=None, example_config=None):
+        self.executor = executor
+        self.llm = llm
+        self.speed_config = speed_config
+        self.summary_config = summary_config
+        self.model_profiles = model_profiles
+        self._missing_models = set()
+        self.generation_cache = generation_cache
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.validation_config = validation_config
+        self.schema_config = schema_config
+        self.example_store = example_store
+        self.example_config = example_config
+
+    def begin(self):
+        """Start timing a new question."""
+        self.metrics.increment("questions")
+        return StageTimer()
+
+    # Model profiles
+
+    def models(self, profile):
+        """The model chain of ``profile``: its model, then its fallbacks."""
+        config = self.model_profiles[profile]
+        if profile == "repair" and config["model"] is None:
+            # Repairs escalate: the first one goes to the model after the SQL model
+            chain = self.models("sql")
+            return chain[1:] or chain
+        return [config["model"], *config.get("fallback", ())]
+
+    def model(self, profile, step=0):
+        """The model ``step`` places down ``profile``'s chain, skipping models Ollama doesn't have."""
+        chain = self.models(profile)
+        candidates = chain[min(step, len(chain) - 1):]
+        return next((model for model in candidates if model not in self._missing_models), candidates[-1])
+
+    def _payload(self, profile, prompt, system=None, step=0):
+        """A /api/generate payload, or with ``system`` a /api/chat one with ``prompt`` as the user turn."""
+        config = self.model_profiles[profile]
+        if system is None:
+            request = {"prompt": prompt}
+        else:
+            request = {"messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}]}
+        return {
+            "model": self.model(profile, step),
+            **request,
+            "stream": self.speed_config["enable_streaming"],
+            "options": {option: config[option] for option in PROFILE_OPTIONS if config.get(option) is not None},
+        }
+
+    def _generate(self, profile, payload, **kwargs):
+        """``llm.generate`` with the next model of ``profile`` when Ollama doesn't have the requested one."""
+        while True:
+            model = payload["model"]
+            try:
+                response = self.llm.generate(payload, **kwargs)
+            except Exception as e:
+                chain = self.models(profile)
+                if _model_missing(e) and model in chain:
+                    self._missing_models.add(model)
+                    replacement = self.model(profile, chain.index(model))
+                    if replacement != model:
+                        self.metrics.increment("model_fallbacks")
+                        payload = dict(payload, model=replacement)
+                        continue
+                self.metrics.increment(f"profile_{profile}_{_slug(model)}_errors")
+                raise
+            self.metrics.observe(f"profile_{profile}_{_slug(model)}_ms", response["client_total_ms"])
+            response["model"] = model
+            return response
+
+    def _score(self, profile, model, passed):
+        self.metrics.increment(f"profile_{profile}_{_slug(model)}_{'passed' if passed else 'failed'}")
+
+    def profile_stats(self):
+        """Per profile and model: calls, latency and, for SQL, how often validation passed."""
+        snapshot = self.metrics.snapshot()
+        rows = []
+        for profile in self.model_profiles:
+            for model in dict.fromkeys(self.models(profile)):
+                name = f"profile_{profile}_{_slug(model)}"
+                latency = snapshot["histograms"].get(f"{name}_ms")
+                passed = snapshot["counters"].get(f"{name}_passed", 0)
+                failed = snapshot["counters"].get(f"{name}_failed", 0)
+                errors = snapshot["counters"].get(f"{name}_errors", 0)
+                if latency is None and not errors + passed + failed:
+                    continue
+                rows.append({
+                    "profile": profile,
+                    "model": model,
+                    "calls": latency["count"] if latency else 0,
+                    "errors": errors,
+                    "p50_ms": latency["p50"] if latency else None,
+                    "p90_ms": latency["p90"] if latency else None,
+                    "valid_sql": passed / (passed + failed) if passed + failed else None,
+                })
+        return rows
+
+    def warm_up(self):
+        """Load the SQL and summary models, moving past any Ollama doesn't have."""
+        warmed = set()
+        for profile in ("sql", "summary"):
+            while self.model(profile) not in warmed:
+                model = self.model(profile)
+                warmed.add(model)
+                try:
+                    self.llm.warm_up(model)
+                except Exception as e:
+                    if _model_missing(e):
+                        self._missing_models.add(model)
+
+    def schema_context(self, catalog, table_info, question):
+        """What the prompt shows of the schema for ``question``.
+
+        With retrieval on, a ``SchemaContext`` with the relevant tables and
+        columns of ``catalog`` within the token budget; it stands in for
+        ``table_info`` in every later call. Otherwise ``table_info`` itself.
+        """
+        config = self.schema_config
+        if config is None or catalog is None:
+            return table_info
+        context = catalog.schema_index.select(
+            question, table_info, config["token_budget"], config["max_tables"], config["min_score_ratio"],
+            config["prefix_share"],
+        )
+        self.metrics.increment("schema_context_multi_table" if len(context.tables) > 1 else "schema_context_single_table")
+        return context
+
+    def examples(self, server_info, database, table_info, question):
+        """Earlier questions on the tables in ``table_info``'s prompt that resemble ``question``."""
+        if self.example_store is None:
+            return []
+        config = self.example_config
+        tables = {f"{info.schema}.{info.name}": info.fingerprint for info, _ in table_info.tables}
+        examples = self.example_store.similar(
+            f"{server_info['server']}/{database}", tables, question, config["top_k"], config["min_similarity"],
+        )
+        if examples:
+            self.metrics.increment("example_prompts")
+        return examples
+
+    def sql_payload(self, table_info, question, examples=()):
+        """Chat payload: instructions and the table's stable block as the system
+        message; ``examples``, the question-specific schema and the task as the user turn.
+
+        Successive questions on a table share everything up to the user turn,
+        so Ollama only evaluates the new suffix when its prompt cache still
+        holds that prefix (the model stays loaded through ``keep_alive``).
+        """
+        system = f"{SQL_INSTRUCTIONS}\n\n{table_info.prompt_prefix}"
+        shots = "".join(f"Task: {example.question}\nSQL: {example.sql}\n\n" for example in examples)
+        if shots:
+            shots = f"Earlier tasks on this database and the SQL that answered them:\n\n{shots}"
+        schema = f"{table_info.prompt_suffix}\n\n" if table_info.prompt_suffix else ""
+        prompt = f"{shots}{schema}Task: {question}\nSQL:"
+        return self._payload("sql", prompt, system=system)
+
+    def _generation_key(self, server_info, database, table_info, payload):
+        # The scope is invalidated by the selected table's own schema; the prompt
+        # context differs per question, so it only goes into the entry's key
+        selected = table_info.tables[0][0]
+        scope = f"{server_info['server']}/{database}/{selected.schema}.{selected.name}"
+        options = {"model": payload["model"], "options": payload["options"], "context": table_info.fingerprint}
+        return scope, selected.fingerprint, options
+
+    def _example_key(self, server_info, database, table_info):
+        # Examples are matched on the selected table's own schema, whatever else the prompt showed
+        selected = table_info.tables[0][0]
+        return f"{server_info['server']}/{database}", f"{selected.schema}.{selected.name}", selected.fingerprint
+
+    def prompt(self, server_info, database, catalog, table_info, question, timer):
+        """``(table_info, payload)``: the schema context for ``question`` (see ``schema_context``) and its SQL payload."""
+        with timer.stage("prompt_build_ms"):
+            # Relevant tables and columns of the whole database, within the prompt budget
+            table_info = self.schema_context(catalog, table_info, question)
+            # Similar questions that worked before, as examples for the model
+            examples = self.examples(server_info, database, table_info, question)
+            return table_info, self.sql_payload(table_info, question, examples)
+
+    def cached_sql(self, server_info, database, table_info, question, payload):
+        """SQL that already ran for this question: a generation cache hit, or
+        a near-exact repeat of an earlier question. None means generate it."""
+        if self.generation_cache is not None:
+            scope, schema_hash, options = self._generation_key(server_info, database, table_info, payload)
+            sql = self.generation_cache.get(scope, schema_hash, question, options)
+            if sql:
+                self.metrics.increment("generation_cache_hits")
+                return sql
+        if self.example_store is not None and self.example_config["reuse_near_exact"]:
+            sql = self.example_store.match(*self._example_key(server_info, database, table_info), question)
+            if sql:
+                self.metrics.increment("example_reuses")
+                return sql
+        return None
+
+    def remember_sql(self, server_info, database, table_info, question, payload, sql):
+        """Cache SQL for reuse and keep it as an example; only call this once the SQL has actually run."""
+        if self.generation_cache is not None:
+            scope, schema_hash, options = self._generation_key(server_info, database, table_info, payload)
+            self.generation_cache.put(scope, schema_hash, question, options, sql)
+        if self.example_store is not None:
+            self.example_store.put(*self._example_key(server_info, database, table_info), question, sql)
+
+    def generate_sql(self, payload, timer, ollama, on_token=None, profile="sql"):
+        """Stream SQL from the model, stopping as soon as a full statement is in."""
+        extractor = SqlExtractor()
+        try:
+            generation = self._generate(profile, payload, on_token=on_token, should_stop=extractor.update)
+        except Exception:
+            self.metrics.increment("generation_errors")
+            raise
+        timer.record("llm_ttft_ms", generation["client_ttft_ms"])
+        timer.record("llm_total_ms", generation["client_total_ms"])
+        ollama["sql"] = ollama_stats(generation)
+        self.metrics.observe_all(ollama["sql"], prefix="ollama_sql_")
+        ollama["sql"]["model"] = generation["model"]
+        # Non-streaming responses arrive whole; streamed ones are already scanned
+        extractor.update(generation["response"])
+        return extractor.finish()
+
+    def repair_payload(self, table_info, question, sql, error, attempt=0):
+        # Same system prefix as the generation, so the repair reuses its evaluated prompt too
+        # (while the repair model is the SQL model); each further attempt escalates one model
+        system = f"{SQL_INSTRUCTIONS}\n\n{table_info.prompt_prefix}"
+        schema = f"{table_info.prompt_suffix}\n\n" if table_info.prompt_suffix else ""
+        prompt = (
+            f"{schema}Task: {question}\n\n"
+            f"This SQL Server query failed:\n{sql}\n"
+            f"Error: {error}\n\n"
+            f"Return ONLY the corrected SQL query, using only the tables and columns above. No explanations.\n"
+            f"SQL:"
+        )
+        return self._payload("repair", prompt, system=system, step=attempt)
+
+    def validate_sql(self, server_info, database, table_info, sql):
+        """Return ``(error, check)`` for SQL that fails a check, else ``(None, None)``."""
+        config = self.validation_config
+        if config["local_check"]:
+            problems = check_identifiers(sql, table_info)
+            if problems:
+                return " ".join(problems), "local"
+        if config["server_check"]:
+            try:
+                with self.executor.pool(server_info, database).connection() as conn:
+                    error = describe_error(conn, sql)
+            except Exception:
+                error = None  # No connection now; execution will report it
+            if error:
+                return error, "server"
+        return None, None
+
+    def _validated(self, server_info, database, table_info, sql):
+        # Timed where it runs, not where it was queued
+        started = time.perf_counter()
+        error, check = self.validate_sql(server_info, database, table_info, sql)
+        return error, check, (time.perf_counter() - started) * 1000
+
+    def checked_steps(self, server_info, database, table_info, question, sql, timer, repairs):
+        """Steps that validate ``sql``, letting the model repair it up to ``max_repairs`` times.
+
+        Every failed check is appended to ``repairs`` with its error and
+        timings. Returns SQL that passed; raises ``InvalidSql`` once repairs
+        run out. Every check scores the model that wrote the SQL (see ``profile_stats``).
+        """
+        if self.validation_config is None:
+            return sql
+        max_repairs = self.validation_config["max_repairs"]
+        validate_ms = repair_ms = 0.0
+        # The SQL being checked first came from the SQL profile's current model
+        profile, model = "sql", self.model("sql")
+        try:
+            for attempt in range(max_repairs + 1):
+                error, check, elapsed = yield Step(
+                    "validate", "db", self._validated, (server_info, database, table_info, sql),
+                )
+                validate_ms += elapsed
+                self._score(profile, model, error is None)
+                if error is None:
+                    if repairs:
+                        self.metrics.increment("repairs_succeeded")
+                    return sql
+                self.metrics.increment("validation_failures")
+                self.metrics.observe("validation_failed_ms", elapsed)
+                repairs.append({"sql": sql, "error": error, "check": check, "validate_ms": elapsed})
+                if attempt == max_repairs:
+                    break
+                repair_timer = StageTimer()
+                ollama = {}
+                payload = self.repair_payload(table_info, question, sql, error, attempt)
+                sql = yield Step("repair", "llm", self.generate_sql, (payload, repair_timer, ollama), {"profile": "repair"})
+                profile, model = "repair", ollama["sql"]["model"]
+                repairs[-1].update(
+                    repair_ms=repair_timer.timings["llm_total_ms"], ollama=ollama["sql"], model=model,
+                )
+                repair_ms += repairs[-1]["repair_ms"]
+        finally:
+            timer.record("validate_ms", validate_ms)
+            if repair_ms:
+                timer.record("repair_ms", repair_ms)
+        self.metrics.increment("repairs_exhausted")
+        raise InvalidSql(f"{error} (still failing after {max_repairs} repair attempts)")
+
+    def summary_payload(self, question, database, table, result_df, complete=True):
+        # A bounded digest keeps the summary prompt small however large the result is
+        result_digest = build_digest(
+            result_df,
+            token_budget=self.summary_config["digest_token_budget"],
+            head_rows=self.summary_config["digest_head_rows"],
+            top_k=self.summary_config["digest_top_k"],
+            complete=complete,
+        )
+        prompt = (
+            f"Question: {question}\n"
+            f"Database: {database}\n"
+            f"Table: {table}\n"
+            f"SQL Result:\n{result_digest}\n"
+            "Summarize the result above in one sentence for a non-technical user."
+        )
+        return self._payload("summary", prompt)
+
+    def summarize_into(self, qa, payload, timer):
+        """Generate the summary straight into history entry ``qa``.
+
+        Safe to run on a worker thread: it only touches the entry, and clears
+        ``summary_pending`` when done (whether or not it succeeded).
+        """
+        def show_partial(text):
+            qa["summary"] = text
+        try:
+            response = self._generate("summary", payload, on_token=show_partial)
+            qa["summary"] = response["response"].strip()
+            timer.record("summary_ttft_ms", response["client_ttft_ms"])
+            timer.record("summary_total_ms", response["client_total_ms"])
+            qa["ollama"]["summary"] = ollama_stats(response)
+            self.metrics.observe_all(qa["ollama"]["summary"], prefix="ollama_summary_")
+            qa["ollama"]["summary"]["model"] = response["model"]
+        except Exception as e:
+            qa["summary"] = f"Summary unavailable: {e}"
+            self.metrics.increment("summary_errors")
+        finally:
+            timer.record("end_to_end_ms", timer.elapsed())
+            self.metrics.observe_all({k: v for k, v in timer.timings.items() if k.startswith(("summary_", "end_to_end"))})
+            qa["summary_pending"] = False
+
+    @staticmethod
+    def new_entry(question, sql, database, table, timer, ollama, result_df=None, stream=None, cached=False, summary="",
+                  guardrail=None, repairs=None, error=None):
+        """Build a Q&A history entry; the summary is attached when it is ready.
+
+        ``sql`` is the statement that ran, ``guardrail`` the note explaining
+        how the guardrails changed it, if they did, and ``repairs`` the failed
+        validation attempts before it (see ``checked_steps``). An ``error``
+        doubles as the summary.
+        """
+        entry = {
+            "question": question,
+            "sql": sql,
+            "result": result_df,
+            "result_bytes": frame_nbytes(result_df) if result_df is not None else 0,
+            "summary": error or summary,
+            "error": error,
+            "database": database,
+            "table": table,
+            "timings": timer.timings,
+            "ollama": ollama,
+            "repairs": repairs or [],
+            "timestamp": datetime.now(),
+        }
+        if result_df is not None:
+            entry.update({
+                "truncated": stream is not None and stream.truncated,
+                "stream": stream if stream is not None and stream.has_more else None,
+                "summary_pending": True,
+                "result_cached": cached,
+                "guardrail": guardrail,
+            })
+        return entry
+
+    def steps(self, server_info, database, table_info, question, cache_mode="Use cache", catalog=None,
+              summarize=True, on_token=None):
+        """One question as a generator of ``Step``s; run it with ``drive`` or a driver of your own.
+
+        The driver sends each step's result back in (or throws its
+        exception in) and gets the history entry as the generator's return
+        value; failures end up in the entry's ``error``. The summary is the
+        last step, once the entry holds its result, so a driver may run it
+        in the background; with ``summarize=False`` it is left pending.
+        ``catalog`` lets the prompt draw on the whole database (see
+        ``schema_context``), ``on_token`` sees the SQL as it streams in.
+        """
+        timer = self.begin()
+        ollama = {}
+        repairs = []
+        sql = None
+        table = table_info.name
+
+        def failed(error):
+            return self.new_entry(question, sql, database, table, timer, ollama, repairs=repairs, error=error)
+
+        try:
+            table_info, payload = yield Step(
+                "prompt", "local", self.prompt, (server_info, database, catalog, table_info, question, timer),
+            )
+            sql = yield Step("cached", "local", self.cached_sql, (server_info, database, table_info, question, payload))
+            if not sql:
+                sql = yield Step("generate", "llm", self.generate_sql, (payload, timer, ollama), {"on_token": on_token})
+                # Catch wrong names before execution; the model gets the error back to fix it
+                sql = yield from self.checked_steps(server_info, database, table_info, question, sql, timer, repairs)
+        except InvalidSql as e:
+            sql = repairs[-1]["sql"] if repairs else sql
+            return failed(f"Invalid SQL: {e}")
+        except Exception as e:
+            return failed(f"Error generating SQL: {e}")
+        try:
+            execution = yield Step("execute", "db", self.executor.execute, (server_info, database, sql, timer, cache_mode))
+        except QueryCancelled:
+            return failed(CANCELLED)
+        except Exception as e:
+            return failed(f"Error executing SQL: {e}")
+        timer.record("time_to_results_ms", timer.elapsed())
+        self.metrics.observe_all(timer.timings)
+        # Only remember SQL that actually ran
+        yield Step("remember", "local", self.remember_sql, (server_info, database, table_info, question, payload, sql))
+
+        stream = execution.stream
+        entry = self.new_entry(question, execution.sql, database, table, timer, ollama, execution.frame, stream,
+                               execution.cached, guardrail=execution.guardrail, repairs=repairs)
+        if summarize:
+            summary_payload = self.summary_payload(
+                question, database, table, execution.frame, complete=stream is None or stream.exhausted,
+            )
+            yield Step("summarize", "llm", self.summarize_into, (entry, summary_payload, timer))
+        return entry
+
+    def ask(self, server_info, database, table_info, question, cache_mode="Use cache", keep_stream=False,
+            catalog=None):
+        """Run one question end to end (summary included) and return its history entry.
+
+        Errors are reported in the entry's ``error`` and ``summary`` as in the app. Unless
+        ``keep_stream`` is set, any unread rows are released straight away.
+        """
+        entry = drive(self.steps(server_info, database, table_info, question, cache_mode, catalog))
+        if entry.get("stream") is not None and not keep_stream:
+            entry["stream"].close()
+            entry["stream"] = None
+        return entry
@@ -0,0 +1,177 @@
+"""Runs generated SQL on pooled connections, with guardrails, result caching and paging."""
+import threading
+import time
+from dataclasses import dataclass
+
+from connection_pool import login_label
+from guardrails import QueryRejected
+from results import ResultStream, frame_nbytes
+from sql_parameters import parameterize
+
+
+class QueryCancelled(Exception):
+    """The user cancelled the query while it was running."""
+
+
+class QueryTimedOut(Exception):
+    """The server stopped the query after the pool's ``query_timeout``."""
+
+
+@dataclass
+class Execution:
+    frame: object
+    stream: object = None
+    cached: bool = False
+    sql: str = ""           # The SQL that actually ran (literals shown inline); differs from the input when capped
+    guardrail: str = None   # Why the guardrails changed the SQL, if they did
+
+
+class QueryJob:
+    """A query running on a worker thread that can be cancelled on the server.
+
+    ``cancel()`` calls ``cursor.cancel()`` (ODBC ``SQLCancel``), which stops
+    the statement on SQL Server; the worker then raises ``QueryCancelled``.
+    """
+
+    def __init__(self):
+        self.future = None
+        self.started = time.monotonic()
+        self.cancelled = False
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def attach(self, cursor):
+        with self._lock:
+            self._cursor = cursor
+            cancelled = self.cancelled
+        if cancelled:
+            raise QueryCancelled("Query cancelled")
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception:
+                pass  # Already finished or closed
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+def _is_timeout(error):
+    # pyodbc reports SQLSTATE HYT00 ("Query timeout expired") as args[0]
+    return bool(getattr(error, "args", None)) and error.args[0] == "HYT00"
+
+
+class QueryExecutor:
+    def __init__(self, pools, fetch_config, result_cache=None, metrics=None, open_streams=None, guardrails=None):
+        self.pools = pools
+        self.fetch_config = fetch_config
+        self.result_cache = result_cache
+        self.metrics = metrics
+        self.open_streams = open_streams
+        self.guardrails = guardrails
+
+    def pool(self, server_info, database):
+        return self.pools.get(
+            server_info["server"],
+            server_info["port"],
+            server_info["username"],
+            server_info["password"],
+            database,
+        )
+
+    def start(self, workers, server_info, database, sql, timer, cache_mode="Use cache"):
+        """Run ``execute`` on the ``workers`` thread pool; returns a cancellable ``QueryJob``."""
+        job = QueryJob()
+        job.future = workers.submit(self.execute, server_info, database, sql, timer, cache_mode, job)
+        return job
+
+    def execute(self, server_info, database, sql, timer, cache_mode="Use cache", job=None):
+        """Run ``sql`` and return an ``Execution`` holding the first page.
+
+        ``stream`` is the open ``ResultStream`` (None for cached results); pages
+        beyond the first are fetched from it on demand. ``cache_mode`` is one of
+        "Use cache", "Refresh" or "Bypass". Raises ``QueryRejected`` when the
+        guardrails refuse the plan, ``QueryTimedOut`` and ``QueryCancelled``.
+        """
+        # Per login: another login may not be allowed to read these rows
+        label = login_label(server_info)
+        # Filter values become bound parameters; questions that differ only
+        # in those values then share one cached plan on the server
+        query = parameterize(sql) if self.fetch_config.get("parameterize") else None
+        cache_key = query if query is not None else sql
+        if self.result_cache is not None and cache_mode == "Use cache":
+            cached = self.result_cache.get(label, database, cache_key)
+            if cached is not None:
+                self._increment("result_cache_hits")
+                return Execution(cached, cached=True, sql=sql)
+
+        pool = self.pool(server_info, database)
+        executed_sql, note = sql, None
+        if self.guardrails is not None:
+            try:
+                with timer.stage("plan_check_ms"):
+                    executed_sql, note = self.guardrails.review(pool, sql)
+            except QueryRejected:
+                self._increment("guardrail_rejections")
+                raise
+            if note:
+                self._increment("guardrail_capped")
+                query = parameterize(executed_sql) if query is not None else None
+        if query is not None:
+            self._increment("parameterized_queries")
+
+        stream = None
+        started = time.perf_counter()
+        try:
+            if job is not None and job.cancelled:
+                raise QueryCancelled("Query cancelled")
+            # Page through the result on a pooled connection instead of fetchall()
+            options = {k: self.fetch_config[k] for k in ("batch_size", "page_rows", "max_rows", "max_bytes")}
+            on_cursor = job.attach if job is not None else None
+            with timer.stage("sql_execute_ms"):
+                if query is not None:
+                    stream = ResultStream.open(
+                        pool, query.sql, query.params, query.input_sizes(), on_cursor=on_cursor, **options
+                    )
+                else:
+                    stream = ResultStream.open(pool, executed_sql, on_cursor=on_cursor, **options)
+            with timer.stage("fetch_ms"):
+                first_page = stream.fetch_page()
+            # Only a result with more rows keeps its connection
+            if self.open_streams is not None and stream.has_more:
+                self.open_streams.add(stream)
+        except Exception as e:
+            if stream is not None:
+                stream.close()
+            if job is not None and job.cancelled:
+                self._increment("sql_cancelled")
+                raise QueryCancelled("Query cancelled") from e
+            if _is_timeout(e):
+                self._increment("sql_timeouts")
+                raise QueryTimedOut(f"Query stopped after the {pool.query_timeout}s timeout") from e
+            self._increment("sql_errors")
+            if self.metrics is not None:
+                # Compare with validation_failed_ms: what catching the error before execution saves
+                self.metrics.observe("sql_failed_ms", (time.perf_counter() - started) * 1000)
+            raise
+
+        # Only complete results of the SQL as generated are worth caching
+        if self.result_cache is not None and cache_mode != "Bypass" and stream.exhausted and note is None:
+            self.result_cache.put(label, database, cache_key, first_page, frame_nbytes(first_page))
+        return Execution(first_page, stream, sql=executed_sql, guardrail=note)
+
+    def _increment(self, name):
+        if self.metrics is not None:
+            self.metrics.increment(name)
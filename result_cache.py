@@ -0,0 +1,93 @@
+"""In-memory TTL cache for executed SQL results.
+
+Entries are keyed by (login, database, normalized SQL) -- or by the
+parameterized text and values when the SQL was parameterized -- and bounded by a total
+byte budget rather than an entry count, evicting least recently used results
+first. Hit/miss counters make the saved database load visible in the UI.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_TOKENS = re.compile(r"'(?:[^']|'')*'|\[[^\]]*\]|\"[^\"]*\"|\s+|[^'\[\"\s]+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside literals/identifiers and drop a trailing semicolon."""
+    parts = []
+    for token in _TOKENS.findall(sql.strip()):
+        parts.append(" " if token.isspace() else token)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class ResultCache:
+    def __init__(self, ttl_seconds=300, max_bytes=64 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size_bytes, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(login, database, sql):
+        """``sql`` is SQL text or anything with a ``cache_key`` (``ParameterizedSql``)."""
+        cache_key = getattr(sql, "cache_key", None)
+        return (login, database, cache_key if cache_key is not None else normalize_sql(sql))
+
+    def get(self, login, database, sql):
+        key = self.make_key(login, database, sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._drop_locked(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, login, database, sql, value, size_bytes):
+        if size_bytes > self.max_bytes:
+            return False  # Larger than the whole budget; never worth caching
+        key = self.make_key(login, database, sql)
+        with self._lock:
+            if key in self._entries:
+                self._drop_locked(key)
+            self._entries[key] = (value, size_bytes, time.monotonic())
+            self._bytes += size_bytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop_locked(oldest)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _drop_locked(self, key):
+        _, size_bytes, _ = self._entries.pop(key)
+        self._bytes -= size_bytes
@@ -0,0 +1,81 @@
+"""Compact, token-bounded description of a query result for the summary prompt.
+
+Instead of pasting every row into the prompt, the digest reports the row count,
+column types, a short head sample and per-column statistics (min/max/mean for
+numbers and dates, top-k values for everything else). Its size depends on the
+number of columns, not rows, so summary latency stays flat as results grow.
+"""
+import pandas as pd
+
+# Rough chars-per-token ratio for English/SQL text with llama-family tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.4g}"
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=" ", timespec="seconds")
+    text = str(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def _column_stats(name, series, top_k):
+    non_null = series.dropna()
+    nulls = len(series) - len(non_null)
+    null_note = f", {nulls:,} nulls" if nulls else ""
+    if non_null.empty:
+        return f"- {name}: all null"
+    if pd.api.types.is_bool_dtype(series):
+        counts = non_null.value_counts()
+        parts = ", ".join(f"{_format_value(v)}={c:,}" for v, c in counts.items())
+        return f"- {name}: {parts}{null_note}"
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.infer_dtype(non_null) == "decimal":
+        return (
+            f"- {name}: min {_format_value(float(non_null.min()))}, max {_format_value(float(non_null.max()))}, "
+            f"mean {_format_value(float(non_null.mean()))}{null_note}"
+        )
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return f"- {name}: from {_format_value(non_null.min())} to {_format_value(non_null.max())}{null_note}"
+    counts = non_null.astype(str).value_counts()
+    top = ", ".join(f"{_format_value(v)} ({c:,})" for v, c in counts.head(top_k).items())
+    return f"- {name}: {len(counts):,} distinct; top {top}{null_note}"
+
+
+def build_digest(frame, token_budget=400, head_rows=5, top_k=3, complete=True):
+    """Describe ``frame`` in at most ``token_budget`` (estimated) tokens.
+
+    ``complete=False`` marks a result that was cut off by a row/size cap or
+    paging, so the row count is reported as a lower bound.
+    """
+    row_count = f"{len(frame):,}" if complete else f"at least {len(frame):,} (result truncated)"
+    header = [
+        f"Rows: {row_count}",
+        "Columns: " + ", ".join(f"{name} ({dtype})" for name, dtype in zip(frame.columns, frame.dtypes)),
+    ]
+    stats = [
+        _column_stats(name, frame.iloc[:, position], top_k)
+        for position, name in enumerate(frame.columns)
+    ] if len(frame) else []
+
+    # Shrink the head sample first, then drop column stats, until it fits
+    for rows in range(min(head_rows, len(frame)), -1, -1):
+        sample = []
+        if rows:
+            sample = ["Sample rows:", frame.head(rows).to_csv(sep="\t", index=False, float_format="%.6g").rstrip("\n")]
+        for keep in range(len(stats), -1, -1):
+            lines = list(header)
+            if keep:
+                lines += ["Column stats:"] + stats[:keep]
+                if keep < len(stats):
+                    lines.append(f"- ... {len(stats) - keep} more columns")
+            text = "\n".join(lines + sample)
+            if estimate_tokens(text) <= token_budget:
+                return text
+            if rows:
+                break  # Try a smaller sample before dropping stats
+    return text[:token_budget * CHARS_PER_TOKEN]
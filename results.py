@@ -0,0 +1,248 @@
+"""Typed, columnar query results built directly from a DB-API cursor."""
+import datetime
+import decimal
+import json
+import threading
+import time
+
+import pandas as pd
+
+# pyodbc reports the Python type of each column in cursor.description
+_DTYPES = {
+    int: "Int64",
+    float: "float64",
+    bool: "boolean",
+    str: "string",
+}
+# float64 round-trips every decimal of up to 15 significant digits
+_FLOAT_DIGITS = 15
+
+
+def _typed_series(values, type_code, precision=None):
+    series = pd.Series(values, dtype="object")
+    try:
+        if type_code in (datetime.datetime, datetime.date):
+            return pd.to_datetime(series)
+        if type_code is decimal.Decimal:
+            # Money and large IDs would lose digits as floats: those stay Decimal objects
+            if precision is not None and precision <= _FLOAT_DIGITS:
+                return series.astype("float64")
+            return series
+        if type_code in _DTYPES:
+            return series.astype(_DTYPES[type_code])
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return series.infer_objects()
+
+
+def frame_from_rows(description, rows):
+    """Build a DataFrame with one typed column per cursor column.
+
+    Columns are assembled positionally so duplicate or empty column names
+    (e.g. two unaliased aggregates) are preserved as SQL Server returns them.
+    """
+    names = [desc[0] for desc in description]
+    type_codes = [desc[1] for desc in description]
+    # DB-API precision; decimal(p, s) columns keep p significant digits
+    precisions = [desc[4] if len(desc) > 4 else None for desc in description]
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    frame = pd.DataFrame({
+        position: _typed_series(list(values), type_code, precision)
+        for position, (values, type_code, precision) in enumerate(zip(columns, type_codes, precisions))
+    })
+    frame.columns = names
+    return frame
+
+
+def frame_from_cursor(cursor):
+    return frame_from_rows(cursor.description, cursor.fetchall())
+
+
+def frame_to_payload(frame):
+    """JSON-ready form of a result frame that keeps column order, duplicates and dtypes."""
+    return {
+        "columns": [str(name) for name in frame.columns],
+        "dtypes": [_payload_dtype(frame.iloc[:, position]) for position in range(frame.shape[1])],
+        # Decimal values are written as strings, so they come back exact
+        "data": json.loads(frame.to_json(orient="values", date_format="iso")),
+    }
+
+
+def _payload_dtype(series):
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "decimal":
+        return "decimal"
+    return str(series.dtype)
+
+
+def frame_from_payload(payload):
+    """Inverse of ``frame_to_payload``."""
+    names = payload["columns"]
+    columns = list(zip(*payload["data"])) if payload["data"] else [()] * len(names)
+    frame = pd.DataFrame({
+        position: _restored_series(list(values), dtype)
+        for position, (values, dtype) in enumerate(zip(columns, payload["dtypes"]))
+    })
+    frame.columns = names
+    return frame
+
+
+def _restored_series(values, dtype):
+    series = pd.Series(values, dtype="object")
+    try:
+        if dtype.startswith("datetime64"):
+            return pd.to_datetime(series)
+        if dtype == "decimal":
+            return series.map(lambda value: None if value is None else decimal.Decimal(value))
+        return series.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        return series.infer_objects()
+
+
+def frame_nbytes(frame):
+    """Estimated in-memory size of a result frame in bytes."""
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class ResultStream:
+    """Pages through an open cursor with ``fetchmany`` instead of ``fetchall``.
+
+    The stream keeps its pooled connection until the result is exhausted, a
+    row/byte cap is hit, or it is closed, so further pages can be fetched on
+    demand without re-running the query. A one-row lookahead tells whether more
+    rows exist after each page.
+    """
+
+    def __init__(self, pool, conn, cursor, batch_size=500, page_rows=1000,
+                 max_rows=100_000, max_bytes=64 * 1024 * 1024):
+        self.pool = pool
+        self.conn = conn
+        self.cursor = cursor
+        self.description = cursor.description
+        self.batch_size = batch_size
+        self.page_rows = page_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.exhausted = False
+        self.truncated = False
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._lookahead = None
+        # Guards against the idle sweep closing the cursor mid-fetch
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, pool, sql, params=(), input_sizes=None, on_cursor=None, **options):
+        """Execute ``sql`` with ``params`` bound on a pooled connection.
+
+        ``input_sizes`` declares the parameter types (``cursor.setinputsizes``);
+        ``on_cursor`` receives the cursor before execution starts so another
+        thread can cancel it.
+        """
+        conn = pool.acquire()
+        try:
+            cursor = conn.cursor()
+            if on_cursor is not None:
+                on_cursor(cursor)
+            if params and input_sizes and hasattr(cursor, "setinputsizes"):
+                cursor.setinputsizes(input_sizes)
+            cursor.execute(sql, *params)
+            return cls(pool, conn, cursor, **options)
+        except Exception:
+            pool.release(conn)
+            raise
+
+    @property
+    def has_more(self):
+        return not (self.exhausted or self.truncated or self.closed)
+
+    def fetch_page(self):
+        """Fetch up to ``page_rows`` more rows as a typed DataFrame."""
+        with self._lock:
+            return self._fetch_page_locked()
+
+    def _fetch_page_locked(self):
+        if not self.has_more:
+            return frame_from_rows(self.description, [])
+        self.last_used = time.monotonic()
+        limit = min(self.page_rows, self.max_rows - self.rows_fetched)
+        frames = []
+        fetched = 0
+        try:
+            if self._lookahead is not None:
+                frames.append(frame_from_rows(self.description, [self._lookahead]))
+                self.bytes_fetched += frame_nbytes(frames[0])
+                self._lookahead = None
+                fetched = 1
+            while fetched < limit and self.bytes_fetched < self.max_bytes:
+                batch = self.cursor.fetchmany(min(self.batch_size, limit - fetched))
+                if not batch:
+                    self.exhausted = True
+                    break
+                frame = frame_from_rows(self.description, batch)
+                frames.append(frame)
+                fetched += len(batch)
+                self.bytes_fetched += frame_nbytes(frame)
+            if not self.exhausted:
+                self._lookahead = self.cursor.fetchone()
+                self.exhausted = self._lookahead is None
+        except Exception:
+            self._close_locked()
+            raise
+        self.rows_fetched += fetched
+        if not self.exhausted and (self.rows_fetched >= self.max_rows or self.bytes_fetched >= self.max_bytes):
+            self.truncated = True
+        if not self.has_more:
+            self._close_locked()
+        if not frames:
+            return frame_from_rows(self.description, [])
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._lookahead = None
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+        self.pool.release(self.conn)
+
+
+class OpenStreams:
+    """Process-wide registry of unfinished streams.
+
+    Every open stream holds a pooled connection, so at most ``per_pool`` stay
+    open per pool: adding another closes the least recently used one. Streams
+    abandoned by their session are released after ``idle_timeout``.
+    """
+
+    def __init__(self, idle_timeout=300, per_pool=2):
+        self.idle_timeout = idle_timeout
+        self.per_pool = per_pool
+        self._streams = set()
+        self._lock = threading.Lock()
+
+    def add(self, stream):
+        with self._lock:
+            self._streams.add(stream)
+            same_pool = [s for s in self._streams if s.pool is stream.pool and not s.closed and s is not stream]
+            same_pool.sort(key=lambda s: s.last_used)
+            evicted = same_pool[:max(0, len(same_pool) + 1 - self.per_pool)]
+            self._streams.difference_update(evicted)
+        for old in evicted:
+            old.close()
+
+    def sweep(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [s for s in self._streams if s.closed or s.last_used < cutoff]
+            self._streams.difference_update(stale)
+        for stream in stale:
+            stream.close()
@@ -0,0 +1,268 @@
+"""Per-database schema catalog loaded with a few set-based queries.
+
+The catalog holds every user table keyed by (schema, table) together with its
+columns, row count, ``MS_Description`` comments, foreign keys and a
+precomputed prompt fragment, so switching tables and asking questions need no
+metadata round trips. Catalogs are shared across sessions and reloaded only
+when the database's change token moves (or on an explicit reload, which also
+refreshes row counts and comments).
+"""
+import dataclasses
+import hashlib
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+
+from table_browser import TableIndex
+
+CATALOG_QUERY = """
+    SELECT s.name AS schema_name, t.name AS table_name, c.name AS column_name, ty.name AS data_type
+    FROM sys.tables t
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    JOIN sys.columns c ON c.object_id = t.object_id
+    JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+    WHERE t.is_ms_shipped = 0
+    ORDER BY s.name, t.name, c.column_id
+"""
+
+# Row counts from partition metadata (heap or clustered index only); no table is scanned
+ROW_COUNT_QUERY = """
+    SELECT s.name AS schema_name, t.name AS table_name, SUM(p.rows) AS row_count
+    FROM sys.tables t
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+    WHERE t.is_ms_shipped = 0
+    GROUP BY s.name, t.name
+"""
+
+# Table (column_name NULL) and column comments
+DESCRIPTION_QUERY = """
+    SELECT s.name AS schema_name, t.name AS table_name, c.name AS column_name,
+           CAST(ep.value AS nvarchar(1000)) AS description
+    FROM sys.extended_properties ep
+    JOIN sys.tables t ON t.object_id = ep.major_id
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    LEFT JOIN sys.columns c ON c.object_id = ep.major_id AND c.column_id = ep.minor_id
+    WHERE ep.class = 1 AND ep.name = 'MS_Description' AND t.is_ms_shipped = 0
+"""
+
+FOREIGN_KEY_QUERY = """
+    SELECT ps.name AS schema_name, pt.name AS table_name, pc.name AS column_name,
+           rs.name AS ref_schema, rt.name AS ref_table, rc.name AS ref_column
+    FROM sys.foreign_key_columns fkc
+    JOIN sys.tables pt ON pt.object_id = fkc.parent_object_id
+    JOIN sys.schemas ps ON ps.schema_id = pt.schema_id
+    JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+    JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+    JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+    JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+"""
+
+# Creating, altering or dropping a table moves one of these values
+CHANGE_TOKEN_QUERY = "SELECT COUNT(*), MAX(modify_date) FROM sys.objects WHERE type = 'U'"
+
+# Longer comments are cut in prompts
+DESCRIPTION_CHARS = 200
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    schema: str
+    name: str
+    columns: tuple  # ((column_name, data_type), ...)
+    prompt_fragment: str
+    fingerprint: str
+    rows: int = None                 # From sys.partitions when the catalog was loaded; None if unknown
+    description: str = None          # Table MS_Description
+    column_descriptions: tuple = ()  # ((column_name, description), ...) for commented columns
+    foreign_keys: tuple = ()         # ((column_name, ref_schema, ref_table, ref_column), ...)
+
+    @property
+    def key(self):
+        return (self.schema, self.name)
+
+    @property
+    def qualified_name(self):
+        return f"[{self.schema}].[{self.name}]"
+
+    @property
+    def prompt_prefix(self):
+        return self.prompt_fragment
+
+    @property
+    def prompt_suffix(self):
+        return ""
+
+    @property
+    def tables(self):
+        # Same shape as SchemaContext.tables: the tables in the prompt, with the columns shown
+        return ((self, None),)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(list(self.columns), columns=["COLUMN_NAME", "DATA_TYPE"])
+
+
+def _comment(text):
+    text = " ".join(str(text).split())
+    return text if len(text) <= DESCRIPTION_CHARS else text[:DESCRIPTION_CHARS - 3] + "..."
+
+
+def column_lines(info):
+    """``{column: prompt line}``: name, type, foreign-key target and comment."""
+    descriptions = dict(info.column_descriptions)
+    references = {column: f"[{schema}].[{table}].[{ref}]" for column, schema, table, ref in info.foreign_keys}
+    lines = {}
+    for column, data_type in info.columns:
+        line = f"{column} ({data_type})"
+        if column in references:
+            line += f" -> {references[column]}"
+        if column in descriptions:
+            line += f" -- {_comment(descriptions[column])}"
+        lines[column] = line
+    return lines
+
+
+def render_table(info, columns=None):
+    """Prompt block for ``info``, limited to the ``columns`` names if given (kept in table order)."""
+    lines = column_lines(info)
+    shown = [lines[column] for column, _ in info.columns if columns is None or column in columns]
+    if len(shown) < len(info.columns):
+        shown.append(f"(+{len(info.columns) - len(shown)} more columns not shown)")
+    header = f"Table: {info.qualified_name}"
+    if info.description:
+        header += f" -- {_comment(info.description)}"
+    return f"{header}\nColumns: " + "\n".join(shown)
+
+
+def _table_info(schema, name, columns, rows=None, description=None, column_descriptions=(), foreign_keys=()):
+    info = TableInfo(
+        schema=schema,
+        name=name,
+        columns=tuple(columns),
+        prompt_fragment="",
+        fingerprint="",
+        rows=rows,
+        description=description,
+        column_descriptions=tuple(column_descriptions),
+        foreign_keys=tuple(foreign_keys),
+    )
+    fragment = render_table(info)
+    return dataclasses.replace(
+        info, prompt_fragment=fragment, fingerprint=hashlib.sha256(fragment.encode("utf-8")).hexdigest()
+    )
+
+
+def _optional_rows(cursor, query):
+    # Row counts, comments and keys enrich the catalog; without them it still works
+    try:
+        return cursor.execute(query).fetchall()
+    except Exception:
+        return []
+
+
+class SchemaCatalog:
+    def __init__(self, database, token, tables):
+        self.database = database
+        self.token = token
+        self.tables = tables  # {(schema, table): TableInfo}
+
+    @classmethod
+    def load(cls, conn, database, token=None):
+        cursor = conn.cursor()
+        if token is None:
+            token = tuple(cursor.execute(CHANGE_TOKEN_QUERY).fetchone())
+        grouped = {}
+        for schema, table, column, data_type in cursor.execute(CATALOG_QUERY).fetchall():
+            grouped.setdefault((schema, table), []).append((column, data_type))
+        row_counts = {(schema, table): int(rows) for schema, table, rows in _optional_rows(cursor, ROW_COUNT_QUERY)}
+        descriptions = {}
+        column_descriptions = {}
+        for schema, table, column, description in _optional_rows(cursor, DESCRIPTION_QUERY):
+            if column is None:
+                descriptions[(schema, table)] = description
+            else:
+                column_descriptions.setdefault((schema, table), []).append((column, description))
+        foreign_keys = {}
+        for schema, table, column, *reference in _optional_rows(cursor, FOREIGN_KEY_QUERY):
+            foreign_keys.setdefault((schema, table), []).append((column, *reference))
+        tables = {
+            key: _table_info(
+                key[0], key[1], columns, row_counts.get(key), descriptions.get(key),
+                column_descriptions.get(key, ()), foreign_keys.get(key, ()),
+            )
+            for key, columns in grouped.items()
+        }
+        return cls(database, token, tables)
+
+    def to_dict(self):
+        return {
+            "database": self.database,
+            "token": [str(value) for value in self.token],
+            "tables": [
+                {
+                    "schema": info.schema,
+                    "name": info.name,
+                    "columns": [list(column) for column in info.columns],
+                    "rows": info.rows,
+                    "description": info.description,
+                    "column_descriptions": [list(pair) for pair in info.column_descriptions],
+                    "foreign_keys": [list(key) for key in info.foreign_keys],
+                }
+                for info in self.tables.values()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        tables = {
+            (table["schema"], table["name"]): _table_info(
+                table["schema"], table["name"], [tuple(c) for c in table["columns"]], table.get("rows"),
+                table.get("description"), [tuple(pair) for pair in table.get("column_descriptions", ())],
+                [tuple(key) for key in table.get("foreign_keys", ())],
+            )
+            for table in data["tables"]
+        }
+        return cls(data["database"], tuple(data["token"]), tables)
+
+    def table(self, schema, name):
+        return self.tables.get((schema, name))
+
+    def table_keys(self):
+        return sorted(self.tables)
+
+    @cached_property
+    def index(self):
+        """Search/sort index for the table browser, built on first use."""
+        return TableIndex(self.tables.values())
+
+    @cached_property
+    def schema_index(self):
+        """BM25 index over table/column names and comments for prompt context, built on first use."""
+        from schema_retrieval import SchemaIndex
+        return SchemaIndex(self.tables.values())
+
+
+class CatalogCache:
+    """Shared catalogs keyed by (login, database), revalidated by change token.
+
+    ``login`` is ``connection_pool.login_label``: what a catalog lists depends
+    on the permissions of the login that loaded it.
+    """
+
+    def __init__(self):
+        self._catalogs = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, login, database, force=False):
+        """Return the catalog, reloading only if the schema changed (one cheap query otherwise)."""
+        key = (login, database)
+        token = tuple(conn.cursor().execute(CHANGE_TOKEN_QUERY).fetchone())
+        with self._lock:
+            cached = self._catalogs.get(key)
+        if cached is not None and cached.token == token and not force:
+            return cached
+        catalog = SchemaCatalog.load(conn, database, token)
+        with self._lock:
+            self._catalogs[key] = catalog
+        return catalog
@@ -0,0 +1,277 @@
+"""Question-specific schema context: the relevant tables and columns within a token budget.
+
+Pasting every column of the selected table makes prompt prefill the main LLM
+cost on wide tables, and leaves out every other table a join would need.
+``SchemaIndex`` is a BM25 index over the catalog's table and column names and
+comments, built once per catalog. ``select`` scores them against the question,
+keeps the selected table plus the best-matching tables and their foreign-key
+neighbours, and renders as many of their columns as fit the budget. The
+selected table's block comes first and doesn't depend on the question, so
+the model server can reuse its evaluated prompt prefix across questions; join
+keys, matching columns and related tables follow.
+"""
+import hashlib
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+
+from result_digest import CHARS_PER_TOKEN, estimate_tokens
+from schema_catalog import column_lines, render_table
+
+# Identifier words: "OrderDate" -> order, date; "CUSTOMER_ID" -> customer, id
+_WORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are", "was", "were", "be", "with",
+    "what", "which", "who", "how", "many", "much", "show", "me", "list", "give", "find", "get", "all", "each",
+    "per", "from", "that", "this", "there", "their", "do", "does", "did", "have", "has", "it", "its", "as", "at",
+    "than", "top", "most", "least",
+}
+# Column hits beyond these per table add nothing to its score (wide tables would always win)
+_COLUMN_HITS_PER_TABLE = 3
+
+
+def terms(text):
+    """Lowercased, lightly stemmed index terms of names, comments or a question."""
+    found = []
+    for word in _WORD.findall(text or ""):
+        word = word.lower()
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        found.append(word)
+    return found
+
+
+@dataclass(frozen=True)
+class SchemaContext:
+    """Stands in for the selected ``TableInfo`` in the pipeline, with a question-specific prompt.
+
+    ``schema``/``name``/``columns`` are still the selected table's, so
+    validation and history entries see the table the user chose.
+    """
+    table: object        # The selected TableInfo
+    tables: tuple        # (TableInfo, shown column names or None for all), selected table first
+    prompt_prefix: str   # The selected table's block, the same for every question on it
+    prompt_suffix: str   # Question-specific: more of its columns, then related tables
+    fingerprint: str
+    tokens: int          # Estimated prompt tokens of the whole fragment
+
+    @property
+    def prompt_fragment(self):
+        return f"{self.prompt_prefix}\n\n{self.prompt_suffix}" if self.prompt_suffix else self.prompt_prefix
+
+    @property
+    def schema(self):
+        return self.table.schema
+
+    @property
+    def name(self):
+        return self.table.name
+
+    @property
+    def columns(self):
+        return self.table.columns
+
+    @property
+    def key(self):
+        return self.table.key
+
+    @property
+    def qualified_name(self):
+        return self.table.qualified_name
+
+    def to_frame(self):
+        return self.table.to_frame()
+
+
+class SchemaIndex:
+    def __init__(self, tables, k1=1.2, b=0.75):
+        self.tables = {info.key: info for info in tables}
+        self.k1 = k1
+        self.b = b
+        self.documents = []   # (table key, column name or None for the table itself)
+        lengths = []
+        self.postings = defaultdict(list)  # term -> [(document, term frequency)]
+        self.neighbours = defaultdict(set)  # table key -> tables linked by a foreign key either way
+        counted = {}  # Column names repeat across tables (ID, CreatedAt, ...): split each once
+        for info in self.tables.values():
+            descriptions = dict(info.column_descriptions)
+            table_text = f"{info.schema} {info.name} {info.description or ''}"
+            entries = [(None, table_text)] + [
+                (column, f"{column} {descriptions.get(column, '')}") for column, _ in info.columns
+            ]
+            for column, text in entries:
+                document = len(self.documents)
+                self.documents.append((info.key, column))
+                counts = counted.get(text)
+                if counts is None:
+                    counts = counted[text] = defaultdict(int)
+                    for word in terms(text):
+                        counts[word] += 1
+                lengths.append(sum(counts.values()))
+                for word, count in counts.items():
+                    self.postings[word].append((document, count))
+            for _, ref_schema, ref_table, _ in info.foreign_keys:
+                if (ref_schema, ref_table) in self.tables and (ref_schema, ref_table) != info.key:
+                    self.neighbours[info.key].add((ref_schema, ref_table))
+                    self.neighbours[(ref_schema, ref_table)].add(info.key)
+        self._lengths = lengths
+        self._average_length = sum(lengths) / len(lengths) if lengths else 1.0
+
+    def scores(self, question):
+        """BM25 score of every matching document, and the question terms each table matched."""
+        total = len(self.documents)
+        scores = defaultdict(float)
+        matched = defaultdict(set)
+        for word in set(terms(question)):
+            postings = self.postings.get(word)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for document, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[document] / self._average_length)
+                scores[document] += idf * count * (self.k1 + 1) / (count + norm)
+                matched[self.documents[document][0]].add(word)
+        return scores, matched
+
+    def select(self, question, table, token_budget=800, max_tables=4, min_score_ratio=0.5, prefix_share=0.6):
+        """The ``SchemaContext`` for ``question`` asked while ``table`` (a ``TableInfo``) is selected.
+
+        Another table joins when it scores at least ``min_score_ratio`` of the
+        best one and matches a question word the tables chosen so far don't,
+        or when it links to a chosen table by a foreign key and matches at all.
+        The selected table is shown whole when it fits the budget; otherwise
+        its leading columns fill ``prefix_share`` of it and the columns the
+        question needs are added after.
+        """
+        scores, matched = self.scores(question)
+        table_scores = defaultdict(float)
+        column_scores = defaultdict(dict)
+        for document, score in scores.items():
+            key, column = self.documents[document]
+            if column is None:
+                table_scores[key] += score
+            else:
+                column_scores[key][column] = score
+        for key, columns in column_scores.items():
+            table_scores[key] += sum(sorted(columns.values(), reverse=True)[:_COLUMN_HITS_PER_TABLE])
+
+        chosen = [table.key]
+        covered = set(matched.get(table.key, ()))
+        best = max(table_scores.values(), default=0.0)
+        for key in sorted(table_scores, key=table_scores.get, reverse=True):
+            if len(chosen) >= max_tables or table_scores[key] < best * min_score_ratio:
+                break
+            if key not in chosen and key in self.tables and matched[key] - covered:
+                chosen.append(key)
+                covered |= matched[key]
+        neighbours = {key for chosen_key in chosen for key in self.neighbours.get(chosen_key, ()) if key not in chosen}
+        for key in sorted(neighbours, key=lambda key: table_scores.get(key, 0.0), reverse=True):
+            if len(chosen) >= max_tables or not table_scores.get(key):
+                break
+            chosen.append(key)
+        # The selected table may not be in the catalog index (e.g. a stale selection)
+        infos = [table] + [self.tables[key] for key in chosen[1:]]
+        return self._render(infos, column_scores, token_budget, prefix_share)
+
+    @staticmethod
+    def _base_columns(info, budget, share):
+        """The selected table's question-independent columns: None (all) when the
+        whole table fits ``budget`` characters, else the leading columns that fit ``share`` of it."""
+        if len(info.prompt_fragment) <= budget:
+            return None
+        lines = column_lines(info)
+        used = len(render_table(info, ()))
+        shown = []
+        for column, _ in info.columns:
+            cost = len(lines[column]) + 1
+            if used + cost > budget * share and shown:
+                break
+            shown.append(column)
+            used += cost
+        return tuple(shown)
+
+    def _render(self, infos, column_scores, token_budget, prefix_share):
+        budget = token_budget * CHARS_PER_TOKEN
+        selected = infos[0]
+        # The same for every question on this table, so the model server can reuse its prompt cache
+        base = self._base_columns(selected, budget, prefix_share)
+        prefix = render_table(selected, base)
+
+        chosen = {info.key for info in infos}
+        # Join keys between chosen tables are always shown, on both sides
+        keys = defaultdict(set)
+        for info in infos:
+            for column, ref_schema, ref_table, ref_column in info.foreign_keys:
+                if (ref_schema, ref_table) in chosen:
+                    keys[info.key].add(column)
+                    keys[(ref_schema, ref_table)].add(ref_column)
+
+        lines = {}
+        ranked = {}
+        shown = {}
+        for info in infos:
+            scores = column_scores.get(info.key, {})
+            order = {column: i for i, (column, _) in enumerate(info.columns)}
+            lines[info.key] = column_lines(info)
+            ranked[info.key] = sorted(
+                order, key=lambda column: (column not in keys[info.key], -scores.get(column, 0.0), order[column])
+            )
+            # Tables start from their join keys and best matching columns (or their first column)
+            matching = [column for column in ranked[info.key] if column in scores][:_COLUMN_HITS_PER_TABLE]
+            shown[info.key] = keys[info.key] | set(matching) or set(ranked[info.key][:1])
+        # For the selected table, only what its stable block leaves out
+        shown[selected.key] = set() if base is None else shown[selected.key] - set(base)
+        fill = [info for info in infos if info is not selected or base is not None]
+
+        # The selected table's header is in the prefix; its suffix block only has a "More columns" line
+        more_header = len(f"More columns of {selected.qualified_name}:") + 2
+
+        def size(info):
+            # Characters rather than re-rendering per column: header and "more columns" line, then one line each
+            columns = sum(len(lines[info.key][c]) + 1 for c in shown[info.key])
+            if info is selected:
+                return more_header + columns if shown[info.key] else 0
+            return len(render_table(info, ())) + 2 + columns
+
+        # Drop the least relevant extra tables if even their starting columns are over budget
+        while len(infos) > 1 and len(prefix) + sum(size(info) for info in infos) > budget:
+            infos.pop()
+        used = len(prefix) + sum(size(info) for info in infos)
+        for info in fill:
+            if info.key not in {kept.key for kept in infos}:
+                continue
+            for column in ranked[info.key]:
+                if column in shown[info.key] or (info is selected and column in base):
+                    continue
+                cost = len(lines[info.key][column]) + 1
+                if info is selected and not shown[info.key]:
+                    cost += more_header
+                if used + cost > budget:
+                    break
+                shown[info.key].add(column)
+                used += cost
+
+        blocks = []
+        extra = [lines[selected.key][column] for column, _ in selected.columns if column in shown[selected.key]]
+        if extra:
+            blocks.append(f"More columns of {selected.qualified_name}:\n" + "\n".join(extra))
+        tables = [(selected, None if base is None else tuple(sorted(set(base) | shown[selected.key])))]
+        for info in infos[1:]:
+            columns = None if len(shown[info.key]) == len(info.columns) else tuple(sorted(shown[info.key]))
+            tables.append((info, columns))
+            blocks.append(render_table(info, columns))
+        suffix = "\n\n".join(blocks)
+        text = f"{prefix}\n\n{suffix}" if suffix else prefix
+        return SchemaContext(
+            table=selected,
+            tables=tuple(tables),
+            prompt_prefix=prefix,
+            prompt_suffix=suffix,
+            fingerprint=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            tokens=estimate_tokens(text),
+        )
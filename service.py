@@ -0,0 +1,361 @@
+"""Long-running query service: HTTP/JSON on localhost for many concurrent users.
+
+    python service.py --port 8765
+
+One process serves every analyst. It holds a single ``Engine``, so connection
+pools, schema catalogs and the generation/result caches are shared, and it
+coalesces identical in-flight requests so each is computed once. Requests are
+coroutines on one event loop; the blocking driver calls (pyodbc, the Ollama
+HTTP client) run on two bounded executors sized to what SQL Server and Ollama
+can actually take, so open connections and busy threads track backend
+capacity rather than the number of connected users.
+
+Endpoints (POST, JSON bodies; see ``QueryService`` for the fields):
+``/databases``, ``/catalog``, ``/ask``, ``/execute``, ``/summarize``; plus
+``GET /health``, ``GET /metrics`` (Prometheus text) and ``GET /diagnostics``
+(what the app's Diagnostics panel shows).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+
+from config import SERVICE_CONFIG
+from connection_pool import login_label
+from engine import Engine
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """A bad request; reported to the caller as HTTP 400."""
+
+
+class Coalescer:
+    """Shares one in-flight computation between identical concurrent requests."""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, factory):
+        """Return ``(result, shared)``; ``shared`` is True if another caller computed it."""
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+
+def _identity(server_info):
+    """Pool identity of a login; the password digest keeps other users' results private."""
+    try:
+        return login_label(server_info)
+    except (KeyError, TypeError, AttributeError):
+        raise RequestError("server_info needs server, port, username and password")
+
+
+def _require(body, *fields):
+    missing = [field for field in fields if body.get(field) in (None, "")]
+    if missing:
+        raise RequestError(f"missing field(s): {', '.join(missing)}")
+
+
+class QueryService:
+    def __init__(self, engine, llm_workers=4, db_workers=8, catalog_ttl=60):
+        self.engine = engine
+        self.coalescer = Coalescer()
+        self.catalog_ttl = catalog_ttl
+        # (identity, database) -> (catalog, checked_at); only touched on the event loop
+        self._catalogs = {}
+        self._llm_executor = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="service-llm")
+        self._db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="service-db")
+
+    async def _llm(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._llm_executor, fn, *args)
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, fn, *args)
+
+    async def _coalesced(self, key, factory):
+        result, shared = await self.coalescer.run(key, factory)
+        if shared:
+            self.engine.metrics.increment("coalesced_requests")
+        return dict(result, shared=shared)
+
+    async def databases(self, body):
+        """``{server_info}`` -> ``{databases: [...]}``"""
+        _require(body, "server_info")
+        key = ("databases", _identity(body["server_info"]))
+        return await self._coalesced(key, lambda: self._databases(body["server_info"]))
+
+    async def _databases(self, server_info):
+        return {"databases": await self._db(self.engine.list_databases, server_info)}
+
+    async def catalog(self, body):
+        """``{server_info, database, force?}`` -> ``SchemaCatalog.to_dict()``"""
+        _require(body, "server_info", "database")
+        key = ("catalog", _identity(body["server_info"]), body["database"], bool(body.get("force")))
+        return await self._coalesced(key, lambda: self._catalog(body))
+
+    async def _catalog(self, body):
+        catalog = await self._load_catalog(body["server_info"], body["database"], bool(body.get("force")))
+        return catalog.to_dict()
+
+    async def _load_catalog(self, server_info, database, force=False):
+        """The login's catalog of ``database``; its change token is rechecked at most every ``catalog_ttl`` seconds,
+        so questions don't each borrow a connection for it."""
+        key = (_identity(server_info), database)
+        cached = self._catalogs.get(key)
+        if cached is not None and not force and time.monotonic() - cached[1] < self.catalog_ttl:
+            return cached[0]
+        catalog = await self._db(self.engine.load_catalog, server_info, database, force)
+        self._catalogs[key] = (catalog, time.monotonic())
+        return catalog
+
+    async def ask(self, body):
+        """``{server_info, database, schema?, table, question, cache_mode?, summarize?}``
+        -> a history entry (``result`` in ``frame_to_payload`` form)."""
+        _require(body, "server_info", "database", "table", "question")
+        from generation_cache import normalize_question
+        key = (
+            "ask", _identity(body["server_info"]), body["database"], body.get("schema", "dbo"), body["table"],
+            normalize_question(body["question"]), body.get("cache_mode", "Use cache"), bool(body.get("summarize", True)),
+        )
+        return await self._coalesced(key, lambda: self._ask(body))
+
+    async def _ask(self, body):
+        from results import frame_to_payload
+        server_info, database, question = body["server_info"], body["database"], body["question"]
+        catalog = await self._load_catalog(server_info, database)
+        table_info = catalog.table(body.get("schema", "dbo"), body["table"])
+        if table_info is None:
+            raise RequestError(f"unknown table {body.get('schema', 'dbo')}.{body['table']} in {database}")
+
+        steps = self.engine.pipeline.steps(
+            server_info, database, table_info, question, body.get("cache_mode", "Use cache"), catalog,
+            summarize=bool(body.get("summarize", True)),
+        )
+        entry, execution = await self._drive(steps)
+        if execution is not None:
+            entry["has_more"], entry["truncated"] = self._more_rows(execution)
+        if entry["result"] is not None:
+            entry["result"] = frame_to_payload(entry["result"])
+        return self._entry(entry)
+
+    async def _drive(self, steps):
+        """``pipeline.drive`` on the executors: model steps on the LLM one, the rest off the event loop on the DB one.
+
+        Returns the history entry and the query's ``Execution`` (None if it didn't run).
+        """
+        reply = error = execution = None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration as done:
+                return done.value, execution
+            reply = error = None
+            try:
+                if step.stage == "execute":
+                    reply = execution = await self._db(self._execute, *step.args)
+                elif step.resource == "llm":
+                    reply = await self._llm(step.run)
+                else:
+                    # Local steps too: the first question on a catalog builds its index
+                    reply = await self._db(step.run)
+            except Exception as e:
+                error = e
+
+    def _execute(self, server_info, database, sql, timer, cache_mode):
+        """First page only: the service never keeps a connection parked on a half-read result.
+
+        The execution's stream comes back closed; it still tells whether rows were left (see ``_more_rows``).
+        """
+        execution = self.engine.executor.execute(server_info, database, sql, timer, cache_mode)
+        if execution.stream is not None:
+            execution.stream.close()
+        return execution
+
+    @staticmethod
+    def _more_rows(execution):
+        """``(has_more, truncated)`` of an execution whose stream ``_execute`` closed."""
+        stream = execution.stream
+        if stream is None:
+            return False, False
+        return not (stream.exhausted or stream.truncated), stream.truncated
+
+    @staticmethod
+    def _entry(entry):
+        entry.pop("stream", None)
+        entry["timestamp"] = entry["timestamp"].isoformat()
+        return entry
+
+    async def execute(self, body):
+        """``{server_info, database, sql, cache_mode?}`` ->
+        ``{result, sql, guardrail, has_more, truncated, result_cached, timings}``"""
+        _require(body, "server_info", "database", "sql")
+        from result_cache import normalize_sql
+        cache_mode = body.get("cache_mode", "Use cache")
+        key = ("execute", _identity(body["server_info"]), body["database"], normalize_sql(body["sql"]), cache_mode)
+        return await self._coalesced(key, lambda: self._execute_request(body, cache_mode))
+
+    async def _execute_request(self, body, cache_mode):
+        from metrics import StageTimer
+        from results import frame_to_payload
+        timer = StageTimer()
+        execution = await self._db(self._execute, body["server_info"], body["database"], body["sql"], timer, cache_mode)
+        has_more, truncated = self._more_rows(execution)
+        return {
+            "result": frame_to_payload(execution.frame),
+            "sql": execution.sql,
+            "guardrail": execution.guardrail,
+            "has_more": has_more,
+            "truncated": truncated,
+            "result_cached": execution.cached,
+            "timings": timer.timings,
+        }
+
+    async def summarize(self, body):
+        """``{question, database, table, result, complete?}`` -> ``{summary, timings, ollama}``"""
+        _require(body, "question", "result")
+        # Rebuilding the frame and its digest is pandas work: keep it off the event loop
+        payload = await self._db(self._summary_payload, body)
+        key = ("summarize", hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest())
+        return await self._coalesced(key, lambda: self._summarize(payload))
+
+    def _summary_payload(self, body):
+        from results import frame_from_payload
+        result_df = frame_from_payload(body["result"])
+        return self.engine.pipeline.summary_payload(
+            body["question"], body.get("database", ""), body.get("table", ""), result_df, bool(body.get("complete", True)),
+        )
+
+    async def _summarize(self, payload):
+        from metrics import StageTimer
+        entry = {"summary": "", "ollama": {}}
+        timer = StageTimer()
+        await self._llm(self.engine.pipeline.summarize_into, entry, payload, timer)
+        return {"summary": entry["summary"], "timings": timer.timings, "ollama": entry["ollama"]}
+
+    def close(self):
+        self._llm_executor.shutdown(wait=False, cancel_futures=True)
+        self._db_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ServiceServer:
+    """Minimal HTTP/1.1 JSON server (keep-alive, Content-Length bodies) on asyncio streams."""
+
+    def __init__(self, service):
+        self.service = service
+        self.routes = {
+            ("POST", "/databases"): service.databases,
+            ("POST", "/catalog"): service.catalog,
+            ("POST", "/ask"): service.ask,
+            ("POST", "/execute"): service.execute,
+            ("POST", "/summarize"): service.summarize,
+        }
+
+    async def dispatch(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok", "time": datetime.now().isoformat()}, "application/json"
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, self.service.engine.metrics.to_prometheus(), "text/plain; version=0.0.4"
+        if method == "GET" and path == "/diagnostics":
+            return HTTPStatus.OK, self.service.engine.diagnostics(), "application/json"
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"no route for {method} {path}"}, "application/json"
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise RequestError("request body must be a JSON object")
+            return HTTPStatus.OK, await handler(request), "application/json"
+        except (RequestError, json.JSONDecodeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}, "application/json"
+        except Exception as e:
+            self.service.engine.metrics.increment("service_errors")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}, "application/json"
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload, content_type = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, "application/json"
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload, content_type = await self.dispatch(method, path.split("?")[0], body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload, default=str).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent something that isn't HTTP
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the shared NL->SQL query service.")
+    parser.add_argument("--host", default=SERVICE_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG["port"])
+    parser.add_argument("--llm-workers", type=int, default=SERVICE_CONFIG["llm_workers"])
+    parser.add_argument("--db-workers", type=int, default=SERVICE_CONFIG["db_workers"])
+    args = parser.parse_args(argv)
+
+    engine = Engine()
+    engine.background.submit(engine.warm_up)
+    service = QueryService(
+        engine, llm_workers=args.llm_workers, db_workers=args.db_workers, catalog_ttl=SERVICE_CONFIG["catalog_ttl"],
+    )
+    print(f"Query service listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(ServiceServer(service).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
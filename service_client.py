@@ -0,0 +1,121 @@
+"""Blocking client for the query service, used by the app when ``SERVICE_CONFIG["url"]`` is set.
+
+It stands in for the app's ``Engine``: the service answers questions and
+reports diagnostics, and summaries are fetched on the client's own
+background threads.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from config import HISTORY_CONFIG, SUMMARY_CONFIG
+from results import frame_from_payload, frame_nbytes, frame_to_payload
+from schema_catalog import SchemaCatalog
+
+
+class ServiceError(Exception):
+    """The service rejected the request or failed to handle it."""
+
+
+class ServiceClient:
+    def __init__(self, url, connect_timeout=3.05, read_timeout=300, summary_config=SUMMARY_CONFIG,
+                 history_config=HISTORY_CONFIG):
+        self.url = url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.summary_config = summary_config
+        self.history_config = history_config
+        self._background = None
+        self._history_store = None
+        self._lock = threading.Lock()
+
+    def _post(self, path, body):
+        response = self.session.post(f"{self.url}{path}", json=body, timeout=self.timeout)
+        try:
+            data = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise
+        if response.status_code != 200:
+            raise ServiceError(data.get("error", f"HTTP {response.status_code}"))
+        return data
+
+    def _get(self, path):
+        response = self.session.get(f"{self.url}{path}", timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def diagnostics(self):
+        """The service's stage latencies, counters, per-profile model stats and result cache stats."""
+        return self._get("/diagnostics").json()
+
+    @property
+    def background(self):
+        """Worker threads for fetching summaries."""
+        with self._lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(
+                    max_workers=self.summary_config["max_workers"], thread_name_prefix="background"
+                )
+            return self._background
+
+    def session_history(self, server_info):
+        """A page session's ``SessionHistory``; history stays with the app, not the service."""
+        from connection_pool import login_label
+        from history_store import HistoryStore, SessionHistory
+        with self._lock:
+            if self._history_store is None:
+                self._history_store = HistoryStore(self.history_config["path"], self.history_config["max_entries"])
+        return SessionHistory(
+            self._history_store,
+            login_label(server_info),
+            self.history_config["recent"],
+            self.history_config["memory_budget"],
+        )
+
+    def list_databases(self, server_info):
+        return self._post("/databases", {"server_info": server_info})["databases"]
+
+    def load_catalog(self, server_info, database, force=False):
+        return SchemaCatalog.from_dict(
+            self._post("/catalog", {"server_info": server_info, "database": database, "force": force})
+        )
+
+    def ask(self, server_info, database, table_info, question, cache_mode="Use cache", summarize=True):
+        """Run a question on the service and return a Q&A history entry."""
+        entry = self._post("/ask", {
+            "server_info": server_info,
+            "database": database,
+            "schema": table_info.schema,
+            "table": table_info.name,
+            "question": question,
+            "cache_mode": cache_mode,
+            "summarize": summarize,
+        })
+        if entry.get("result") is not None:
+            entry["result"] = frame_from_payload(entry["result"])
+            entry["result_bytes"] = frame_nbytes(entry["result"])
+        entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        entry["stream"] = None
+        return entry
+
+    def summarize_into(self, qa, complete=True):
+        """Fetch the summary for history entry ``qa`` (safe on a worker thread)."""
+        try:
+            response = self._post("/summarize", {
+                "question": qa["question"],
+                "database": qa["database"],
+                "table": qa["table"],
+                "result": frame_to_payload(qa["result"]),
+                "complete": complete,
+            })
+            qa["summary"] = response["summary"]
+            # The service's end-to-end time covers only this call; keep the summary stages
+            qa["timings"].update({k: v for k, v in response["timings"].items() if k.startswith("summary_")})
+            qa["ollama"]["summary"] = response["ollama"].get("summary", {})
+        except Exception as e:
+            qa["summary"] = f"Summary unavailable: {e}"
+        finally:
+            qa["summary_pending"] = False
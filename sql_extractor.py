@@ -0,0 +1,177 @@
+"""Finding the generated SQL statement in raw model output, and tokenizing T-SQL."""
+import re
+
+# Lines that mean the model has moved on from SQL to prose
+_PROSE_LINE = re.compile(
+    r"^\s*(```|note\b|explanation\b|this (query|sql|will)\b|here\b|the (above|query)\b|it (will|returns)\b)",
+    re.IGNORECASE,
+)
+# A statement starts at SELECT or WITH opening a line, possibly after a code fence
+# or a label such as "SQL query:" (prose says "select" and "with" too)
+_STATEMENT_START = re.compile(
+    r"^[ \t]*(?:```\w*[ \t]*)?(?:(?:SQL query|SQL|Query)[ \t]*:|The SQL query is:?)?[ \t]*(SELECT|WITH)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Everything in SQL text that can change the scanner's state
+_SPECIAL = re.compile(r"['\[\"`;\n]|--|/\*")
+_CLOSERS = {"'": "'", "[": "]", '"': '"', "`": "`"}
+_FENCE_LINE = re.compile(r"^[ \t]*```\w*[ \t]*$", re.MULTILINE)
+
+
+class SqlExtractor:
+    """Pulls the first complete SQL statement out of model output in one pass.
+
+    Text can be fed whole or chunk by chunk as it streams; scanning resumes
+    where it stopped, so each character is looked at about once. A statement
+    starts at a ``SELECT`` or ``WITH`` opening a line (or following a label
+    like ``SQL query:``) and ends at a ``;``
+    outside string literals, quoted identifiers and comments, at a closing
+    code fence, or at the first complete line after it that reads as prose.
+    Line breaks, comments and literals inside the statement are kept as
+    written; backtick-quoted identifiers become ``[bracketed]`` ones.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.start = None
+        self.end = None
+        self._pos = 0
+        self._backticks = []  # (open, close) offsets of `identifiers`
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def feed(self, chunk):
+        """Add streamed text; returns True once a complete statement has been seen."""
+        if self.end is None:
+            self.text += chunk
+            self._scan(final=False)
+        return self.end is not None
+
+    def update(self, text_so_far):
+        """``feed`` for callbacks that pass the whole text received so far."""
+        return self.feed(text_so_far[len(self.text):])
+
+    def finish(self):
+        """The statement, treating the text fed so far as the whole response."""
+        if self.end is None:
+            self._scan(final=True)
+        if self.start is None:
+            return _FENCE_LINE.sub("", self.text).strip()
+        parts = []
+        position = self.start
+        for opening, closing in self._backticks:
+            if closing >= self.end:
+                break
+            parts += [self.text[position:opening], "[", self.text[opening + 1:closing], "]"]
+            position = closing + 1
+        parts.append(self.text[position:self.end])
+        return "".join(parts).strip()
+
+    def _scan(self, final):
+        text = self.text
+        length = len(text)
+        if self.start is None:
+            match = _STATEMENT_START.search(text, self._pos)
+            if match is None or (match.end() == length and not final):
+                # Rescan the last line: the keyword may straddle the next chunk
+                self._pos = match.start() if match is not None else max(self._pos, text.rfind("\n") + 1)
+                return
+            self.start = self._pos = match.start(match.lastindex)
+
+        i = self._pos
+        while i < length:
+            match = _SPECIAL.search(text, i)
+            if match is None:
+                # A trailing "-" or "/" may open a comment in the next chunk
+                i = length - 1 if text.endswith(("-", "/")) and not final else length
+                break
+            i = match.start()
+            token = match.group()
+            if token == ";":
+                self.end = i + 1
+                return
+            if token == "\n":
+                line_end = text.find("\n", i + 1)
+                line = text[i + 1:] if line_end == -1 else text[i + 1:line_end]
+                prose = _PROSE_LINE.match(line)
+                # A partial line counts once the match can't grow ("Note" vs "Notes")
+                if prose and (line_end != -1 or final or prose.end() < len(line) or line.lstrip().startswith("```")):
+                    self.end = i
+                    return
+                if line_end == -1 and not final:
+                    break  # Wait for more of the line
+                i += 1
+            elif token == "--":
+                newline = text.find("\n", i)
+                if newline == -1:
+                    i = length if final else i
+                    break
+                i = newline
+            elif token == "/*":
+                close = text.find("*/", i + 2)
+                if close == -1:
+                    i = length if final else i
+                    break
+                i = close + 2
+            elif token == "`" and text.startswith("``", i + 1):
+                self.end = i  # Closing code fence
+                return
+            elif token == "`" and length - i < 3 and not final:
+                break  # Could be the start of a fence
+            else:
+                close = self._closing_quote(text, i, _CLOSERS[token], final)
+                if close is None:
+                    i = length if final else i
+                    break
+                if token == "`":
+                    self._backticks.append((i, close))
+                i = close + 1
+        self._pos = i
+        if final:
+            self.end = length
+
+    @staticmethod
+    def _closing_quote(text, opening, closer, final):
+        """Offset of the quote closing the literal/identifier at ``opening`` (doubled quotes escape)."""
+        search = opening + 1
+        while True:
+            close = text.find(closer, search)
+            if close == -1:
+                return None
+            if close + 1 == len(text) and not final and closer != "`":
+                return None  # The next chunk may double it
+            if closer != "`" and text[close + 1:close + 2] == closer:
+                search = close + 2
+                continue
+            return close
+
+
+def extract_sql(text):
+    """The first complete SQL statement in a whole model response."""
+    extractor = SqlExtractor()
+    extractor.feed(text)
+    return extractor.finish()
+
+
+# One token each: string literal, quoted identifier, comment, parenthesis, word, number, other character
+_TOKEN = re.compile(
+    r"'(?:[^']|'')*'|\[[^\]]*\]|\"[^\"]*\"|--[^\n]*|/\*.*?\*/|[()]|[A-Za-z_@#][\w$#@]*|\d+(?:\.\d+)?|\S",
+    re.DOTALL,
+)
+
+
+def tokenize(sql):
+    """Yield ``(match, upper_text)`` for each T-SQL token, skipping comments."""
+    for match in _TOKEN.finditer(sql):
+        text = match.group()
+        if not text.startswith(("--", "/*")):
+            yield match, text.upper()
+
+
+def unquote_identifier(token):
+    """``[Name]`` or ``"Name"`` -> ``Name``; other tokens unchanged."""
+    if len(token) >= 2 and (token[0], token[-1]) in (("[", "]"), ('"', '"')):
+        return token[1:-1]
+    return token
@@ -0,0 +1,152 @@
+"""Lift filter literals out of generated SQL into ``?`` parameters.
+
+SQL Server caches one plan per distinct statement text, so "orders for
+customer 42" and "orders for customer 43" each compile when the value is
+inlined. Sent as ``... WHERE CustomerID = ?`` with the value bound (the ODBC
+driver runs it through ``sp_executesql``), both reuse the same plan. Only
+literals in ``WHERE``/``ON``/``HAVING`` filters are lifted: comparison
+operands, ``IN`` lists, ``LIKE`` patterns and ``BETWEEN`` bounds. ``TOP``,
+``ORDER BY`` ordinals, function arguments and anything in the select list or
+``GROUP BY`` stay inline, where a parameter changes what the query means.
+"""
+import decimal
+from dataclasses import dataclass
+
+from result_cache import normalize_sql
+from sql_extractor import tokenize
+
+# ODBC SQL type codes (pyodbc.SQL_*)
+SQL_VARCHAR = 12
+SQL_WVARCHAR = -9
+SQL_INTEGER = 4
+SQL_BIGINT = -5
+SQL_DECIMAL = 3
+
+# The tokenizer yields one character at a time, so <=, >=, <> and != end in one of these
+_LITERAL_AFTER = {"=", "<", ">", "LIKE", "BETWEEN", "BETWEEN AND"}
+_FILTER_CLAUSES = {"WHERE", "ON", "HAVING"}
+_CLAUSES = _FILTER_CLAUSES | {
+    "SELECT", "FROM", "JOIN", "APPLY", "GROUP", "ORDER", "UNION", "EXCEPT", "INTERSECT", "OPTION",
+}
+# After a literal these make it part of a larger expression, which stays inline
+_ARITHMETIC = {"+", "-", "*", "/", "%", "&", "|", "^", "."}
+
+
+@dataclass(frozen=True)
+class ParameterizedSql:
+    sql: str        # Statement text with ? placeholders
+    params: tuple   # Values in placeholder order
+    types: tuple    # ODBC type of each value
+
+    @property
+    def cache_key(self):
+        """Result cache key: queries that differ only in spacing share it."""
+        return (normalize_sql(self.sql), self.params)
+
+    def input_sizes(self):
+        """Argument for ``cursor.setinputsizes``.
+
+        Left to itself pyodbc declares strings as ``nvarchar(len)``, so every
+        value length gets its own plan and varchar columns are converted
+        before comparing; fixed declarations avoid both.
+        """
+        sizes = []
+        for value, sql_type in zip(self.params, self.types):
+            if sql_type == SQL_VARCHAR:
+                sizes.append((SQL_VARCHAR, 8000, 0))
+            elif sql_type == SQL_WVARCHAR:
+                sizes.append((SQL_WVARCHAR, 4000, 0))
+            elif sql_type == SQL_DECIMAL:
+                sizes.append((SQL_DECIMAL, 38, max(10, -value.as_tuple().exponent)))
+            else:
+                sizes.append((sql_type, 0, 0))
+        return sizes
+
+
+def _read_literal(tokens, i):
+    """``(last_index, value, odbc_type)`` for a literal starting at token ``i``, or None."""
+    match, word = tokens[i]
+    sign, national = 1, False
+    if word in ("-", "N") and i + 1 < len(tokens):
+        following = tokens[i + 1][0]
+        if word == "-" and following.group()[0].isdigit():
+            sign, i = -1, i + 1
+        elif word == "N" and following.group().startswith("'") and following.start() == match.end():
+            national, i = True, i + 1
+    match = tokens[i][0]
+    text = match.group()
+
+    following = tokens[i + 1][0] if i + 1 < len(tokens) else None
+    if following is not None and (
+        following.group() in _ARITHMETIC
+        or (following.start() == match.end() and following.group()[0].isalnum())  # 1e5, 0x1F
+    ):
+        return None
+    if text.startswith("'"):
+        value = text[1:-1].replace("''", "'")
+        if len(value) > (4000 if national else 8000):
+            return None  # Longer than the declared parameter size
+        return i, value, SQL_WVARCHAR if national else SQL_VARCHAR
+    if not text[0].isdigit():
+        return None
+    if "." in text:
+        return i, sign * decimal.Decimal(text), SQL_DECIMAL
+    value = sign * int(text)
+    return i, value, SQL_INTEGER if -2**31 <= value < 2**31 else SQL_BIGINT
+
+
+def parameterize(sql):
+    """Return ``sql`` as a ``ParameterizedSql``, or None when nothing can be lifted.
+
+    Statements that already contain ``?`` or ``@variables`` are left alone.
+    """
+    tokens = list(tokenize(sql))
+    if any(word == "?" or word.startswith("@") for _, word in tokens):
+        return None
+
+    clauses = [None]    # Clause being read, per parenthesis depth
+    in_list = [False]   # Whether the parentheses at this depth hold an IN (...) list
+    between = False     # Inside BETWEEN, before its AND
+    lifted = []         # (start, end, value, type)
+    previous = ""
+    i = 0
+    while i < len(tokens):
+        match, word = tokens[i]
+        if word == "(":
+            clauses.append(clauses[-1])
+            in_list.append(previous == "IN")
+        elif word == ")":
+            if len(clauses) > 1:
+                clauses.pop()
+                in_list.pop()
+        elif word in _CLAUSES:
+            clauses[-1], in_list[-1] = word, False
+        elif clauses[-1] in _FILTER_CLAUSES and (
+            previous in _LITERAL_AFTER or (in_list[-1] and previous in ("(", ","))
+        ):
+            literal = _read_literal(tokens, i)
+            if literal is not None:
+                last, value, sql_type = literal
+                lifted.append((match.start(), tokens[last][0].end(), value, sql_type))
+                previous, i = tokens[last][1], last + 1
+                continue
+        if word == "BETWEEN":
+            between = True
+        elif word == "AND" and between:
+            between, word = False, "BETWEEN AND"
+        previous = word
+        i += 1
+
+    if not lifted:
+        return None
+    parts = []
+    position = 0
+    for start, end, _, _ in lifted:
+        parts += [sql[position:start], "?"]
+        position = end
+    parts.append(sql[position:])
+    return ParameterizedSql(
+        sql="".join(parts),
+        params=tuple(value for _, _, value, _ in lifted),
+        types=tuple(sql_type for _, _, _, sql_type in lifted),
+    )
@@ -0,0 +1,183 @@
+"""Fail-fast checks on generated SQL before it is executed.
+
+``check_identifiers`` catches wrong schemas and unknown columns against the
+catalog entry the prompt was built from, with no round trip. ``describe_error``
+has SQL Server compile the statement through ``sp_describe_first_result_set``,
+which resolves every name without running anything. Either error is worded
+like SQL Server's own so it can be handed back to the model for a repair.
+"""
+import re
+
+from sql_extractor import tokenize, unquote_identifier
+
+DESCRIBE_QUERY = "EXEC sp_describe_first_result_set @tsql = ?"
+
+# Words that can follow a table reference instead of an alias
+_CLAUSE_WORDS = {
+    "ON", "WHERE", "GROUP", "ORDER", "HAVING", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "OUTER",
+    "APPLY", "UNION", "EXCEPT", "INTERSECT", "WITH", "OPTION", "FOR", "PIVOT", "UNPIVOT", "TABLESAMPLE",
+}
+# Words after which a name reads a column rather than naming an alias
+_NOT_BEFORE_ALIAS = {
+    "SELECT", "DISTINCT", "ALL", "BY", "ON", "AND", "OR", "WHERE", "HAVING", "WHEN", "THEN", "ELSE", "NOT",
+    "IN", "IS", "LIKE", "BETWEEN", "CASE", "SET", "TIES", "PERCENT", "ASC", "DESC", "EXISTS", "ANY", "SOME",
+}
+# Functions whose first argument is a date part (DATEADD([day], ...)), not a column
+_DATE_PART_FUNCTIONS = {"DATEADD", "DATEDIFF", "DATEDIFF_BIG", "DATEPART", "DATENAME", "DATETRUNC"}
+_IDENTIFIER = re.compile(r"^(\[[^\]]*\]|\"[^\"]*\"|[A-Za-z_][\w$#@]*)$")
+# Server errors that say nothing about the statement itself: permissions, or
+# what sp_describe_first_result_set can't analyse (temp tables, dynamic SQL)
+_INCONCLUSIVE_ERRORS = {229, 230, 262, 297, 300} | set(range(11502, 11600))
+_ERROR_NUMBER = re.compile(r"\((\d+)\)(?:\s*\(SQL\w+\))?\s*$")
+_DRIVER_PREFIX = re.compile(r"^(\[[^\]]*\]\s*)+")
+
+
+class InvalidSql(Exception):
+    """Generated SQL still failed validation after the allowed repairs."""
+
+
+def _is_identifier(word):
+    return bool(_IDENTIFIER.match(word))
+
+
+def _is_quoted(text):
+    return text.startswith(("[", '"'))
+
+
+def _names_alias(tokens, i):
+    """Whether the identifier at ``i`` names an output column (``expr [Alias]``
+    or ``[Alias] = expr``) rather than reading one."""
+    previous_text, previous_word = tokens[i - 1]
+    before = tokens[i - 2][1] if i >= 2 else ""
+    after_top = (previous_text == ")" and i >= 4 and tokens[i - 4][1] == "TOP") or (
+        previous_text[0].isdigit() and before == "TOP"
+    )
+    if i + 1 < len(tokens) and tokens[i + 1][0] == "=" and (
+        previous_word in ("SELECT", "DISTINCT", "ALL") or previous_text == "," or after_top
+    ):
+        # T-SQL's own alias syntax, at the start of a select list item
+        return True
+    if previous_word == "AS" or previous_text.startswith("'"):
+        return True
+    if previous_text == ")":
+        # ... TOP (10) [Column] reads a column
+        return not after_top
+    if previous_text[0].isdigit():
+        return before != "TOP"
+    if _is_quoted(previous_text):
+        return True
+    return _is_identifier(previous_text) and previous_word not in _NOT_BEFORE_ALIAS and before != "."
+
+
+def check_identifiers(sql, table_info):
+    """Problems with names in ``sql`` that can be seen without the server.
+
+    Only what is certain from ``table_info`` is reported: the selected table
+    under a schema none of the prompted tables of that name has, qualified
+    columns of the selected table that don't exist, and bracketed names that
+    are neither its columns nor aliases when it is the only table read. Other
+    tables are left to the server check.
+    """
+    tokens = [(match.group(), word) for match, word in tokenize(sql)]
+    table_name = table_info.name.lower()
+    # Retrieval can prompt with same-name tables of other schemas too
+    same_name = [table for table, _ in table_info.tables if table.name.lower() == table_name]
+    schemas = {table.schema.lower() for table in same_name}
+    columns = {column.lower() for column, _ in table_info.columns}
+    ctes = {
+        unquote_identifier(tokens[i - 1][0]).lower()
+        for i in range(1, len(tokens) - 1)
+        if tokens[i][1] == "AS" and tokens[i + 1][0] == "(" and _is_identifier(tokens[i - 1][0])
+    }
+
+    problems = []
+    target_names = set()   # The prompted table's name and aliases
+    other_tables = False
+    table_reference = set()
+    for i, (text, word) in enumerate(tokens):
+        if word not in ("FROM", "JOIN") or i + 1 >= len(tokens):
+            continue
+        if not _is_identifier(tokens[i + 1][0]):
+            other_tables = True  # Derived table
+            continue
+        # [db.][schema.]table and an optional alias
+        j = i + 1
+        parts = [unquote_identifier(tokens[j][0])]
+        while j + 2 < len(tokens) and tokens[j + 1][0] == "." and _is_identifier(tokens[j + 2][0]):
+            j += 2
+            parts.append(unquote_identifier(tokens[j][0]))
+        table_reference.update(range(i + 1, j + 1))
+        alias = None
+        k = j + 1
+        if k < len(tokens) and tokens[k][1] == "AS":
+            k += 1
+        if k < len(tokens) and _is_identifier(tokens[k][0]) and tokens[k][1] not in _CLAUSE_WORDS:
+            alias = unquote_identifier(tokens[k][0]).lower()
+            table_reference.add(k)
+
+        name = parts[-1].lower()
+        if len(parts) == 1 and name in ctes:
+            other_tables = True
+        elif name == table_name and (j + 1 >= len(tokens) or tokens[j + 1][0] != "("):
+            schema = parts[-2].lower() if len(parts) > 1 else table_info.schema.lower()
+            if schema != table_info.schema.lower() and schema in schemas:
+                other_tables = True  # Another prompted table of the same name
+                continue
+            if schema not in schemas:
+                known = " or ".join(table.qualified_name for table in same_name)
+                problems.append(f"Invalid object name '{'.'.join(parts)}'. The table is {known}.")
+            target_names.update({name, alias or name})
+        else:
+            other_tables = True
+
+    aliases = {
+        unquote_identifier(tokens[i][0]).lower()
+        for i in range(1, len(tokens))
+        if i not in table_reference and _is_identifier(tokens[i][0]) and _names_alias(tokens, i)
+    }
+    for i, (text, word) in enumerate(tokens):
+        if i == 0 or i in table_reference or not _is_identifier(text):
+            continue
+        if i + 1 < len(tokens) and tokens[i + 1][0] in (".", "("):
+            continue  # Qualifier or function name
+        if tokens[i - 1][0] == "(" and i >= 2 and tokens[i - 2][1] in _DATE_PART_FUNCTIONS:
+            continue  # Date part
+        name = unquote_identifier(text).lower()
+        if tokens[i - 1][0] == ".":
+            qualifier = unquote_identifier(tokens[i - 2][0]).lower() if i >= 2 else ""
+            if qualifier in target_names and name not in columns:
+                problems.append(f"Invalid column name '{unquote_identifier(text)}'.")
+        elif (_is_quoted(text) and target_names and not other_tables and not _names_alias(tokens, i)
+              and name not in columns and name not in aliases):
+            problems.append(f"Invalid column name '{unquote_identifier(text)}'.")
+    return list(dict.fromkeys(problems))
+
+
+def server_message(error):
+    """SQL Server's own wording of a pyodbc error, without the driver prefixes."""
+    message = error.args[1] if len(getattr(error, "args", ())) > 1 else str(error)
+    message = _DRIVER_PREFIX.sub("", str(message))
+    return _ERROR_NUMBER.sub("", message).strip()
+
+
+def _is_compile_error(error):
+    args = getattr(error, "args", ())
+    if not args or not str(args[0]).startswith("42"):
+        return False
+    number = _ERROR_NUMBER.search(str(args[-1]))
+    return number is None or int(number.group(1)) not in _INCONCLUSIVE_ERRORS
+
+
+def describe_error(conn, sql):
+    """Compile ``sql`` on the server without running it.
+
+    Returns SQL Server's error message when the statement doesn't compile, or
+    None. Errors that don't prove the SQL wrong (permissions, constructs the
+    procedure can't analyse, connection trouble) also return None; execution
+    will report them properly.
+    """
+    try:
+        conn.cursor().execute(DESCRIBE_QUERY, sql).fetchall()
+    except Exception as e:
+        return server_message(e) if _is_compile_error(e) else None
+    return None
@@ -0,0 +1,64 @@
+"""Search, sorting and paging over a catalog's tables for the table browser.
+
+The index is built once per catalog: names are lowercased and kept sorted so
+a prefix search is a binary search, and the UI only renders the page it
+shows, so databases with thousands of tables stay responsive.
+"""
+import bisect
+from dataclasses import dataclass
+
+TABLE_SORTS = ("Name", "Size", "Recently used")
+
+
+@dataclass(frozen=True)
+class TablePage:
+    tables: list    # TableInfo on this page
+    matches: int    # Tables matching the search
+    page: int       # 1-based, clamped to the available pages
+    pages: int
+
+
+def format_rows(rows):
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if rows >= limit:
+            return f"{rows / limit:.1f}".rstrip("0").rstrip(".") + f"{suffix} rows"
+    return f"{rows:,} rows"
+
+
+class TableIndex:
+    def __init__(self, tables):
+        self.tables = sorted(tables, key=lambda info: (info.schema.lower(), info.name.lower()))
+        self._labels = [f"{info.schema}.{info.name}".lower() for info in self.tables]
+        # Both "name" and "schema.name" so either can be typed as a prefix
+        self._prefixes = sorted(
+            [(info.name.lower(), i) for i, info in enumerate(self.tables)]
+            + [(label, i) for i, label in enumerate(self._labels)]
+        )
+
+    def search(self, text=""):
+        """Tables whose name or ``schema.name`` starts with ``text``, then those containing it."""
+        text = text.strip().lower().replace("[", "").replace("]", "")
+        if not text:
+            return list(self.tables)
+        found = set()
+        for key, i in self._prefixes[bisect.bisect_left(self._prefixes, (text,)):]:
+            if not key.startswith(text):
+                break
+            found.add(i)
+        starts = sorted(found)
+        contains = [i for i, label in enumerate(self._labels) if i not in found and text in label]
+        return [self.tables[i] for i in starts + contains]
+
+    def page(self, text="", sort="Name", recent=(), page=1, page_size=40):
+        """One page of search results; ``recent`` lists table keys, most recently used first."""
+        tables = self.search(text)
+        if sort == "Size":
+            # Largest first; unknown sizes last (the sort is stable, so ties keep search order)
+            tables.sort(key=lambda info: -1 if info.rows is None else info.rows, reverse=True)
+        elif sort == "Recently used":
+            rank = {key: n for n, key in enumerate(recent)}
+            tables.sort(key=lambda info: rank.get(info.key, len(rank)))
+        pages = max(1, -(-len(tables) // page_size))
+        page = min(max(1, page), pages)
+        start = (page - 1) * page_size
+        return TablePage(tables[start:start + page_size], len(tables), page, pages)
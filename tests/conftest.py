@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def bench_db(tmp_path_factory):
+    """The benchmark's SQLite stand-in for SQL Server, with 2,000 orders."""
+    from benchmarks.fake_db import create_database
+    path = str(tmp_path_factory.mktemp("bench") / "bench.sqlite3")
+    create_database(path, rows=2000)
+    return path
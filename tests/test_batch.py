@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+
+from batch import BatchRunner, ResultWriter, build_items, completed_ids
+
+
+def record(item_id, status="ok"):
+    return {"id": item_id, "status": status, "timings": {}}
+
+
+def test_resume_drops_a_torn_last_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    writer = ResultWriter(str(path))
+    writer.write(record("a"))
+    writer.write(record("b", status="error"))
+    writer.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "c", "sta')
+
+    assert completed_ids(str(path)) == {"a", "b"}
+    assert completed_ids(str(path), retry_errors=True) == {"a"}
+    # The partial record is cut, so the next append starts on its own line
+    writer = ResultWriter(str(path))
+    writer.write(record("c"))
+    writer.close()
+    assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == ["a", "b", "c"]
+
+
+def test_items_per_database_and_stable_ids():
+    rows = [{"question": "Total sales"}, {"question": "total sales?"}, {"question": "Top customers", "table": "sales.Customers"}]
+    items = build_items(rows, ["A", "B"], "dbo.Orders")
+    assert [(i.database, i.schema, i.table, i.question) for i in items] == [
+        ("A", "dbo", "Orders", "Total sales"),
+        ("B", "dbo", "Orders", "Total sales"),
+        ("A", "sales", "Customers", "Top customers"),
+        ("B", "sales", "Customers", "Top customers"),
+    ]
+    assert items[0].id == build_items([{"question": "TOTAL SALES"}], ["A"], "dbo.Orders")[0].id
+
+
+class SlowCatalogs:
+    def __init__(self):
+        self.loads = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def load_catalog(self, server_info, database):
+        with self._lock:
+            self.loads.append(database)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return f"catalog of {database}"
+
+
+def test_catalogs_load_once_per_database_and_in_parallel():
+    engine = SlowCatalogs()
+    runner = BatchRunner(engine, {}, db_concurrency=4)
+    threads = [threading.Thread(target=runner.catalog, args=(database,)) for database in ["A", "B", "A", "B"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(engine.loads) == ["A", "B"]
+    assert engine.peak == 2
+    assert runner.catalog("A") == "catalog of A"
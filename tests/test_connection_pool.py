@@ -0,0 +1,106 @@
+import pytest
+
+from connection_pool import ConnectionPool, PoolExhausted, PoolRegistry
+
+
+class FakeConnection:
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        self.healthy = True
+        self.rollbacks = 0
+        self.closed = False
+        self.timeout = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        if not self.healthy:
+            raise RuntimeError("connection lost")
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def rollback(self):
+        if not self.healthy:
+            raise RuntimeError("connection lost")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self, conn_str):
+        self.opened.append(FakeConnection(conn_str))
+        return self.opened[-1]
+
+
+def pool(**options):
+    connect = Connector()
+    return ConnectionPool("DSN=test", connect=connect, **options), connect
+
+
+def test_returned_connections_are_rolled_back_and_reused():
+    p, connect = pool(query_timeout=30)
+    conn = p.acquire()
+    assert conn.timeout == 30
+    p.release(conn)
+    assert conn.rollbacks == 1
+    assert p.acquire() is conn
+    assert len(connect.opened) == 1
+
+
+def test_connection_that_fails_to_roll_back_is_discarded():
+    p, connect = pool()
+    conn = p.acquire()
+    conn.healthy = False
+    p.release(conn)
+    assert conn.closed and p.size == 0
+    assert p.acquire() is not conn
+
+
+def test_stale_connection_fails_the_health_check():
+    p, connect = pool(health_check_interval=0)
+    conn = p.acquire()
+    p.release(conn)
+    conn.healthy = False
+    replacement = p.acquire()
+    assert replacement is not conn and conn.closed
+    assert len(connect.opened) == 2
+
+
+def test_idle_connections_are_evicted():
+    p, connect = pool(idle_timeout=0)
+    conn = p.acquire()
+    p.release(conn)
+    p.prune()
+    assert conn.closed and p.size == 0
+
+
+def test_full_pool_raises_after_acquire_timeout():
+    p, _ = pool(max_size=1, acquire_timeout=0.05)
+    conn = p.acquire()
+    with pytest.raises(PoolExhausted):
+        p.acquire()
+    p.release(conn)
+    with p.connection() as again:
+        assert again is conn
+
+
+def test_wrong_password_gets_its_own_pool():
+    connect = Connector()
+    registry = PoolRegistry(connect=connect, idle_timeout=300)
+    live = registry.get("db1", "", "sa", "right", "Sales")
+    conn = live.acquire()
+    other = registry.get("db1", "", "sa", "wrong", "Sales")
+    assert other is not live
+    assert registry.get("db1", "", "sa", "right", "Sales") is live
+    live.release(conn)
+    assert not conn.closed and live.size == 1
+    registry.close_all()
+    assert conn.closed
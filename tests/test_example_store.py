@@ -0,0 +1,60 @@
+import itertools
+
+import example_store
+from example_store import ExampleStore, signature
+
+TABLES = {"dbo.Orders": "orders-v1", "dbo.Customers": "customers-v1"}
+
+
+def store(tmp_path):
+    return ExampleStore(str(tmp_path / "examples.sqlite3"))
+
+
+def test_signature_drops_filler_and_plurals():
+    assert signature("Show me the total sales by region?") == signature("total sale by region")
+    assert signature("top 5 customers") != signature("top 10 customers")
+    assert signature("most orders") != signature("least orders")
+    assert signature("show me all") == ""
+
+
+def test_match_needs_same_table_and_schema(tmp_path):
+    examples = store(tmp_path)
+    sql = "SELECT Region, SUM(Amount) FROM dbo.Orders GROUP BY Region"
+    examples.put("db1|Sales", "dbo.Orders", "orders-v1", "total sales by region", sql)
+    assert examples.match("db1|Sales", "dbo.Orders", "orders-v1", "Show me the total sales by region") == sql
+    assert examples.match("db1|Sales", "dbo.Orders", "orders-v2", "total sales by region") is None
+    assert examples.match("db1|Sales", "dbo.Customers", "customers-v1", "total sales by region") is None
+    assert examples.match("db1|Other", "dbo.Orders", "orders-v1", "total sales by region") is None
+
+
+def test_similar_ranks_by_shared_terms(tmp_path):
+    examples = store(tmp_path)
+    examples.put("db1|Sales", "dbo.Orders", "orders-v1", "total sales by region", "SELECT 1")
+    examples.put("db1|Sales", "dbo.Orders", "orders-v1", "total sales per region last year", "SELECT 2")
+    examples.put("db1|Sales", "dbo.Customers", "customers-v1", "number of customers by country", "SELECT 3")
+    found = examples.similar("db1|Sales", TABLES, "total sales per region")
+    assert [example.sql for example in found] == ["SELECT 1", "SELECT 2"]
+    assert found[0].similarity == 1.0 and found[1].similarity == 0.6
+    assert examples.similar("db1|Sales", TABLES, "total sales per region", k=1) == found[:1]
+    assert examples.similar("db1|Sales", TABLES, "total sales per region", min_similarity=0.7) == found[:1]
+
+
+def test_new_schema_replaces_old_examples(tmp_path):
+    examples = store(tmp_path)
+    examples.put("db1|Sales", "dbo.Orders", "orders-v1", "total sales by region", "SELECT 1")
+    assert examples.similar("db1|Sales", {"dbo.Orders": "orders-v2"}, "total sales by region") == []
+    examples.put("db1|Sales", "dbo.Orders", "orders-v2", "orders per month", "SELECT 2")
+    assert examples.similar("db1|Sales", TABLES, "total sales by region") == []
+    assert [example.sql for example in examples.similar("db1|Sales", {"dbo.Orders": "orders-v2"}, "orders per month")] == [
+        "SELECT 2",
+    ]
+
+
+def test_oldest_examples_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(example_store.time, "time", lambda: next(clock))
+    examples = ExampleStore(str(tmp_path / "examples.sqlite3"), max_entries=2)
+    for n, question in enumerate(["orders by region", "orders by customer", "orders by month"]):
+        examples.put("db1|Sales", "dbo.Orders", "orders-v1", question, f"SELECT {n}")
+    assert examples.match("db1|Sales", "dbo.Orders", "orders-v1", "orders by region") is None
+    assert examples.match("db1|Sales", "dbo.Orders", "orders-v1", "orders by month") == "SELECT 2"
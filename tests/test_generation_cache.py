@@ -0,0 +1,36 @@
+from generation_cache import GenerationCache
+from pipeline import QuestionPipeline
+from schema_catalog import TableInfo
+from schema_retrieval import SchemaContext
+
+ORDERS = TableInfo("dbo", "Orders", (("OrderID", "int"), ("Region", "nvarchar")), "dbo.Orders(...)", "orders-v1")
+SERVER = {"server": "db1"}
+PAYLOAD = {"model": "sql-model", "options": {"temperature": 0}}
+
+
+def context(fingerprint):
+    return SchemaContext(ORDERS, ((ORDERS, None),), ORDERS.prompt_fragment, "", fingerprint, 10)
+
+
+def pipeline(tmp_path):
+    cache = GenerationCache(str(tmp_path / "generations.sqlite3"))
+    return QuestionPipeline(None, None, {}, {}, {}, generation_cache=cache)
+
+
+def test_questions_with_different_contexts_stay_cached(tmp_path):
+    qp = pipeline(tmp_path)
+    qp.remember_sql(SERVER, "Sales", context("ctx-a"), "Orders per region", PAYLOAD, "SELECT 1")
+    qp.remember_sql(SERVER, "Sales", context("ctx-b"), "Largest order", PAYLOAD, "SELECT 2")
+    assert qp.cached_sql(SERVER, "Sales", context("ctx-a"), "Orders per region", PAYLOAD) == "SELECT 1"
+    assert qp.cached_sql(SERVER, "Sales", context("ctx-b"), "Largest order", PAYLOAD) == "SELECT 2"
+    # The same question with a different prompt context is a separate entry
+    assert qp.cached_sql(SERVER, "Sales", context("ctx-b"), "Orders per region", PAYLOAD) is None
+
+
+def test_table_schema_change_drops_its_entries(tmp_path):
+    qp = pipeline(tmp_path)
+    qp.remember_sql(SERVER, "Sales", context("ctx-a"), "Orders per region", PAYLOAD, "SELECT 1")
+    altered = TableInfo("dbo", "Orders", ORDERS.columns + (("Amount", "decimal"),), "dbo.Orders(...)", "orders-v2")
+    qp.remember_sql(SERVER, "Sales", altered, "Largest order", PAYLOAD, "SELECT 2")
+    with qp.generation_cache._connect() as db:
+        assert db.execute("SELECT question FROM generations").fetchall() == [("largest order",)]
@@ -0,0 +1,70 @@
+import pytest
+
+from connection_pool import ConnectionPool
+from guardrails import Guardrails, QueryRejected, cap_rows, parse_showplan
+from benchmarks.fake_db import SHOWPLAN_TEMPLATE, connector
+
+
+def test_cap_rows_adds_or_lowers_top():
+    assert cap_rows("SELECT * FROM dbo.Orders;", 100) == "SELECT TOP (100) * FROM dbo.Orders"
+    assert cap_rows("SELECT DISTINCT Region FROM dbo.Orders", 100) == "SELECT DISTINCT TOP (100) Region FROM dbo.Orders"
+    assert cap_rows("SELECT TOP 5000 * FROM dbo.Orders", 100) == "SELECT TOP 100 * FROM dbo.Orders"
+    assert cap_rows("SELECT TOP (10) * FROM dbo.Orders", 100) == "SELECT TOP (10) * FROM dbo.Orders"
+    sql = "WITH t AS (SELECT TOP 5000 * FROM dbo.Orders) SELECT * FROM t"
+    assert cap_rows(sql, 100) == "WITH t AS (SELECT TOP 5000 * FROM dbo.Orders) SELECT TOP (100) * FROM t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT Region FROM dbo.Orders UNION SELECT Country FROM dbo.Customers",
+    "SELECT * INTO #copy FROM dbo.Orders",
+    "SELECT * FROM dbo.Orders ORDER BY OrderID OFFSET 10 ROWS FETCH NEXT 10 ROWS ONLY",
+    "SELECT TOP 10 PERCENT * FROM dbo.Orders",
+    "SELECT TOP (@n) * FROM dbo.Orders",
+    "UPDATE dbo.Orders SET Amount = 0",
+])
+def test_cap_rows_leaves_what_it_cannot_cap(sql):
+    assert cap_rows(sql, 100) is None
+
+
+def test_parse_showplan_sums_statements_and_collects_warnings():
+    ns = "http://schemas.microsoft.com/sqlserver/2004/07/showplan"
+    xml = (
+        f'<ShowPlanXML xmlns="{ns}"><BatchSequence><Batch><Statements>'
+        '<StmtSimple StatementSubTreeCost="1.5" StatementEstRows="10" />'
+        '<StmtSimple StatementSubTreeCost="2.5" StatementEstRows="400">'
+        '<QueryPlan><Warnings NoJoinPredicate="true"><SpillToTempDb /></Warnings></QueryPlan></StmtSimple>'
+        "</Statements></Batch></BatchSequence></ShowPlanXML>"
+    )
+    estimate = parse_showplan(xml)
+    assert (estimate.cost, estimate.rows) == (4.0, 400.0)
+    assert estimate.warnings == ("NoJoinPredicate", "SpillToTempDb")
+    assert parse_showplan(SHOWPLAN_TEMPLATE.format(text='"SELECT 1"', cost=0.5, rows=1)).rows == 1.0
+
+
+@pytest.fixture
+def pool(bench_db):
+    return ConnectionPool("DSN=bench", connect=connector(bench_db))
+
+
+def test_review_caps_a_large_result(pool):
+    guardrails = Guardrails(max_cost=0, max_rows=500, cap_rows=100)
+    assert guardrails.review(pool, "SELECT * FROM dbo.Orders WHERE OrderID < 50") == (
+        "SELECT * FROM dbo.Orders WHERE OrderID < 50", None,
+    )
+    sql, note = guardrails.review(pool, "SELECT * FROM dbo.Orders")
+    assert sql == "SELECT TOP (100) * FROM dbo.Orders"
+    assert note.startswith("Limited to TOP (100): estimated 2,000 rows is over 500")
+
+
+def test_review_rejects_what_cannot_be_capped(pool):
+    guardrails = Guardrails(max_cost=0, max_rows=500, cap_rows=100)
+    with pytest.raises(QueryRejected, match="over 500"):
+        guardrails.review(pool, "SELECT OrderID FROM dbo.Orders UNION ALL SELECT CustomerID FROM dbo.Orders")
+    with pytest.raises(QueryRejected):
+        Guardrails(max_cost=0, max_rows=500, on_exceed="reject").review(pool, "SELECT * FROM dbo.Orders")
+
+
+def test_review_without_an_estimate(pool):
+    assert Guardrails(max_rows=1).review(pool, "SELECT * FROM dbo.Nope") == ("SELECT * FROM dbo.Nope", None)
+    with pytest.raises(QueryRejected, match="Could not estimate"):
+        Guardrails(max_rows=1, fail_open=False).review(pool, "SELECT * FROM dbo.Nope")
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from history_store import HistoryStore, SessionHistory
+
+
+def entry(question):
+    return {"question": question, "sql": "SELECT 1", "result": pd.DataFrame({"n": [1]})}
+
+
+def test_clear_keeps_other_sessions_entries(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    earlier = SessionHistory(store, "db1/sa")
+    earlier.append(entry("first"))
+    ours, theirs = SessionHistory(store, "db1/sa"), SessionHistory(store, "db1/sa")
+    ours.append(entry("mine"))
+    theirs.append(entry("theirs"))
+
+    ours.clear()
+    assert len(ours) == 0 and ours.total() == 0 and ours.page().entries == []
+    assert [e["question"] for e in theirs.page().entries] == ["first", "theirs"]
+    # A new session still sees everything the cleared one didn't add
+    assert [e["question"] for e in SessionHistory(store, "db1/sa")] == ["first", "theirs"]
+
+    ours.append(entry("after"))
+    assert [e["question"] for e in ours.page().entries] == ["after"]
+    assert store.result(ours[-1]["id"])["n"].tolist() == [1]
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+import requests
+
+from llm import OllamaClient
+
+
+def response(status=200, body=None, lines=()):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body).encode() if body is not None else "\n".join(json.dumps(line) for line in lines).encode()
+    r._content_consumed = True
+    return r
+
+
+class FakeSession:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def post(self, url, json=None, stream=False, timeout=None):
+        self.calls.append((url, json))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def client(*replies, **options):
+    c = OllamaClient("http://ollama:11434", retry_backoff=0, **options)
+    c.session = FakeSession(*replies)
+    return c
+
+
+def test_transient_failures_are_retried():
+    c = client(response(503, {}), requests.ConnectionError("refused"), response(200, {"response": "SELECT 1", "done": True}))
+    result = c.generate({"model": "m", "prompt": "p"})
+    assert result["response"] == "SELECT 1"
+    assert len(c.session.calls) == 3
+    assert c.session.calls[0][1]["keep_alive"] == "30m"
+
+
+def test_retries_are_bounded():
+    c = client(*[requests.ConnectionError("refused")] * 3, max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        c.generate({"model": "m", "prompt": "p"})
+    assert len(c.session.calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    c = client(response(404, {"error": "model not found"}))
+    with pytest.raises(requests.HTTPError):
+        c.generate({"model": "m", "prompt": "p"})
+    assert len(c.session.calls) == 1
+
+
+def test_chat_payloads_use_the_chat_endpoint():
+    c = client(response(200, {"message": {"role": "assistant", "content": "SELECT 2"}, "done": True}))
+    result = c.generate({"model": "m", "messages": [{"role": "user", "content": "q"}]})
+    assert c.session.calls[0][0] == "http://ollama:11434/api/chat"
+    assert result["response"] == "SELECT 2"
+
+
+def test_stream_reports_the_final_statistics():
+    lines = [{"response": "SELECT"}, {"response": " 1"}, {"done": True, "eval_count": 2, "prompt_eval_count": 9}]
+    seen = []
+    result = client(response(lines=lines)).generate({"model": "m", "prompt": "p", "stream": True}, on_token=seen.append)
+    assert seen == ["SELECT", "SELECT 1"]
+    assert result["response"] == "SELECT 1" and not result["stopped_early"]
+    assert (result["eval_count"], result["prompt_eval_count"]) == (2, 9)
+
+
+def test_stream_stops_early_with_client_side_counts():
+    lines = [{"response": "SELECT 1;"}, {"response": " then"}, {"response": " prose"}, {"done": True, "eval_count": 40}]
+    result = client(response(lines=lines)).generate(
+        {"model": "m", "prompt": "p", "stream": True}, should_stop=lambda text: text.endswith(";") or "then" in text,
+    )
+    assert result["stopped_early"] and result["response"] == "SELECT 1;"
+    assert result["eval_count"] == 1 and result["eval_duration"] == 0
+    assert "prompt_eval_count" not in result
+
+
+def test_stream_error_chunk_raises():
+    with pytest.raises(RuntimeError, match="out of memory"):
+        client(response(lines=[{"error": "out of memory"}])).generate({"model": "m", "prompt": "p", "stream": True})
@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+from config import MODEL_PROFILES, SPEED_CONFIG, SUMMARY_CONFIG, VALIDATION_CONFIG
+from pipeline import CANCELLED, QuestionPipeline, Step, drive
+from query_executor import Execution, QueryCancelled
+from schema_catalog import TableInfo
+
+SERVER = {"server": "db1", "port": "", "username": "sa", "password": "pw"}
+ORDERS = SimpleNamespace(schema="dbo", name="Orders", fingerprint="f1", prompt_prefix="Table: [dbo].[Orders]",
+                         prompt_suffix="")
+
+
+class FakeLlm:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.payloads = []
+
+    def generate(self, payload, on_token=None, should_stop=None):
+        self.payloads.append(payload)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        if on_token:
+            on_token(reply)
+        return {"response": reply, "client_ttft_ms": 1.0, "client_total_ms": 2.0}
+
+
+class FakeExecutor:
+    def __init__(self, error=None):
+        self.error = error
+        self.statements = []
+
+    def execute(self, server_info, database, sql, timer, cache_mode="Use cache"):
+        self.statements.append(sql)
+        if self.error:
+            raise self.error
+        return Execution(pd.DataFrame({"Region": ["North", "South"], "Total": [3, 2]}), sql=sql)
+
+
+def pipeline(llm, executor=None):
+    return QuestionPipeline(executor or FakeExecutor(), llm, SPEED_CONFIG, SUMMARY_CONFIG, MODEL_PROFILES)
+
+
+def test_ask_runs_the_steps_in_order():
+    p = pipeline(FakeLlm("SELECT Region, COUNT(*) AS Total FROM Orders GROUP BY Region;", "North leads."))
+    stages = []
+
+    def run(step):
+        stages.append((step.stage, step.resource))
+        return step.run()
+
+    entry = drive(p.steps(SERVER, "Sales", ORDERS, "orders per region"), run)
+    assert stages == [
+        ("prompt", "local"), ("cached", "local"), ("generate", "llm"),
+        ("execute", "db"), ("remember", "local"), ("summarize", "llm"),
+    ]
+    assert entry["sql"].startswith("SELECT Region")
+    assert list(entry["result"]["Region"]) == ["North", "South"]
+    assert entry["summary"] == "North leads."
+    assert entry["error"] is None and not entry["summary_pending"]
+
+
+def test_generation_error_ends_the_question():
+    executor = FakeExecutor()
+    entry = pipeline(FakeLlm(RuntimeError("model unavailable")), executor).ask(SERVER, "Sales", ORDERS, "q")
+    assert entry["error"] == entry["summary"] == "Error generating SQL: model unavailable"
+    assert entry["result"] is None
+    assert executor.statements == []
+
+
+def test_execution_error_keeps_the_sql():
+    executor = FakeExecutor(RuntimeError("Invalid object name"))
+    entry = pipeline(FakeLlm("SELECT * FROM Nope;"), executor).ask(SERVER, "Sales", ORDERS, "q")
+    assert entry["error"] == "Error executing SQL: Invalid object name"
+    assert entry["sql"] == "SELECT * FROM Nope;"
+
+
+def test_cancelled_query_is_not_an_execution_error():
+    entry = pipeline(FakeLlm("SELECT 1;"), FakeExecutor(QueryCancelled())).ask(SERVER, "Sales", ORDERS, "q")
+    assert entry["error"] == CANCELLED
+    assert entry["result"] is None
+
+
+def test_driver_can_defer_the_summary():
+    p = pipeline(FakeLlm("SELECT 1;", "One row."))
+    deferred = []
+
+    def run(step):
+        if step.stage == "summarize":
+            deferred.append(step)
+            return None
+        return step.run()
+
+    entry = drive(p.steps(SERVER, "Sales", ORDERS, "q"), run)
+    assert entry["summary_pending"] and entry["summary"] == ""
+    deferred[0].run()
+    assert entry["summary"] == "One row." and not entry["summary_pending"]
+
+
+def test_drive_throws_step_errors_into_the_generator():
+    def steps():
+        try:
+            yield Step("boom", "local", lambda: 1 / 0)
+        except ZeroDivisionError:
+            value = yield Step("ok", "local", lambda x: x * 2, (21,))
+            return value
+
+    assert drive(steps()) == 42
+
+
+def test_invalid_sql_is_repaired_before_it_runs():
+    orders = TableInfo("dbo", "Orders", (("Region", "nvarchar"), ("Amount", "decimal")), "Table: [dbo].[Orders]", "f1")
+    executor = FakeExecutor()
+    llm = FakeLlm("SELECT [Nope] FROM dbo.Orders;", "SELECT [Region] FROM dbo.Orders;", "Two regions.")
+    validation = dict(VALIDATION_CONFIG, server_check=False)
+    p = QuestionPipeline(executor, llm, SPEED_CONFIG, SUMMARY_CONFIG, MODEL_PROFILES, validation_config=validation)
+    entry = p.ask(SERVER, "Sales", orders, "regions")
+    assert executor.statements == ["SELECT [Region] FROM dbo.Orders;"]
+    assert [(r["sql"], r["check"]) for r in entry["repairs"]] == [("SELECT [Nope] FROM dbo.Orders;", "local")]
+    assert "Error: Invalid column name 'Nope'." in llm.payloads[1]["messages"][-1]["content"]
+    assert entry["error"] is None
+
+
+def test_repairs_run_out():
+    orders = TableInfo("dbo", "Orders", (("Region", "nvarchar"),), "Table: [dbo].[Orders]", "f1")
+    executor = FakeExecutor()
+    validation = dict(VALIDATION_CONFIG, server_check=False, max_repairs=1)
+    p = QuestionPipeline(executor, FakeLlm("SELECT [A] FROM dbo.Orders;", "SELECT [B] FROM dbo.Orders;"),
+                         SPEED_CONFIG, SUMMARY_CONFIG, MODEL_PROFILES, validation_config=validation)
+    entry = p.ask(SERVER, "Sales", orders, "q")
+    assert entry["error"].startswith("Invalid SQL: Invalid column name 'B'.")
+    assert entry["sql"] == "SELECT [B] FROM dbo.Orders;"
+    assert executor.statements == []
+
+
+def test_missing_model_falls_back_and_is_remembered():
+    error = RuntimeError("model not found")
+    error.response = SimpleNamespace(status_code=404)
+    llm = FakeLlm("SELECT 1;", error, "One row.", "SELECT 2;", "Two.")
+    p = pipeline(llm)
+    p.ask(SERVER, "Sales", ORDERS, "q")
+    p.ask(SERVER, "Sales", ORDERS, "q2")
+    assert [payload["model"] for payload in llm.payloads] == ["llama3", "llama3.2:1b", "llama3", "llama3", "llama3"]
+    assert p.metrics.snapshot()["counters"]["model_fallbacks"] == 1
+
+
+def test_repairs_escalate_along_the_sql_chain():
+    orders = TableInfo("dbo", "Orders", (("Region", "nvarchar"),), "Table: [dbo].[Orders]", "f1")
+    profiles = dict(MODEL_PROFILES, sql=dict(MODEL_PROFILES["sql"], model="small", fallback=["large"]))
+    validation = dict(VALIDATION_CONFIG, server_check=False)
+    llm = FakeLlm("SELECT [Nope] FROM dbo.Orders;", "SELECT [Region] FROM dbo.Orders;", "Two regions.")
+    p = QuestionPipeline(FakeExecutor(), llm, SPEED_CONFIG, SUMMARY_CONFIG, profiles, validation_config=validation)
+    entry = p.ask(SERVER, "Sales", orders, "regions")
+    assert [payload["model"] for payload in llm.payloads[:2]] == ["small", "large"]
+    assert entry["repairs"][0]["model"] == "large"
+    stats = {(row["profile"], row["model"]): row["valid_sql"] for row in p.profile_stats()}
+    assert stats[("sql", "small")] == 0.0 and stats[("repair", "large")] == 1.0
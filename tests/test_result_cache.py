@@ -0,0 +1,45 @@
+import time
+
+from result_cache import ResultCache, normalize_sql
+
+
+def test_same_sql_modulo_whitespace_shares_an_entry():
+    cache = ResultCache()
+    cache.put("db1/sa/x", "Sales", "SELECT  *\nFROM dbo.Orders;", "rows", 10)
+    assert cache.get("db1/sa/x", "Sales", "SELECT * FROM dbo.Orders") == "rows"
+    # Whitespace inside literals is part of the query
+    assert normalize_sql("SELECT 'a  b'  FROM t") == "SELECT 'a  b' FROM t"
+
+
+def test_entries_are_per_login_and_database():
+    cache = ResultCache()
+    cache.put("db1/sa/x", "Sales", "SELECT 1", "rows", 10)
+    assert cache.get("db1/reader/y", "Sales", "SELECT 1") is None
+    assert cache.get("db1/sa/x", "Archive", "SELECT 1") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=100)
+    cache.put("l", "d", "SELECT 1", "one", 40)
+    cache.put("l", "d", "SELECT 2", "two", 40)
+    cache.get("l", "d", "SELECT 1")
+    cache.put("l", "d", "SELECT 3", "three", 40)
+    assert cache.get("l", "d", "SELECT 2") is None
+    assert cache.get("l", "d", "SELECT 1") == "one"
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 80, 1)
+    # Larger than the whole budget: not cached at all
+    assert cache.put("l", "d", "SELECT 4", "four", 101) is False
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("l", "d", "SELECT 1", "rows", 10)
+    now[0] += 59
+    assert cache.get("l", "d", "SELECT 1") == "rows"
+    now[0] += 2
+    assert cache.get("l", "d", "SELECT 1") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["bytes"] == 0
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from result_digest import build_digest, estimate_tokens
+
+
+def orders(rows):
+    return pd.DataFrame({
+        "Region": pd.Series([["North", "South", "East"][i % 3] for i in range(rows)], dtype="string"),
+        "Amount": pd.Series([float(i) for i in range(rows)]),
+        "Shipped": pd.Series([i % 2 == 0 for i in range(rows)], dtype="boolean"),
+        "OrderDate": pd.to_datetime(["2024-01-01"] * rows) + pd.to_timedelta(range(rows), unit="D"),
+    })
+
+
+def test_stats_per_column_kind():
+    digest = build_digest(orders(6))
+    assert digest.startswith("Rows: 6\nColumns: Region (string), Amount (float64)")
+    assert "- Amount: min 0, max 5, mean 2.5" in digest
+    assert "- Shipped: True=3, False=3" in digest
+    assert "- OrderDate: from 2024-01-01 00:00:00 to 2024-01-06 00:00:00" in digest
+    assert "- Region: 3 distinct; top North (2)" in digest
+    assert "Sample rows:" in digest
+
+
+def test_size_does_not_grow_with_rows():
+    small, large = build_digest(orders(10)), build_digest(orders(100_000))
+    assert abs(estimate_tokens(large) - estimate_tokens(small)) < 20
+    assert "Rows: 100,000" in large
+
+
+def test_shrinks_to_the_budget():
+    wide = pd.DataFrame({f"C{i}": range(50) for i in range(12)})
+    # The head sample goes first, then column stats
+    assert "Sample rows:" in build_digest(wide, token_budget=200)
+    digest = build_digest(wide, token_budget=150)
+    assert estimate_tokens(digest) <= 150 and "Sample rows:" not in digest and "more columns" not in digest
+    digest = build_digest(wide, token_budget=80)
+    assert estimate_tokens(digest) <= 80 and "more columns" in digest
+
+
+def test_incomplete_result_is_a_lower_bound():
+    assert build_digest(orders(3), complete=False).startswith("Rows: at least 3 (result truncated)")
+    assert build_digest(orders(0)).startswith("Rows: 0")
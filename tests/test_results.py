@@ -0,0 +1,93 @@
+from results import OpenStreams, ResultStream
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.description = [("n", int, None, None, None, None, True), ("label", str, None, None, None, None, True)]
+        self._rows = list(rows)
+        self.fetches = 0
+        self.closed = False
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self):
+        self.released = []
+
+    def release(self, conn, discard=False):
+        self.released.append(conn)
+
+
+def stream(rows, pool=None, **options):
+    pool = pool or FakePool()
+    return ResultStream(pool, object(), FakeCursor((i, f"row {i}") for i in range(rows)), **options)
+
+
+def test_pages_until_exhausted_then_releases_the_connection():
+    s = stream(25, batch_size=4, page_rows=10)
+    first = s.fetch_page()
+    assert first["n"].tolist() == list(range(10)) and str(first["n"].dtype) == "Int64"
+    assert s.has_more and s.pool.released == []
+    assert s.fetch_page()["n"].tolist() == list(range(10, 20))
+    last = s.fetch_page()
+    assert last["n"].tolist() == list(range(20, 25))
+    assert s.exhausted and not s.truncated and not s.has_more
+    assert s.cursor.closed and len(s.pool.released) == 1
+
+
+def test_lookahead_knows_an_exact_page_was_the_last():
+    s = stream(10, page_rows=10)
+    assert len(s.fetch_page()) == 10
+    assert s.exhausted and s.closed
+    assert s.fetch_page().empty
+
+
+def test_row_cap_truncates():
+    s = stream(100, page_rows=30, max_rows=50)
+    assert len(s.fetch_page()) == 30
+    assert len(s.fetch_page()) == 20
+    assert s.truncated and not s.exhausted and s.closed
+    assert s.rows_fetched == 50
+
+
+def test_byte_cap_truncates():
+    s = stream(1000, batch_size=10, page_rows=1000, max_bytes=2000)
+    page = s.fetch_page()
+    assert 0 < len(page) < 1000
+    assert s.truncated and s.closed
+
+
+def test_open_streams_per_pool_close_the_least_recently_used():
+    shared, other = FakePool(), FakePool()
+    registry = OpenStreams(per_pool=2)
+    streams = [stream(100, shared, page_rows=10) for _ in range(3)]
+    elsewhere = stream(100, other, page_rows=10)
+    for s in streams[:2] + [elsewhere]:
+        s.fetch_page()
+        registry.add(s)
+    streams[0].last_used, streams[1].last_used = 2.0, 1.0  # streams[1] is the least recently used
+    streams[2].fetch_page()
+    registry.add(streams[2])
+    assert [s.closed for s in streams] == [False, True, False]
+    assert not elsewhere.closed
+    assert shared.released == [streams[1].conn]
+
+
+def test_sweep_releases_idle_streams():
+    registry = OpenStreams(idle_timeout=0)
+    s = stream(100, page_rows=10)
+    s.fetch_page()
+    registry.add(s)
+    registry.sweep()
+    assert s.closed and len(s.pool.released) == 1
@@ -0,0 +1,38 @@
+from result_digest import CHARS_PER_TOKEN
+from schema_catalog import _table_info
+from schema_retrieval import SchemaIndex
+
+ORDERS = _table_info(
+    "dbo", "Orders", [("OrderID", "int"), ("CustomerID", "int"), ("Amount", "decimal")],
+    foreign_keys=[("CustomerID", "dbo", "Customers", "CustomerID")],
+)
+CUSTOMERS = _table_info(
+    "dbo", "Customers", [("CustomerID", "int"), ("Name", "nvarchar"), ("Country", "nvarchar")]
+    + [(f"Extra{i}", "int") for i in range(10)],
+)
+WIDE = _table_info("dbo", "Events", [(f"Field{i}", "int") for i in range(60)] + [("Country", "nvarchar")])
+
+
+def test_related_table_fits_next_to_the_selected_one():
+    index = SchemaIndex([ORDERS, CUSTOMERS])
+    context = index.select("orders by customer country", ORDERS, token_budget=54)
+    assert len(context.prompt_fragment) <= 54 * CHARS_PER_TOKEN
+    assert [(info.name, columns) for info, columns in context.tables] == [
+        ("Orders", None), ("Customers", ("Country", "CustomerID")),
+    ]
+
+
+def test_selected_table_alone_when_nothing_else_matches():
+    context = SchemaIndex([ORDERS, CUSTOMERS]).select("total amount", ORDERS, token_budget=200)
+    assert [info.name for info, _ in context.tables] == ["Orders"]
+    assert context.prompt_fragment == ORDERS.prompt_fragment
+
+
+def test_wide_table_keeps_a_stable_prefix_within_budget():
+    index = SchemaIndex([WIDE])
+    first = index.select("events per country", WIDE, token_budget=100)
+    second = index.select("count of field42", WIDE, token_budget=100)
+    assert first.prompt_prefix == second.prompt_prefix
+    assert "Country (nvarchar)" in first.prompt_suffix and "Field42 (int)" in second.prompt_suffix
+    for context in (first, second):
+        assert len(context.prompt_fragment) <= 100 * CHARS_PER_TOKEN
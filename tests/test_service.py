@@ -0,0 +1,65 @@
+import asyncio
+import datetime
+import decimal
+
+import pandas as pd
+import pytest
+
+from results import frame_from_payload, frame_to_payload
+from service import Coalescer, RequestError, _identity
+
+
+def test_identical_requests_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"rows": 3}
+
+    async def main():
+        coalescer = Coalescer()
+        return await asyncio.gather(*(coalescer.run("same", compute) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True]
+    assert all(result == {"rows": 3} for result, _ in results)
+
+
+def test_failures_reach_every_waiter_and_are_not_kept():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        coalescer = Coalescer()
+        outcomes = await asyncio.gather(*(coalescer.run("k", fail) for _ in range(2)), return_exceptions=True)
+        return outcomes, coalescer._inflight
+
+    outcomes, inflight = asyncio.run(main())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert inflight == {}
+
+
+def test_identity_includes_the_password_digest():
+    login = {"server": "db1", "port": "1433", "username": "sa", "password": "one"}
+    assert _identity(login) != _identity(dict(login, password="two"))
+    assert "one" not in _identity(login)
+    with pytest.raises(RequestError):
+        _identity({"server": "db1"})
+
+
+def test_payload_round_trip_keeps_dtypes_and_decimals():
+    frame = pd.DataFrame({
+        "n": pd.array([1, None], dtype="Int64"),
+        "amount": [decimal.Decimal("12345678901234567.89"), None],
+        "day": pd.to_datetime([datetime.date(2024, 1, 2), datetime.date(2024, 3, 4)]),
+        "label": pd.array(["a", None], dtype="string"),
+    })
+    restored = frame_from_payload(frame_to_payload(frame))
+    assert [str(restored[name].dtype) for name in ("n", "amount", "label")] == ["Int64", "object", "string"]
+    assert restored["day"].tolist() == frame["day"].tolist()
+    assert restored["amount"][0] == decimal.Decimal("12345678901234567.89")
+    assert restored["amount"][1] is None
+    assert restored["n"].isna().tolist() == [False, True]
@@ -0,0 +1,39 @@
+from sql_extractor import SqlExtractor
+
+
+def extract(text, chunk=None):
+    extractor = SqlExtractor()
+    if chunk is None:
+        extractor.feed(text)
+    else:
+        for i in range(0, len(text), chunk):
+            extractor.feed(text[i:i + chunk])
+    return extractor.finish()
+
+
+def test_statement_ends_at_semicolon():
+    assert extract("SELECT COUNT(*) FROM dbo.Orders; -- counts orders") == "SELECT COUNT(*) FROM dbo.Orders;"
+
+
+def test_code_fence():
+    assert extract("```sql\nSELECT Region FROM dbo.Orders\n```\nThis lists regions.") == "SELECT Region FROM dbo.Orders"
+
+
+def test_prose_preamble_mentioning_select():
+    text = "You can select the top customers:\nSELECT TOP 10 CustomerID FROM dbo.Orders ORDER BY Amount DESC;"
+    expected = "SELECT TOP 10 CustomerID FROM dbo.Orders ORDER BY Amount DESC;"
+    assert extract(text) == expected
+    # Streamed in small chunks, the keyword straddles chunk boundaries
+    assert extract(text, chunk=3) == expected
+
+
+def test_with_opening_a_line():
+    text = "Start with the totals:\nWITH t AS (SELECT 1 AS n) SELECT n FROM t;"
+    assert extract(text) == "WITH t AS (SELECT 1 AS n) SELECT n FROM t;"
+
+
+def test_label_before_the_statement():
+    assert extract("SQL query: SELECT TOP 5 * FROM dbo.Orders") == "SELECT TOP 5 * FROM dbo.Orders"
+    assert extract("Query: SELECT 1 AS n;\nIt returns one row.") == "SELECT 1 AS n;"
+    text = "The SQL query is SELECT Region, SUM(Amount) FROM dbo.Orders GROUP BY Region;"
+    assert extract(text, chunk=4) == "SELECT Region, SUM(Amount) FROM dbo.Orders GROUP BY Region;"
@@ -0,0 +1,62 @@
+import decimal
+
+import pytest
+
+from sql_parameters import SQL_BIGINT, SQL_DECIMAL, SQL_INTEGER, SQL_VARCHAR, SQL_WVARCHAR, parameterize
+
+
+def test_where_literals():
+    query = parameterize("SELECT * FROM dbo.Orders WHERE CustomerID = 42 AND Region = 'North'")
+    assert query.sql == "SELECT * FROM dbo.Orders WHERE CustomerID = ? AND Region = ?"
+    assert query.params == (42, "North")
+    assert query.types == (SQL_INTEGER, SQL_VARCHAR)
+
+
+def test_strings_and_national_literals():
+    query = parameterize("SELECT * FROM dbo.Customers WHERE Name = N'Zoë' OR Name LIKE 'O''Brien%'")
+    assert query.sql == "SELECT * FROM dbo.Customers WHERE Name = ? OR Name LIKE ?"
+    assert query.params == ("Zoë", "O'Brien%")
+    assert query.types == (SQL_WVARCHAR, SQL_VARCHAR)
+
+
+def test_in_list_and_between():
+    query = parameterize("SELECT * FROM dbo.Orders WHERE Region IN ('North', 'South') AND Amount BETWEEN 10.5 AND -20")
+    assert query.sql == "SELECT * FROM dbo.Orders WHERE Region IN (?, ?) AND Amount BETWEEN ? AND ?"
+    assert query.params == ("North", "South", decimal.Decimal("10.5"), -20)
+    assert query.types == (SQL_VARCHAR, SQL_VARCHAR, SQL_DECIMAL, SQL_INTEGER)
+
+
+def test_on_and_having_lifted_other_clauses_inline():
+    query = parameterize(
+        "SELECT TOP 10 Region, COUNT(*) FROM dbo.Orders o JOIN dbo.Customers c "
+        "ON c.CustomerID = o.CustomerID AND c.Country = 'US' GROUP BY Region HAVING COUNT(*) > 5 ORDER BY 2"
+    )
+    assert query.sql == (
+        "SELECT TOP 10 Region, COUNT(*) FROM dbo.Orders o JOIN dbo.Customers c "
+        "ON c.CustomerID = o.CustomerID AND c.Country = ? GROUP BY Region HAVING COUNT(*) > ? ORDER BY 2"
+    )
+    assert query.params == ("US", 5)
+
+
+def test_large_integer_is_bigint():
+    query = parameterize("SELECT * FROM dbo.Orders WHERE OrderID = 9999999999")
+    assert query.types == (SQL_BIGINT,)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1",
+    "SELECT 'x' AS Label FROM dbo.Orders WHERE Amount > 2 * 3",
+    "SELECT * FROM dbo.Orders WHERE OrderDate > DATEADD(day, -7, GETDATE())",
+    "SELECT * FROM dbo.Orders WHERE CustomerID = @customer",
+    "SELECT * FROM dbo.Orders WHERE CustomerID = ?",
+])
+def test_nothing_to_lift(sql):
+    assert parameterize(sql) is None
+
+
+def test_cache_key_and_input_sizes():
+    a = parameterize("SELECT * FROM dbo.Orders WHERE Region = 'North' AND Amount > 1.25")
+    b = parameterize("SELECT *  FROM dbo.Orders\nWHERE Region = 'North' AND Amount > 1.25")
+    assert a.cache_key == b.cache_key
+    assert a.cache_key != parameterize("SELECT * FROM dbo.Orders WHERE Region = 'South' AND Amount > 1.25").cache_key
+    assert a.input_sizes() == [(SQL_VARCHAR, 8000, 0), (SQL_DECIMAL, 38, 10)]
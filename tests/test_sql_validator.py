@@ -0,0 +1,44 @@
+from schema_catalog import TableInfo
+from schema_retrieval import SchemaContext
+from sql_validator import check_identifiers
+
+ORDERS = TableInfo("dbo", "Orders", (("OrderID", "int"), ("Region", "nvarchar"), ("Amount", "decimal")), "", "")
+
+
+def test_known_columns_pass():
+    assert check_identifiers("SELECT [Region], SUM([Amount]) AS [Total] FROM [dbo].[Orders] GROUP BY [Region]", ORDERS) == []
+
+
+def test_unknown_bracketed_column():
+    assert check_identifiers("SELECT [Nope] FROM [dbo].[Orders]", ORDERS) == ["Invalid column name 'Nope'."]
+
+
+def test_wrong_schema():
+    problems = check_identifiers("SELECT * FROM [sales].[Orders]", ORDERS)
+    assert problems == ["Invalid object name 'sales.Orders'. The table is [dbo].[Orders]."]
+
+
+def test_equals_alias_in_select_list():
+    sql = "SELECT [Total] = SUM(Amount), [Orders] = COUNT(*) FROM dbo.Orders ORDER BY [Total] DESC"
+    assert check_identifiers(sql, ORDERS) == []
+    assert check_identifiers("SELECT TOP (5) [Region], [Total] = SUM(Amount) FROM dbo.Orders GROUP BY [Region]", ORDERS) == []
+
+
+def test_equals_in_where_still_reads_a_column():
+    assert check_identifiers("SELECT * FROM dbo.Orders WHERE [Nope] = 1", ORDERS) == ["Invalid column name 'Nope'."]
+
+
+def test_date_part_arguments_are_not_columns():
+    sql = "SELECT [Region] FROM dbo.Orders WHERE DATEDIFF([day], [OrderDate], GETDATE()) < 7 AND DATEPART([year], GETDATE()) > 2000"
+    assert check_identifiers(sql, ORDERS) == ["Invalid column name 'OrderDate'."]
+    assert check_identifiers("SELECT DATEADD([day], -7, GETDATE()) AS [Since] FROM dbo.Orders", ORDERS) == []
+
+
+def test_other_prompted_schema_of_the_same_name():
+    archived = TableInfo("archive", "Orders", (("OrderID", "int"), ("ClosedAt", "datetime")), "", "")
+    context = SchemaContext(ORDERS, ((ORDERS, None), (archived, None)), "", "", "", 0)
+    sql = "SELECT o.[Region], a.[ClosedAt] FROM dbo.Orders o JOIN archive.Orders a ON a.OrderID = o.OrderID"
+    assert check_identifiers(sql, context) == []
+    assert check_identifiers("SELECT * FROM sales.Orders", context) == [
+        "Invalid object name 'sales.Orders'. The table is [dbo].[Orders] or [archive].[Orders]."
+    ]
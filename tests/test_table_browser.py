@@ -0,0 +1,63 @@
+from schema_catalog import _table_info
+from table_browser import TableIndex, format_rows
+
+
+def table(schema, name, rows=None):
+    return _table_info(schema, name, [("ID", "int")], rows=rows)
+
+
+TABLES = [
+    table("dbo", "Orders", 5_000),
+    table("dbo", "OrderLines", 120_000),
+    table("sales", "Customers", 800),
+    table("sales", "CustomerOrders"),
+    table("audit", "Log", 2_500_000),
+]
+
+
+def names(tables):
+    return [f"{info.schema}.{info.name}" for info in tables]
+
+
+def test_prefix_matches_come_before_contains_matches():
+    index = TableIndex(TABLES)
+    assert names(index.search("order")) == ["dbo.OrderLines", "dbo.Orders", "sales.CustomerOrders"]
+    assert names(index.search("Customer")) == ["sales.CustomerOrders", "sales.Customers"]
+
+
+def test_schema_qualified_and_bracketed_prefix():
+    index = TableIndex(TABLES)
+    assert names(index.search("sales.cust")) == ["sales.CustomerOrders", "sales.Customers"]
+    assert names(index.search("[dbo].[Ord")) == ["dbo.OrderLines", "dbo.Orders"]
+
+
+def test_empty_search_lists_everything_by_schema_and_name():
+    assert names(TableIndex(TABLES).search("  ")) == [
+        "audit.Log", "dbo.OrderLines", "dbo.Orders", "sales.CustomerOrders", "sales.Customers",
+    ]
+
+
+def test_paging_clamps_to_available_pages():
+    index = TableIndex([table("dbo", f"T{i:03}") for i in range(95)])
+    first = index.page(page_size=40)
+    assert (len(first.tables), first.matches, first.page, first.pages) == (40, 95, 1, 3)
+    last = index.page(page=7, page_size=40)
+    assert (len(last.tables), last.page) == (15, 3)
+    assert last.tables[0].name == "T080"
+    assert index.page("nothing", page=2).pages == 1
+
+
+def test_size_and_recent_sorts():
+    index = TableIndex(TABLES)
+    by_size = index.page(sort="Size").tables
+    assert names(by_size) == ["audit.Log", "dbo.OrderLines", "dbo.Orders", "sales.Customers", "sales.CustomerOrders"]
+    recent = [("sales", "Customers"), ("dbo", "Orders")]
+    assert names(index.page(sort="Recently used", recent=recent).tables)[:3] == [
+        "sales.Customers", "dbo.Orders", "audit.Log",
+    ]
+
+
+def test_format_rows():
+    assert [format_rows(n) for n in (950, 1_000, 12_345, 2_500_000, 3_000_000_000)] == [
+        "950 rows", "1K rows", "12.3K rows", "2.5M rows", "3B rows",
+    ]